@@ -177,6 +177,81 @@
     status.textContent = enabled ? "Synlig (LaBA)" : "Skjult";
   }
 
+  // Server metrics (/admin/metrics.json, same admin token as this page).
+  function adminToken() {
+    try { return new URLSearchParams(window.location.search).get("token") || ""; } catch (e) { return ""; }
+  }
+
+  function formatBytes(n) {
+    if (n >= 1048576) return `${(n / 1048576).toFixed(1)} MB`;
+    if (n >= 1024) return `${(n / 1024).toFixed(1)} kB`;
+    return `${n} B`;
+  }
+
+  function renderTable(targetId, headers, rows) {
+    const target = document.getElementById(targetId);
+    if (!target) return;
+    target.innerHTML = "";
+    if (!rows.length) {
+      target.innerHTML = '<p class="adminEmpty">Ingen data endnu.</p>';
+      return;
+    }
+    const table = document.createElement("table");
+    table.className = "adminTable";
+    const head = document.createElement("tr");
+    headers.forEach((label) => {
+      const th = document.createElement("th");
+      th.textContent = label;
+      head.appendChild(th);
+    });
+    table.appendChild(head);
+    rows.forEach((cells) => {
+      const tr = document.createElement("tr");
+      cells.forEach((value) => {
+        const td = document.createElement("td");
+        td.textContent = String(value);
+        tr.appendChild(td);
+      });
+      table.appendChild(tr);
+    });
+    target.appendChild(table);
+  }
+
+  function setText(id, text) {
+    const el = document.getElementById(id);
+    if (el) el.textContent = text;
+  }
+
+  async function refreshServer() {
+    let data;
+    try {
+      const res = await fetch(`/admin/metrics.json?token=${encodeURIComponent(adminToken())}`, { cache: "no-store" });
+      if (!res.ok) throw new Error(String(res.status));
+      data = await res.json();
+    } catch (e) {
+      setText("admServerStatus", "Kunne ikke hente målinger fra serveren.");
+      return;
+    }
+    const gauges = data.gauges || {};
+    const phases = gauges.pw_rooms || {};
+    const totalRooms = Object.values(phases).reduce((sum, n) => sum + n, 0);
+    setText("admServerStatus", `Oppetid ${Math.round((data.uptime || 0) / 60)} min · opdateres hvert 15. sekund.`);
+    setText("admSrvRooms", String(totalRooms));
+    setText("admSrvPhases", Object.entries(phases).map(([phase, n]) => `${phase}: ${n}`).join(" · ") || "Ingen aktive rum.");
+    setText("admSrvConnections", String(gauges.pw_room_connections || 0));
+    setText("admSrvThreads", `${gauges.pw_threads || 0} tråde · ${gauges.pw_score_rooms || 0} pointtavler`);
+    setText("admSrvLag", `${((gauges.pw_scheduler_lag_seconds || 0) * 1000).toFixed(1)} ms`);
+    setText("admSrvTasks", `Maks ${((gauges.pw_scheduler_max_lag_seconds || 0) * 1000).toFixed(1)} ms · ` +
+      `${gauges.pw_scheduler_running || 0} kører, ${gauges.pw_scheduler_queue || 0} i kø, ${gauges.pw_bot_inflight || 0} bot-søgninger`);
+
+    const handlers = Object.entries(data.handlers || {}).sort((a, b) => b[1].count - a[1].count);
+    renderTable("admSrvHandlers", ["Hændelse", "Antal", "p50", "p95", "p99", "Fejl"],
+      handlers.map(([event, h]) => [event, h.count, h.p50Ms.toFixed(2), h.p95Ms.toFixed(2), h.p99Ms.toFixed(2), h.errors]));
+    const emits = Object.entries(data.emits || {}).sort((a, b) => b[1].bytes - a[1].bytes);
+    renderTable("admSrvEmits", ["Hændelse", "Antal", "Bytes"],
+      emits.map(([event, e]) => [event, e.count, formatBytes(e.bytes)]));
+  }
+
   async function refresh() {
     const [feedback, logins, rounds, sessions] = await Promise.all([
       provider.getFeedback(),
@@ -211,6 +286,7 @@
     renderDailyList("admLoginHistory", groupByDate(logins || []));
     renderDailyList("admRoundHistory", groupByDate(rounds || []));
     renderFeedbackList(feedback || []);
+    refreshServer();
   }
 
   document.addEventListener("DOMContentLoaded", () => {
@@ -1,44 +1,266 @@
 from __future__ import annotations
 
+import atexit
+import contextlib
+import functools
+import json
 import os
 import random
+import threading
 import time
-from typing import Any, Dict, List, Optional
-
-from flask import Flask, send_from_directory, request, abort
-from flask_socketio import SocketIO, join_room, leave_room, emit
+from typing import Any, Dict, List, Optional, Set, Tuple
+
+from flask import Flask, request, abort
+from flask_socketio import SocketIO
+
+import pw_bidding
+import pw_bots
+import pw_cards
+import pw_assets
+import pw_engine
+import pw_hibernate
+import pw_metrics
+import pw_rooms
+import pw_shard
+import pw_solver
+import pw_state
+import pw_store
+import pw_transport
+import pw_wire
+from pw_scheduler import Scheduler
 
 # --- App setup ---
-app = Flask(__name__, static_folder=".", static_url_path="")
+# Static files only through static_files() below (public files only).
+app = Flask(__name__, static_folder=None)
 app.config["SECRET_KEY"] = os.environ.get("SECRET_KEY", "piratwhist-secret")
 ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+# Hashed/precompressed files from dist/ (scripts/build_assets.py), kept in memory.
+assets = pw_assets.Assets()
+# Handler latency, emits and load gauges (/admin/metrics, see pw_metrics).
+metrics = pw_metrics.Registry()
 
 # IMPORTANT (Render + Python 3.13):
 # eventlet currently breaks on Python 3.13 (threading API change).
 # We run Socket.IO in "threading" mode (long-polling; works reliably).
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading")
-
-# --- In-memory room state (resets on redeploy) ---
+# Sharded mode (PW_SHARDS > 1, see pw_shard): this process owns the online
+# rooms whose code % PW_SHARDS == PW_SHARD; emits for other processes go
+# through PW_MESSAGE_QUEUE.
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode="threading",
+                    client_manager=pw_shard.client_manager(), serializer=metrics.packet_class())
+
+# Handlers only talk to clients through `transport` (see pw_transport), so
+# asgi.py can serve the same events from an asyncio server.
+transport = pw_transport.FlaskTransport(socketio)
+SOCKET_HANDLERS: Dict[str, Any] = {}
+
+
+def socket_event(name: str):
+    def register(fn):
+        timed = metrics.timed(name, fn)
+        SOCKET_HANDLERS[name] = timed
+        socketio.on(name)(timed)
+        return fn
+    return register
+
+
+# One timer heap + small worker pool for every room's bot turns, deal/trick/
+# round timers and takeovers (instead of one sleeping thread per event).
+scheduler = Scheduler(workers=int(os.environ.get("PW_SCHEDULER_WORKERS", "4")))
+
+# Search bots think in their own processes (0 disables search; bots then
+# play the baseline heuristic).
+bot_pool = pw_bots.SearchPool(workers=int(os.environ.get("PW_BOT_WORKERS", "1")))
+# Map the precomputed bid table now rather than on the first bot bid.
+pw_bidding.default_table()
+
+# Rooms are persisted write-behind (SQLite, WAL) so a redeploy or crash does
+# not end games in progress; they are loaded back lazily by code.
+# PW_STORE_PATH="" keeps rooms in memory only.
+store = pw_store.open_store(
+    os.environ.get("PW_STORE_PATH", pw_store.DEFAULT_PATH),
+    float(os.environ.get("PW_STORE_INTERVAL", "0.5")),
+)
+store.prune(float(os.environ.get("PW_STORE_MAX_AGE", str(24 * 3600))))
+atexit.register(store.close)
+
+# --- Room state (in memory, backed by `store`) ---
 rooms: Dict[str, Dict[str, Any]] = {}
 
 
 
 
-# Online multiplayer rooms for /online.html
-ONLINE_ROOMS: Dict[str, Dict[str, Any]] = {}
+# Online multiplayer rooms for /online.html: 4-digit codes from a pool of
+# the codes this shard owns; empty rooms expire through the registry's heap.
 ONLINE_EMPTY_TTL_SECONDS = 120  # keep empty rooms briefly (redirects/reloads)
+# What a running game does once nobody is connected (PW_ABANDONED):
+#   suspend      no timers and no emits until a player rejoins (default);
+#   fastforward  all-bot games are played to the end at once, without
+#                pacing or emits; others wait, suspended, for the takeover;
+#   run          keep playing at animation pace, as if someone watched.
+ONLINE_ABANDONED_POLICY = os.environ.get("PW_ABANDONED", "suspend").strip().lower()
+if ONLINE_ABANDONED_POLICY not in ("suspend", "fastforward", "run"):
+    ONLINE_ABANDONED_POLICY = "suspend"
+ONLINE_ROOMS = pw_rooms.RoomRegistry(pw_rooms.digit_pool(pw_shard.SHARD, pw_shard.SHARDS), ONLINE_EMPTY_TTL_SECONDS)
+# Live sid/clientId -> room and seat (kept in sync with members/sidToClient).
+ONLINE_SEATS = pw_rooms.SeatIndex()
+# Hibernation: a room with nothing going on for PW_HIBERNATE_SECONDS (no
+# timers, no frame due, no takeover pending) is packed into a blob
+# (pw_hibernate; in memory, or files in PW_HIBERNATE_DIR) and its live
+# objects, lock and timers are dropped. Its code, seat index entries and
+# expiry stay; _online_get_room thaws it on the next access. 0 turns it off.
+ONLINE_HIBERNATE_SECONDS = float(os.environ.get("PW_HIBERNATE_SECONDS", "300"))
+ONLINE_HIBERNATED = pw_hibernate.Hibernator(os.environ.get("PW_HIBERNATE_DIR") or None)
+# Scorekeeper codes (6 characters, no look-alikes).
+SCORE_CODES = pw_rooms.alphabet_pool("ABCDEFGHJKLMNPQRSTUVWXYZ23456789", 6)
+# Codes of rooms that are only in the store stay reserved.
+for _code in store.codes("online"):
+    ONLINE_ROOMS.reserve(_code)
+for _code in store.codes("score"):
+    SCORE_CODES.take(_code)
+
+# Per-room serialization: every socket handler and scheduled task for a room
+# runs under that room's lock, so one room's events apply in order while
+# different rooms run in parallel. ONLINE_ROOMS_LOCK only guards the lock
+# table and rehydration (never held while game logic runs).
+ONLINE_ROOMS_LOCK = threading.Lock()
+ONLINE_ROOM_LOCKS: Dict[str, threading.RLock] = {}
+
+
+def _online_room_lock(code: str) -> Optional[threading.RLock]:
+    """The room's lock, made on first use; None when no room holds `code`
+    (malformed, free or another shard's), so codes sent by clients never
+    add entries to the table."""
+    with ONLINE_ROOMS_LOCK:
+        lock = ONLINE_ROOM_LOCKS.get(code)
+        if lock is None:
+            if not ONLINE_ROOMS.in_use(code):
+                return None
+            lock = ONLINE_ROOM_LOCKS[code] = threading.RLock()
+        return lock
+
+
+def _online_acquire(code: str, blocking: bool = True) -> Optional[threading.RLock]:
+    """Take the room's lock; None when `blocking` is off and it is busy.
+
+    Hibernation and purging drop a room's lock from the table while holding
+    it. A caller that was waiting on the dropped lock lets go of it and
+    takes the current one.
+    """
+    while True:
+        lock = _online_room_lock(code)
+        if lock is None:
+            # No room to serialize with; the caller finds none and says so.
+            lock = threading.RLock()
+            lock.acquire()
+            return lock
+        if not lock.acquire(blocking=blocking):
+            return None
+        if ONLINE_ROOM_LOCKS.get(code) is lock:
+            return lock
+        lock.release()
+
+
+@contextlib.contextmanager
+def _online_locked(code: str):
+    """`with _online_locked(code):` runs the block under the room's lock."""
+    lock = _online_acquire(code)
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+ONLINE_LOCK_RETRY_SECONDS = 0.005
+
+
+def _online_serialized(fn):
+    """Run a room task `fn(code, ...)` under the room's lock.
+
+    Scheduler workers never park on a busy room: when the lock is held (a
+    handler for the same room is running) the task is re-queued shortly
+    after, so one hot room cannot stall other rooms' timers.
+    """
+    @functools.wraps(fn)
+    def wrapper(code, *args, **kwargs):
+        lock = _online_acquire(code, blocking=False)
+        if lock is None:
+            timer = scheduler.current()
+            if timer is not None and timer.fn is wrapper:
+                # Same key and arguments, so pending()/cancel() still see it.
+                scheduler.retry(timer, ONLINE_LOCK_RETRY_SECONDS)
+            else:
+                scheduler.call_later(ONLINE_LOCK_RETRY_SECONDS, functools.partial(wrapper, code, *args, **kwargs))
+            return None
+        try:
+            return fn(code, *args, **kwargs)
+        finally:
+            lock.release()
+    return wrapper
+
+
+def _online_serialized_handler(fn):
+    """Run a socket handler `fn(data)` under the lock of data["room"]."""
+    @functools.wraps(fn)
+    def wrapper(data):
+        code = ((data or {}).get("room") or "").strip()
+        with _online_locked(code):
+            return fn(data)
+    return wrapper
 
 
 def _online_purge_old_rooms():
+    """Drop rooms that have been empty for ONLINE_EMPTY_TTL_SECONDS. Only
+    due rooms are looked at (expiry heap), not every room."""
     now = time.time()
-    for code, room in list(ONLINE_ROOMS.items()):
-        empty_since = room.get("emptySince")
-        if empty_since and (now - float(empty_since)) > ONLINE_EMPTY_TTL_SECONDS:
-            ONLINE_ROOMS.pop(code, None)
+    for code in ONLINE_ROOMS.expired(now):
+        lock = _online_acquire(code, blocking=False)
+        # A busy room is being touched right now (e.g. a rejoin); look again shortly.
+        if lock is None:
+            ONLINE_ROOMS.defer(code, now + 1.0)
+            continue
+        try:
+            room = _online_get_room(code)
+            empty_since = room and room.emptySince
+            if empty_since and (now - float(empty_since)) >= ONLINE_EMPTY_TTL_SECONDS:
+                for sid in list(room.members):
+                    _online_detach(code, room, sid)
+                ONLINE_ROOMS.remove(code)
+                ONLINE_SUSPENDED.discard(code)
+                scheduler.cancel(("hibernate", code))
+                store.delete(("online", code))
+                with ONLINE_ROOMS_LOCK:
+                    ONLINE_ROOM_LOCKS.pop(code, None)
+        finally:
+            lock.release()
+
+
+def _online_attach(code: str, room: pw_state.Room, sid: str, seat: int, client_id: Optional[str]) -> None:
+    """Seat `sid` in the room (members, sidToClient and ONLINE_SEATS)."""
+    room.members[sid] = seat
+    if client_id:
+        room.sidToClient[sid] = client_id
+    else:
+        room.sidToClient.pop(sid, None)
+    ONLINE_SEATS.attach(sid, code, seat, client_id)
+    _online_resume(code, room)
+
+
+def _online_detach(code: str, room: pw_state.Room, sid: str) -> Tuple[Optional[int], Optional[str]]:
+    """Remove `sid` from the room; its (seat, clientId), seat None if it was not a member."""
+    seat = room.members.pop(sid, None)
+    client_id = room.sidToClient.pop(sid, None)
+    ONLINE_SEATS.detach(sid, code)
+    return seat, client_id
+
+
+def _online_mark_empty(code: str, room: pw_state.Room) -> None:
+    room.emptySince = time.time()
+    ONLINE_ROOMS.mark_empty(code, room.emptySince)
+    _online_abandon(code, room)
+
 
 def _room_code() -> str:
-    alphabet = "ABCDEFGHJKLMNPQRSTUVWXYZ23456789"  # avoid confusing chars
-    return "".join(random.choice(alphabet) for _ in range(6))
+    return SCORE_CODES.allocate()
 
 
 def _build_max_by_round(rounds: int) -> List[int]:
@@ -57,11 +279,61 @@ def _default_room_state() -> Dict[str, Any]:
         "rounds": rounds,
         "players": players,
         "maxByRound": _build_max_by_round(rounds),
-        "data": data,    }
+        "data": data,
+        "rev": 0,
+    }
+
+
+def _score_room(code: str) -> Optional[Dict[str, Any]]:
+    """Scorekeeper room state by code, loaded from the store if needed."""
+    s = rooms.get(code)
+    if s is None and code:
+        s = store.load(("score", code))
+        if s is not None:
+            s = rooms.setdefault(code, s)
+    return s
+
+
+def _score_mark_dirty(code: str) -> None:
+    store.mark_dirty(("score", code), lambda: json.dumps(rooms[code], ensure_ascii=False))
+
+
+# Scorekeeper cell edits go out as patches ({round, player, field, value,
+# rev}), collected per room for SCORE_PATCH_WINDOW_SECONDS and sent as one
+# "cell_patch" frame; a later edit of the same cell replaces the earlier one.
+# Full state (with its rev) only goes out on join and for other changes.
+SCORE_PATCH_WINDOW_SECONDS = 0.1
+SCORE_PATCHES: Dict[str, Dict[Tuple[int, int, str], Dict[str, Any]]] = {}
+SCORE_PATCH_LOCK = threading.Lock()
+
+
+def _score_queue_patch(room: str, s: Dict[str, Any], r: int, p: int, field: str) -> None:
+    with SCORE_PATCH_LOCK:
+        s["rev"] = s.get("rev", 0) + 1
+        pending = SCORE_PATCHES.setdefault(room, {})
+        first = not pending
+        # re-insert so the frame stays in rev order
+        pending.pop((r, p, field), None)
+        pending[(r, p, field)] = {"round": r, "player": p, "field": field, "value": s["data"][r][p][field], "rev": s["rev"]}
+        if first:
+            scheduler.call_later(SCORE_PATCH_WINDOW_SECONDS, _score_flush_patches, room, key=("score_patch", room))
+
+
+def _score_flush_patches(room: str) -> None:
+    with SCORE_PATCH_LOCK:
+        pending = SCORE_PATCHES.pop(room, None)
+    if pending:
+        transport.emit("cell_patch", {"patches": list(pending.values())}, to=room)
 
 
 def _broadcast_state(room: str) -> None:
-    socketio.emit("state", rooms[room], to=room)
+    with SCORE_PATCH_LOCK:
+        # the full state includes any pending patches
+        SCORE_PATCHES.pop(room, None)
+        scheduler.cancel(("score_patch", room))
+        rooms[room]["rev"] = rooms[room].get("rev", 0) + 1
+    _score_mark_dirty(room)
+    transport.emit("state", rooms[room], to=room)
 
 
 def _admin_allowed() -> bool:
@@ -73,82 +345,141 @@ def _admin_allowed() -> bool:
 
 @app.get("/")
 def index():
-    return send_from_directory(".", "piratwhist.html")
+    return assets.response("piratwhist.html")
 
 
 @app.get("/admin")
 def admin_page():
     if not _admin_allowed():
         abort(403)
-    return send_from_directory(".", "admin.html")
+    return assets.response("admin.html")
 
-@app.get("/online.html")
-def online_page():
-    return send_from_directory(".", "online.html")
-
-@app.get("/online.js")
-def online_js():
-    return send_from_directory(".", "online.js")
-
-@app.get("/online.css")
-def online_css():
-    return send_from_directory(".", "online.css")
+@app.get("/admin/scheduler")
+def admin_scheduler():
+    if not _admin_allowed():
+        abort(403)
+    manager = socketio.server.manager
+    return {**scheduler.metrics(), "bots": bot_pool.metrics(), "store": store.metrics(), "assets": assets.metrics(), "frames": dict(ONLINE_FRAME_STATS), "deals": dict(ONLINE_DEAL_STATS), "anims": {"acks": ONLINE_ANIM_ACKS, **ONLINE_ANIM_STATS}, "rooms": {**ONLINE_ROOMS.metrics(), "seats": ONLINE_SEATS.metrics()},
+            "abandoned": {"policy": ONLINE_ABANDONED_POLICY, "suspendedNow": len(ONLINE_SUSPENDED), **ONLINE_ABANDONED_STATS},
+            "hibernation": {"afterSeconds": ONLINE_HIBERNATE_SECONDS, **ONLINE_HIBERNATED.metrics()},
+            "shard": {"index": pw_shard.SHARD, "count": pw_shard.SHARDS, "onlineRooms": len(ONLINE_ROOMS),
+                      "queue": manager.metrics() if hasattr(manager, "metrics") else None}}
+
+METRICS_GAUGE_HELP = {
+    "pw_rooms": "Online rooms by phase.",
+    "pw_score_rooms": "Scorekeeper rooms.",
+    "pw_room_connections": "Connections attached to an online room.",
+    "pw_rooms_suspended": "Online rooms on hold because nobody is connected.",
+    "pw_rooms_hibernated": "Idle online rooms packed away (not live in memory).",
+    "pw_hibernated_bytes": "Size of the packed idle rooms.",
+    "pw_threads": "Live threads in this process.",
+    "pw_scheduler_queue": "Scheduled timers not yet due.",
+    "pw_scheduler_running": "Timer callbacks running now.",
+    "pw_scheduler_lag_seconds": "How late the scheduler runs timers (last, or the overdue head).",
+    "pw_scheduler_max_lag_seconds": "Worst scheduler lag since start.",
+    "pw_scheduler_errors": "Timer callbacks that raised since start (logged by pw_scheduler).",
+    "pw_bot_inflight": "Bot searches in the process pool.",
+    "pw_store_pending": "Rooms waiting to be written to the store.",
+}
+
+
+def _metrics_gauges():
+    sched = scheduler.metrics()
+    by_phase = ONLINE_ROOMS.metrics()["byPhase"]
+    hib = ONLINE_HIBERNATED.metrics()
+    out = [("pw_rooms", (("phase", phase),), n) for phase, n in sorted(by_phase.items())]
+    out += [
+        ("pw_score_rooms", (), len(rooms)),
+        ("pw_room_connections", (), ONLINE_SEATS.metrics()["sids"]),
+        ("pw_rooms_suspended", (), len(ONLINE_SUSPENDED)),
+        ("pw_rooms_hibernated", (), hib["rooms"]),
+        ("pw_hibernated_bytes", (), hib["bytes"]),
+        ("pw_threads", (), threading.active_count()),
+        ("pw_scheduler_queue", (), sched["queueDepth"]),
+        ("pw_scheduler_running", (), sched["running"]),
+        ("pw_scheduler_lag_seconds", (), sched["lagMs"] / 1000.0),
+        ("pw_scheduler_max_lag_seconds", (), sched["maxLagMs"] / 1000.0),
+        ("pw_scheduler_errors", (), sched["errors"]),
+        ("pw_bot_inflight", (), bot_pool.metrics()["inflight"]),
+        ("pw_store_pending", (), store.metrics().get("pending", 0)),
+    ]
+    return out
+
+
+metrics.gauges = _metrics_gauges
+metrics.gauge_help = METRICS_GAUGE_HELP
+
+
+@app.get("/admin/metrics")
+def admin_metrics():
+    """Prometheus scrape endpoint (token as ?token= or X-Admin-Token)."""
+    if not _admin_allowed():
+        abort(403)
+    return metrics.prometheus(), 200, {"Content-Type": "text/plain; version=0.0.4; charset=utf-8",
+                                      "Cache-Control": "no-store"}
 
+@app.get("/admin/metrics.json")
+def admin_metrics_json():
+    if not _admin_allowed():
+        abort(403)
+    return metrics.snapshot(), 200, {"Cache-Control": "no-store"}
 
 @app.get("/<path:path>")
 def static_files(path: str):
-    if path.startswith("admin") and not _admin_allowed():
+    # The admin page and data need the token; the page's own script and
+    # stylesheet (admin.js, admin.css and their hashed builds) do not.
+    if (path.startswith("admin/") or path.startswith("admin.html")) and not _admin_allowed():
         abort(403)
-    return send_from_directory(".", path)
+    return assets.response(path)
 
 
-@socketio.on("create_room")
+@socket_event("create_room")
 def on_create_room():
     room = _room_code()
-    while room in rooms:
-        room = _room_code()
     rooms[room] = _default_room_state()
+    _score_mark_dirty(room)
 
-    join_room(room)
-    emit("room_created", {"room": room})
-    emit("state", rooms[room])
+    transport.join(room)
+    transport.reply("room_created", {"room": room})
+    transport.reply("state", rooms[room])
 
 
-@socketio.on("join_room")
+@socket_event("join_room")
 def on_join_room(payload: Dict[str, Any]):
     room = (payload.get("room") or "").strip().upper()
-    if not room or room not in rooms:
-        emit("join_error", {"error": "Rum findes ikke (tjek koden)."})
+    if not room or _score_room(room) is None:
+        transport.reply("join_error", {"error": "Rum findes ikke (tjek koden)."})
         return
 
-    join_room(room)
-    emit("join_ok", {"room": room})
-    emit("state", rooms[room])
+    transport.join(room)
+    transport.reply("join_ok", {"room": room})
+    transport.reply("state", rooms[room])
 
 
-@socketio.on("leave_room")
+@socket_event("leave_room")
 def on_leave_room(payload: Dict[str, Any]):
     room = (payload.get("room") or "").strip().upper()
     if room:
-        leave_room(room)
-    emit("left")
+        transport.leave(room)
+    transport.reply("left")
 
 
-@socketio.on("reset_room")
+@socket_event("reset_room")
 def on_reset_room(payload: Dict[str, Any]):
     room = (payload.get("room") or "").strip().upper()
-    if room not in rooms:
+    s = _score_room(room)
+    if s is None:
         return
-    rooms[room] = _default_room_state()
+    rooms[room] = {**_default_room_state(), "rev": s.get("rev", 0)}
     _broadcast_state(room)
 
 
-@socketio.on("set_player_count")
+@socket_event("set_player_count")
 def on_set_player_count(payload: Dict[str, Any]):
     room = (payload.get("room") or "").strip().upper()
-    if room not in rooms:
+    s = _score_room(room)
+    if s is None:
         return
-    s = rooms[room]
     if s.get("phase") != "setup":
         return
 
@@ -179,12 +510,12 @@ def on_set_player_count(payload: Dict[str, Any]):
     _broadcast_state(room)
 
 
-@socketio.on("set_rounds")
+@socket_event("set_rounds")
 def on_set_rounds(payload: Dict[str, Any]):
     room = (payload.get("room") or "").strip().upper()
-    if room not in rooms:
+    s = _score_room(room)
+    if s is None:
         return
-    s = rooms[room]
     if s.get("phase") != "setup":
         return
 
@@ -205,12 +536,12 @@ def on_set_rounds(payload: Dict[str, Any]):
     _broadcast_state(room)
 
 
-@socketio.on("set_name")
+@socket_event("set_name")
 def on_set_name(payload: Dict[str, Any]):
     room = (payload.get("room") or "").strip().upper()
-    if room not in rooms:
+    s = _score_room(room)
+    if s is None:
         return
-    s = rooms[room]
     if s.get("phase") != "setup":
         return
     idx = int(payload.get("index") or 0)
@@ -221,22 +552,22 @@ def on_set_name(payload: Dict[str, Any]):
     _broadcast_state(room)
 
 
-@socketio.on("start_game")
+@socket_event("start_game")
 def on_start_game(payload: Dict[str, Any]):
     room = (payload.get("room") or "").strip().upper()
-    if room not in rooms:
+    s = _score_room(room)
+    if s is None:
         return
-    s = rooms[room]
     s["phase"] = "game"
     _broadcast_state(room)
 
 
-@socketio.on("set_cell")
+@socket_event("set_cell")
 def on_set_cell(payload: Dict[str, Any]):
     room = (payload.get("room") or "").strip().upper()
-    if room not in rooms:
+    s = _score_room(room)
+    if s is None:
         return
-    s = rooms[room]
     if s.get("phase") != "game":
         return
 
@@ -263,103 +594,56 @@ def on_set_cell(payload: Dict[str, Any]):
         v = max(0, min(max_allowed, v))
         s["data"][r][p][field] = v
 
-    _broadcast_state(room)
+    _score_mark_dirty(room)
+    _score_queue_patch(room, s, r, p, field)
 
 
 # ---------- Online game helpers ----------
-ONLINE_SUITS = ["♠", "♥", "♦", "♣"]  # spar is trump
-ONLINE_RANKS = ["2","3","4","5","6","7","8","9","10","J","Q","K","A"]
-ONLINE_RANK_VALUE = {r: i+2 for i, r in enumerate(ONLINE_RANKS)}
-ONLINE_ROUND_CARDS = [7,6,5,4,3,2,1,1,2,3,4,5,6,7]
-
-def _online_room_code() -> str:
-    # 4 digits to keep it simple
-    return f"{random.randint(0, 9999):04d}"
-
-def _online_make_deck():
-    return [{"suit": s, "rank": r} for s in ONLINE_SUITS for r in ONLINE_RANKS]
-
-def _online_card_key(c):
-    return f"{c['rank']}{c['suit']}"
-
-def _online_compare_cards(a, b, lead_suit):
-    # returns 1 if a beats b, -1 if b beats a, 0 if equal
-    a_trump = a["suit"] == "♠"
-    b_trump = b["suit"] == "♠"
-    if a_trump and not b_trump:
-        return 1
-    if not a_trump and b_trump:
-        return -1
-
-    if a["suit"] == b["suit"]:
-        av = ONLINE_RANK_VALUE[a["rank"]]
-        bv = ONLINE_RANK_VALUE[b["rank"]]
-        return (av > bv) - (av < bv)
-
-    a_lead = a["suit"] == lead_suit
-    b_lead = b["suit"] == lead_suit
-    if a_lead and not b_lead:
-        return 1
-    if not a_lead and b_lead:
-        return -1
-
-    # fallback
-    av = ONLINE_RANK_VALUE[a["rank"]]
-    bv = ONLINE_RANK_VALUE[b["rank"]]
-    return (av > bv) - (av < bv)
-
-def _online_deal(n_players, round_index):
-    """Return (hands, cards_per_effective).
-
-    Master rule (52-card deck):
-      cardsPer = min(requestedForRound, floor(52 / nPlayers)) (min 1)
-    """
-    requested = ONLINE_ROUND_CARDS[round_index]
-    cards_per = max(1, min(requested, 52 // max(1, n_players)))
-    needed = cards_per * n_players
-    deck = _online_make_deck()
-    random.shuffle(deck)
-    take = deck[:needed]
-    hands = [[] for _ in range(n_players)]
-    for i, c in enumerate(take):
-        hands[i % n_players].append(c)
-
-    suit_order = {s:i for i,s in enumerate(ONLINE_SUITS)}
-    for h in hands:
-        h.sort(key=lambda c: (suit_order[c["suit"]], ONLINE_RANK_VALUE[c["rank"]]))
-    return hands, cards_per
-
-def _online_points_for_round(bid: int, taken: int) -> int:
-    if bid == taken:
-        return 10 + bid
-    return -abs(taken - bid)
-
-def _online_public_state(room):
-    st = room["state"]
-    # do NOT expose other players' hands
-    return {
-        "n": st["n"],
-        "names": st["names"],
-        "roundIndex": st["roundIndex"],
-        "cardsPer": st.get("cardsPer"),
-        "leader": st["leader"],
-        "turn": st["turn"],
-        "leadSuit": st["leadSuit"],
-        "table": st["table"],
-        "winner": st["winner"],
-        "phase": st["phase"],
-        "bids": st["bids"],
-        "tricksRound": st["tricksRound"],
-        "tricksTotal": st["tricksTotal"],
-        "pointsTotal": st["pointsTotal"],
-        "history": st["history"],
-        "botSeats": sorted(list(st.get("botSeats", set()))),
-        # Deal animation metadata (cards themselves remain private).
-        "dealId": st.get("dealId"),
-        "dealSeq": st.get("dealSeq"),
-        "cardsPer": st.get("cardsPer"),
-    }
-
+ONLINE_SUITS = pw_cards.SUITS  # spar is trump
+ONLINE_RANKS = pw_cards.RANKS
+ONLINE_RANK_VALUE = pw_engine.RANK_VALUE
+ONLINE_ROUND_CARDS = pw_engine.ROUND_CARDS
+
+# Server pacing that mirrors the client animations (see online.js).
+# PW_ONLINE_PACE scales it; 0 runs games flat out (load tests, benchmarks).
+ONLINE_PACE = float(os.environ.get("PW_ONLINE_PACE", "1"))
+ONLINE_DEAL_MS_PER_CARD = 120 * ONLINE_PACE
+ONLINE_DEAL_MIN_SECONDS = 0.8 * ONLINE_PACE
+ONLINE_DEAL_MAX_SECONDS = 8.0 * ONLINE_PACE
+ONLINE_DEAL_TAIL_SECONDS = 0.6 * ONLINE_PACE
+ONLINE_SWEEP_SECONDS = 4.0 * ONLINE_PACE
+ONLINE_NEXT_ROUND_SECONDS = 2.0 * ONLINE_PACE
+# Animation acks: in the paced steps (deal, trick sweep, round end) members
+# send online_anim_done with the revision they animated. Once every human
+# seat has (connected, or reserved for a client who is away, e.g. loading
+# the next page), the step ends at once; its fixed deadline stays the upper
+# bound (old clients, animations stuck in a background tab). Without an
+# ack, nothing ends early. Bot pacing does not depend on acks.
+# PW_ANIM_ACKS=0 turns this off.
+ONLINE_ANIM_ACKS = os.environ.get("PW_ANIM_ACKS", "1") != "0"
+ONLINE_ANIM_STATS = {"waits": 0, "early": 0}
+# Outbound frame budget: state changes within one tick go out as one update
+# per member (PW_FRAME_MS, 0 = send every change at once). Entering a phase
+# the client animates is sent right away, so no such step is merged away.
+ONLINE_FRAME_SECONDS = float(os.environ.get("PW_FRAME_MS", "25")) / 1000.0
+ONLINE_ORDERED_PHASES = ("dealing", "between_tricks", "round_finished")
+ONLINE_FRAME_STATS = {"changes": 0, "frames": 0, "immediate": 0}
+# Deals: every game has a secret seed (pw_engine.deal_rng); the next round
+# is dealt ahead in the background ("ahead"), and a round starts from those
+# hands ("predealt") or deals on the spot ("inline").
+ONLINE_DEAL_SEEDS = random.SystemRandom()
+ONLINE_DEAL_STATS = {"ahead": 0, "predealt": 0, "inline": 0}
+# Wire codec per connection (pw_wire); absent = JSON.
+ONLINE_WIRE: Dict[str, str] = {}
+
+# Game rules live in pw_engine (socket-free); cards in room state are
+# pw_cards ids and are only turned into {"suit","rank"} dicts at the wire
+# boundary (Room.to_public / Room.to_private, pw_state).
+def _online_new_state(n_players: int, names, bot_seats):
+    st = pw_engine.new_state(n_players, names, bot_seats)
+    st.seed = ONLINE_DEAL_SEEDS.getrandbits(64)
+    st.lastActionAt = time.time()
+    return st
 
 def _online_start_deal_phase(code: str, room, round_index: int):
     """Deal server-side immediately, but keep phase='dealing' briefly so
@@ -367,462 +651,846 @@ def _online_start_deal_phase(code: str, room, round_index: int):
 
     This keeps the 'server authoritative state' rule intact.
     """
-    st = room["state"]
-    n = st["n"]
-
-    hands, cards_per = _online_deal(n, round_index)
-    st["hands"] = hands
-    st["cardsPer"] = cards_per
-
-    # Deterministic seat sequence (card-by-card) for the animation.
-    st["dealId"] = int(st.get("dealId") or 0) + 1
-    st["dealSeq"] = [i % n for i in range(cards_per * n)]
-
-    # Reset round-specific state.
-    st["leader"] = (st["roundIndex"] % st["n"])
-    st["turn"] = st["leader"]
-    st["leadSuit"] = None
-    st["table"] = [None for _ in range(n)]
-    st["winner"] = None
-    st["bids"] = [None for _ in range(n)]
-    st["tricksRound"] = [0 for _ in range(n)]
+    st = room.state
+    n = st.n
+    _online_deal_round(st, round_index)
+    cards_per = st.cardsPer
 
     # Enter dealing phase and schedule a transition into bidding.
-    st["phase"] = "dealing"
+    st.phase = "dealing"
 
-    st["lastActionAt"] = time.time()
+    st.lastActionAt = time.time()
 
     # Animation pacing (client mirrors this).
-    per_card_ms = 120
-    duration = max(0.8, min(8.0, (cards_per * n * per_card_ms) / 1000.0 + 0.6))
-    st["dealEndsAt"] = time.time() + duration
-    deal_id = st["dealId"]
+    per_card_ms = ONLINE_DEAL_MS_PER_CARD
+    duration = max(ONLINE_DEAL_MIN_SECONDS, min(ONLINE_DEAL_MAX_SECONDS, (cards_per * n * per_card_ms) / 1000.0 + ONLINE_DEAL_TAIL_SECONDS))
+    st.dealEndsAt = time.time() + duration
+    deal_id = st.dealId
 
     _online_emit_full_state(code, room)
 
-    def _finish():
-        try:
-            socketio.sleep(duration)
-            room2 = ONLINE_ROOMS.get(code)
-            if not room2:
-                return
-            st2 = room2["state"]
-            # Only finish if we're still in the same deal.
-            if st2.get("phase") != "dealing":
-                return
-            if st2.get("dealId") != deal_id:
-                return
-
-            st2["phase"] = "bidding"
-
-            st2["lastActionAt"] = time.time()
-
-            _online_bot_choose_bid(room2)
-            if all(b is not None for b in st2["bids"]):
-                st2["phase"] = "playing"
-                st2["turn"] = st2["leader"]
-                st2["lastActionAt"] = time.time()
-
-            _online_emit_full_state(code, room2)
-
-            if st2.get("phase") == "playing" and st2.get("turn") in st2.get("botSeats", set()):
-                _online_schedule_bot_turn(code)
-        except Exception:
-            return
+    scheduler.call_later(duration, _online_finish_deal, code, deal_id, key=("deal", code))
+    _online_schedule_predeal(code)
+    _online_await_anims(code, room)
+
+
+def _online_deal_round(st, round_index: int) -> None:
+    """Deal and reset round-specific state, with a new dealId."""
+    n = st.n
+    _online_start_round(st, round_index)
+    # Deterministic seat sequence (card-by-card) for the animation.
+    st.dealId = st.dealId + 1
+    st.dealSeq = [i % n for i in range(st.cardsPer * n)]
+
+
+def _online_start_round(st, round_index: int) -> None:
+    ONLINE_DEAL_STATS["predealt" if pw_engine.start_round(st, round_index) else "inline"] += 1
+
+
+def _online_schedule_predeal(code: str) -> None:
+    scheduler.call_later(0, _online_predeal, code, key=("predeal", code))
+
+
+@_online_serialized
+def _online_predeal(code: str):
+    """Deal the room's next round while this one is played; hands stay in
+    the state's private predealt slot until the round starts."""
+    room = _online_live_room(code)
+    if room is None:
+        return
+    st = room.state
+    if st.phase not in ("lobby", "game_finished") and pw_engine.predeal(st, st.roundIndex + 1):
+        ONLINE_DEAL_STATS["ahead"] += 1
+
+
+@_online_serialized
+def _online_finish_deal(code: str, deal_id: int):
+    room2 = _online_live_room(code)
+    if not room2:
+        return
+    st2 = room2.state
+    # Only finish if we're still in the same deal.
+    if st2.phase != "dealing":
+        return
+    if st2.dealId != deal_id:
+        return
+
+    st2.phase = "bidding"
 
-    socketio.start_background_task(_finish)
+    st2.lastActionAt = time.time()
+
+    _online_bot_choose_bid(room2)
+    if all(b is not None for b in st2.bids):
+        st2.phase = "playing"
+        st2.turn = st2.leader
+        st2.lastActionAt = time.time()
+
+    _online_emit_full_state(code, room2)
+
+    if st2.phase == "playing" and st2.turn in st2.botSeats:
+        _online_schedule_bot_turn(code)
 
 
 def _online_bot_choose_bid(room) -> None:
-    st = room["state"]
-    max_bid = int(st.get("cardsPer") or ONLINE_ROUND_CARDS[st["roundIndex"]])
-    for seat in st.get("botSeats", set()):
-        if st["bids"][seat] is not None:
-            continue
-        hand = st["hands"][seat] or []
-        sp = sum(1 for c in hand if c["suit"] == "♠")
-        hi = sum(1 for c in hand if ONLINE_RANK_VALUE[c["rank"]] >= 11)
-        bid = max(0, min(max_bid, int(round((sp * 0.6) + (hi * 0.35)))))
-        st["bids"][seat] = bid
+    st = room.state
+    # Easy bots keep the simple heuristic; stronger ones bid from the table.
+    policy = pw_engine.baseline_bid if _online_bot_level(room) is None else pw_bidding.table_bid
+    pw_engine.bot_bids(st, st.botSeats, policy)
 
 def _online_bot_choose_card(room, seat: int):
-    st = room["state"]
-    hand = st["hands"][seat]
-    if not hand:
-        return None
-    lead = st.get("leadSuit")
-    if lead:
-        same = [c for c in hand if c["suit"] == lead]
-        if same:
-            same.sort(key=lambda c: ONLINE_RANK_VALUE[c["rank"]])
-            return same[0]
-    tr = [c for c in hand if c["suit"] == "♠"]
-    if tr:
-        tr.sort(key=lambda c: ONLINE_RANK_VALUE[c["rank"]])
-        return tr[0]
-    hand.sort(key=lambda c: (c["suit"], ONLINE_RANK_VALUE[c["rank"]]))
-    return hand[0]
+    return pw_engine.baseline_card(room.state, seat)
 
-def _online_schedule_bot_turn(code: str):
-    def _task():
-        try:
-            socketio.sleep(0.6)
-            room = ONLINE_ROOMS.get(code)
-            if not room:
-                return
-            st = room["state"]
-            if st.get("phase") != "playing":
-                return
-            turn = st.get("turn")
-            if turn is None or turn not in st.get("botSeats", set()):
-                return
-            card = _online_bot_choose_card(room, turn)
-            if not card:
-                return
-            _online_internal_play_card(code, room, turn, _online_card_key(card))
-        except Exception:
-            return
-    room = ONLINE_ROOMS.get(code)
-    if room and room.get('state'):
-        st = room['state']
-        st['botScheduledAt'] = time.time()
-        st['botScheduledTurn'] = st.get('turn')
-    _online_ensure_bot_watchdog(code)
-    socketio.start_background_task(_task)
+ONLINE_BOT_DELAY_SECONDS = 0.6 * ONLINE_PACE
+ONLINE_BOT_STALL_SECONDS = 2.5
+# Extra wait for a search result past its budget before playing the
+# baseline card instead (covers pool start-up and a busy pool).
+ONLINE_BOT_SEARCH_GRACE_SECONDS = 1.0
 
 
+def _online_bot_level(room):
+    """(time budget, max samples) for the room's bot strength, or None."""
+    return pw_bots.LEVELS.get(room.botLevel or pw_bots.DEFAULT_LEVEL)
 
-def _online_ensure_bot_watchdog(code: str):
-    """Fail-safe: ensures bots don't stall the game if a background task is missed.
 
-    Starts one lightweight watchdog loop per room. It periodically checks whether
-    it is a bot's turn in phase='playing' and no action has occurred recently.
-    If so, it re-schedules the bot turn.
-    """
+def _online_parse_bot_level(value, fallback=None):
+    level = str(value or "").strip().lower()
+    return level if level in pw_bots.LEVELS else (fallback or pw_bots.DEFAULT_LEVEL)
+
+
+def _online_turn_token(st):
+    # Cancellation token for turn-bound events: stale once the deal or turn moves on.
+    return (st.dealId, st.roundIndex, st.turn)
+
+
+def _online_schedule_bot_turn(code: str):
     room = ONLINE_ROOMS.get(code)
+    if not room or not room.state:
+        return
+    st = room.state
+    st.botScheduledAt = time.time()
+    st.botScheduledTurn = st.turn
+    _online_arm_bot_watchdog(code)
+    # Think during the pacing delay rather than after it.
+    level = _online_bot_level(room)
+    delay = max(0.0, ONLINE_BOT_DELAY_SECONDS - (level[0] if level else 0.0))
+    scheduler.call_later(delay, _online_run_bot_turn, code, _online_turn_token(st), key=("bot_turn", code))
+
+
+@_online_serialized
+def _online_run_bot_turn(code: str, token):
+    room = _online_live_room(code)
     if not room:
         return
-    st = room.get('state', {})
-    if st.get('botWatchdogStarted'):
+    st = room.state
+    if st.phase != "playing":
         return
-    st['botWatchdogStarted'] = True
-
-    def _loop():
-        try:
-            while True:
-                socketio.sleep(1.0)
-                room2 = ONLINE_ROOMS.get(code)
-                if not room2:
-                    return
-                st2 = room2.get('state', {})
-
-                # Stop if game ended.
-                if st2.get('phase') in ('game_finished',):
-                    return
-
-                if st2.get('phase') != 'playing':
-                    continue
-
-                turn = st2.get('turn')
-                bots = st2.get('botSeats', set()) or set()
-                if turn is None or turn not in bots:
-                    continue
-
-                now = time.time()
-                last_action = st2.get('lastActionAt') or now
-                # If nothing has happened for a bit, re-schedule.
-                if now - last_action < 2.5:
-                    continue
-
-                # Avoid scheduling too aggressively.
-                last_sched = st2.get('botScheduledAt') or 0.0
-                if now - last_sched < 2.0 and st2.get('botScheduledTurn') == turn:
-                    continue
-
-                _online_schedule_bot_turn(code)
-        except Exception:
+    if _online_turn_token(st) != token:
+        return
+    turn = st.turn
+    if turn is None or turn not in st.botSeats:
+        return
+    level = _online_bot_level(room)
+    future = None
+    if level and len(pw_engine.legal_cards(st, turn)) > 1:
+        budget, max_samples = level
+        future = bot_pool.submit(pw_bots.search, pw_bots.view(st, turn), budget, max_samples, random.getrandbits(32))
+    if future is None:
+        card = _online_bot_choose_card(room, turn)
+        if card is None:
             return
+        _online_internal_play_card(code, room, turn, card)
+        return
+    # The search runs in the bot pool; the move is applied (under the room
+    # lock) as soon as it is done, or with the baseline card at the deadline.
+    key = ("bot_move", code)
+    scheduler.call_later(budget + ONLINE_BOT_SEARCH_GRACE_SECONDS, _online_finish_bot_turn, code, token, future, key=key)
+    future.add_done_callback(lambda f: scheduler.call_later(0, _online_finish_bot_turn, code, token, f, key=key))
 
-    socketio.start_background_task(_loop)
-def _online_schedule_auto_next_trick(code: str, round_index: int):
-    def _task():
-        try:
-            # Wait for the client-side animations to finish before advancing.
-            # In the UI we animate:
-            #  - card flies in: 2s
-            #  - trick sweeps out to winner: 2s
-            # We gate server-side advancement using st["sweepUntil"].
-            socketio.sleep(0.2)
-            room = ONLINE_ROOMS.get(code)
-            if not room:
-                return
-            st = room["state"]
-            if st.get("phase") != "between_tricks":
-                return
-            if st.get("roundIndex") != round_index:
-                return
-            # If a sweep lock is present, do not advance early.
-            sweep_until = st.get("sweepUntil")
-            if sweep_until and time.time() < sweep_until:
-                socketio.sleep(max(0.0, sweep_until - time.time()))
-                # room/state may have changed while sleeping
-                room = ONLINE_ROOMS.get(code)
-                if not room:
-                    return
-                st = room["state"]
-                if st.get("phase") != "between_tricks" or st.get("roundIndex") != round_index:
-                    return
-            # auto-advance only if there are bots
-            if len(st.get("botSeats", set())) == 0:
-                return
-
-            n = st["n"]
-            st["leader"] = st["winner"]
-            st["turn"] = st["leader"]
-            st["leadSuit"] = None
-            st["table"] = [None for _ in range(n)]
-            st["winner"] = None
-            st["sweepUntil"] = None
-            st["phase"] = "playing"
 
-            _online_emit_full_state(code, room)
+@_online_serialized
+def _online_finish_bot_turn(code: str, token, future):
+    room = _online_live_room(code)
+    if not room:
+        future.cancel()
+        return
+    st = room.state
+    if st.phase != "playing" or _online_turn_token(st) != token:
+        future.cancel()
+        return
+    turn = st.turn
+    if turn is None or turn not in st.botSeats:
+        future.cancel()
+        return
+    card = None
+    if future.done() and not future.cancelled() and future.exception() is None:
+        card = future.result()
+    else:
+        future.cancel()
+    if card not in pw_engine.legal_cards(st, turn):
+        card = _online_bot_choose_card(room, turn)
+    if card is None:
+        return
+    _online_internal_play_card(code, room, turn, card)
 
-            if st.get("turn") in st.get("botSeats", set()):
-                _online_schedule_bot_turn(code)
-        except Exception:
-            return
 
-    socketio.start_background_task(_task)
-def _online_internal_play_card(code: str, room, seat: int, card_key: str):
-    st = room["state"]
-    if st.get("phase") != "playing":
+def _online_arm_bot_watchdog(code: str):
+    """Fail-safe: ensures bots don't stall the game if a scheduled turn is lost.
+
+    Instead of a per-room polling loop, a one-shot stall check is (re)armed
+    every time a bot turn is scheduled. If it fires while it is still a bot's
+    turn and nothing has happened for a while, the bot turn is re-scheduled.
+    """
+    scheduler.call_later(ONLINE_BOT_STALL_SECONDS, _online_bot_watchdog_check, code, key=("bot_watchdog", code))
+
+
+@_online_serialized
+def _online_bot_watchdog_check(code: str):
+    room = _online_live_room(code)
+    if not room:
         return
-    if st.get("turn") != seat:
+    st = room.state
+    if st.phase != 'playing':
+        return
+    turn = st.turn
+    bots = st.botSeats
+    if turn is None or turn not in bots:
         return
 
-    hand = st["hands"][seat]
-    idx = next((i for i, c in enumerate(hand) if _online_card_key(c) == card_key), None)
-    if idx is None:
+    idle = time.time() - (st.lastActionAt or time.time())
+    if idle < ONLINE_BOT_STALL_SECONDS:
+        # Something happened recently; check again once it could have stalled.
+        scheduler.call_later(ONLINE_BOT_STALL_SECONDS - idle, _online_bot_watchdog_check, code, key=("bot_watchdog", code))
+        return
+    if scheduler.pending(("bot_turn", code)):
         return
-    card = hand[idx]
+    _online_schedule_bot_turn(code)
 
-    if st.get("leadSuit") is not None:
-        lead = st["leadSuit"]
-        has_lead = any(c["suit"] == lead for c in hand)
-        if has_lead and card["suit"] != lead:
-            return
 
-    hand.pop(idx)
-    if st.get("leadSuit") is None:
-        st["leadSuit"] = card["suit"]
-    st["table"][seat] = card
+def _online_schedule_auto_next_trick(code: str, round_index: int):
+    # Wait for the client-side animations to finish before advancing.
+    # In the UI we animate:
+    #  - card flies in: 2s
+    #  - trick sweeps out to winner: 2s
+    # We gate server-side advancement using st.sweepUntil.
+    room = ONLINE_ROOMS.get(code)
+    delay = 0.2 * ONLINE_PACE
+    if room:
+        sweep_until = room.state.sweepUntil
+        if sweep_until:
+            delay = max(delay, sweep_until - time.time())
+    scheduler.call_later(delay, _online_auto_next_trick, code, round_index, key=("next_trick", code))
 
-    # Track last action to support bot watchdog
-    st["lastActionAt"] = time.time()
 
-    n = st["n"]
-    nxt = (seat + 1) % n
-    for _ in range(n):
-        if st["table"][nxt] is None:
-            st["turn"] = nxt
-            break
-        nxt = (nxt + 1) % n
+@_online_serialized
+def _online_auto_next_trick(code: str, round_index: int):
+    room = _online_live_room(code)
+    if not room:
+        return
+    st = room.state
+    if st.phase != "between_tricks":
+        return
+    if st.roundIndex != round_index:
+        return
+    # If a sweep lock is present, do not advance early.
+    sweep_until = st.sweepUntil
+    if sweep_until and time.time() < sweep_until:
+        scheduler.call_later(sweep_until - time.time(), _online_auto_next_trick, code, round_index, key=("next_trick", code))
+        return
+    # auto-advance only if there are bots
+    if len(st.botSeats) == 0:
+        return
+
+    pw_engine.next_trick(st)
+    st.sweepUntil = None
+
+    _online_emit_full_state(code, room)
+
+    if st.turn in st.botSeats:
+        _online_schedule_bot_turn(code)
 
-    if all(c is not None for c in st["table"]):
-        winner = st["leader"]
-        best = st["table"][winner]
-        for i in range(n):
-            c = st["table"][i]
-            if _online_compare_cards(c, best, st["leadSuit"]) > 0:
-                best = c
-                winner = i
+def _online_internal_play_card(code: str, room, seat: int, card: int):
+    st = room.state
+    result = pw_engine.play_card(st, seat, card)
+    if result is None:
+        return
 
-        st["winner"] = winner
-        st["tricksRound"][winner] += 1
-        st["tricksTotal"][winner] += 1
+    # Track last action to support bot watchdog
+    st.lastActionAt = time.time()
 
+    if result != pw_engine.PLAYED:
         # Prevent the next trick from starting until the UI has finished animating.
         # UI timing:
         #  - card flies in to the table: 2 seconds
         #  - trick sweeps out to the winner: 2 seconds
         # Total lock: 4 seconds.
-        st["sweepUntil"] = time.time() + 4.0
-
-        if all(len(h) == 0 for h in st["hands"]):
-            bids = [int(b or 0) for b in st["bids"]]
-            taken = list(st["tricksRound"])
-            points = [_online_points_for_round(bids[i], taken[i]) for i in range(n)]
-            for i in range(n):
-                st["pointsTotal"][i] += points[i]
-            st["history"].append({
-                "round": st["roundIndex"] + 1,
-                "cardsPer": int(st.get("cardsPer") or ONLINE_ROUND_CARDS[st["roundIndex"]]),
-                "bids": bids,
-                "taken": taken,
-                "points": points,
-            })
-            st["phase"] = "round_finished"
-            _online_schedule_auto_next_round(code, st["roundIndex"])
+        st.sweepUntil = time.time() + ONLINE_SWEEP_SECONDS
+        if result == pw_engine.ROUND_DONE:
+            _online_schedule_auto_next_round(code, st.roundIndex)
         else:
-            st["phase"] = "between_tricks"
-            _online_schedule_auto_next_trick(code, st["roundIndex"])
+            _online_schedule_auto_next_trick(code, st.roundIndex)
 
     _online_emit_full_state(code, room)
 
-    if st.get("phase") == "playing" and st.get("turn") in st.get("botSeats", set()):
+    if result != pw_engine.PLAYED:
+        _online_await_anims(code, room)
+    if st.phase == "playing" and st.turn in st.botSeats:
         _online_schedule_bot_turn(code)
 
-def _online_emit_full_state(code: str, room):
-    st = room["state"]
-    # broadcast public state
-    socketio.emit("online_state", {"room": code, "seat": None, "state": _online_public_state(room)}, room=code)
-    # send private hand to each member
-    for sid, seat in list(room["members"].items()):
-        hand = st["hands"][seat] if st["hands"][seat] else []
-        payload_state = dict(_online_public_state(room))
-        # Special rule: when cardsPer==1 in bidding/dealing, players see opponents' cards but not their own
-        cards_per = int(st.get("cardsPer") or 0)
-        phase = st.get("phase")
-        if cards_per == 1 and phase in ("dealing","bidding"):
-            payload_state["hands"] = [ (st["hands"][i] if i != seat else None) for i in range(st["n"]) ]
-        else:
-            payload_state["hands"] = [hand if i == seat else None for i in range(st["n"])]
-        socketio.emit("online_state", {"room": code, "seat": seat, "state": payload_state}, to=sid)
+
+def _online_human_seats(room) -> Set[int]:
+    """Human seats a paced step waits on: connected ones, and seats still
+    reserved for a client who is away (a reload or phase page change)."""
+    seats = set(room.members.values())
+    seats.update(int(meta["seat"]) for meta in room.clients.values())
+    return seats - room.state.botSeats
+
+
+def _online_await_anims(code: str, room) -> None:
+    """The room entered a paced step; its frame is out (ONLINE_ORDERED_PHASES
+    send at once), so room.rev is the revision members animate."""
+    if not ONLINE_ANIM_ACKS:
+        return
+    room.animRev = room.rev
+    room.animAcks = set()
+    ONLINE_ANIM_STATS["waits"] += 1
+    _online_check_anims(code, room)
+
+
+def _online_check_anims(code: str, room) -> None:
+    """End the paced step now if every human seat has acked it: its timer
+    is re-armed to run at once (same key, so it runs once). Without any ack
+    (e.g. the last human only disconnected) the fixed deadline stands."""
+    acks = room.animAcks
+    if room.animRev is None or not acks or not _online_human_seats(room) <= acks:
+        return
+    room.animRev = None
+    room.animAcks = set()
+    st = room.state
+    if st.phase == "dealing":
+        st.dealEndsAt = time.time()
+        scheduler.call_later(0, _online_finish_deal, code, st.dealId, key=("deal", code))
+    elif st.phase == "between_tricks":
+        # Rooms without bots wait for "next"; that click is let through now.
+        st.sweepUntil = None
+        scheduler.call_later(0, _online_auto_next_trick, code, st.roundIndex, key=("next_trick", code))
+    elif st.phase == "round_finished":
+        st.sweepUntil = None
+        scheduler.call_later(0, _online_auto_next_round, code, st.roundIndex, key=("next_round", code))
+    else:
+        return
+    ONLINE_ANIM_STATS["early"] += 1
+
+# Public fields that only ever grow by appending rows; patches send the new tail.
+ONLINE_APPEND_FIELDS = ("history",)
+
+
+def _online_public_patch(room, public):
+    """Diff `public` against what the room last saw and bump the revision.
+
+    Returns (set, append); both empty when nothing public changed.
+    """
+    sent = room.sentPublic
+    changed = {}
+    append = {}
+    for key, value in public.items():
+        if key in ONLINE_APPEND_FIELDS:
+            prev_len = sent.get(key)
+            if prev_len is None or len(value) < prev_len:
+                changed[key] = value
+            elif len(value) > prev_len:
+                append[key] = value[prev_len:]
+            sent[key] = len(value)
+            continue
+        encoded = json.dumps(value, ensure_ascii=False)
+        if sent.get(key) != encoded:
+            changed[key] = value
+            sent[key] = encoded
+    return changed, append
+
+
+def _online_public_channel(code: str) -> str:
+    # Socket.IO room for spectators / room-level listeners (public state only).
+    return f"{code}:public"
+
+
+def _online_send_snapshot(code: str, room, sid, seat, public=None):
+    st = room.state
+    payload_state = dict(public if public is not None else room.to_public())
+    if seat is None:
+        payload_state["hands"] = [None for _ in range(st.n)]
+    else:
+        payload_state["hands"] = room.to_private(seat)
+        room.sync[sid] = {
+            "rev": room.rev,
+            "hands": json.dumps(payload_state["hands"], ensure_ascii=False),
+        }
+    # Public-channel listeners follow the public revision chain.
+    rev = room.publicRev if seat is None else room.rev
+    if ONLINE_WIRE.get(sid) == pw_wire.CODEC:
+        transport.emit("online_state", pw_wire.state(code, seat, rev, payload_state), to=sid)
+        return
+    transport.emit("online_state", {"room": code, "seat": seat, "rev": rev, "state": payload_state}, to=sid)
+
+
+def _online_emit_full_state(code: str, room, now: bool = False):
+    """Mark the room's state as changed; members get it with the next frame.
+
+    The frame goes out at once when frames are off, when `now` is set
+    (callers that send a snapshot right after), or when the room just
+    entered one of ONLINE_ORDERED_PHASES. Handlers whose caller waits for
+    the state (create, join) pass `now` as well.
+    """
+    st = room.state
+    room.touchedAt = time.time()
+    _online_mark_dirty(code)
+    ONLINE_ROOMS.note_phase(code, st.phase)
+    ONLINE_FRAME_STATS["changes"] += 1
+    phase = st.phase
+    if now or ONLINE_FRAME_SECONDS <= 0 or (phase in ONLINE_ORDERED_PHASES and phase != room.framePhase):
+        if room.frameDue:
+            room.frameDue = False
+            scheduler.cancel(("frame", code))
+        ONLINE_FRAME_STATS["immediate"] += 1
+        _online_send_frame(code, room)
+    elif not room.frameDue:
+        room.frameDue = True
+        scheduler.call_later(ONLINE_FRAME_SECONDS, _online_frame_due, code, key=("frame", code))
+
+
+@_online_serialized
+def _online_frame_due(code: str):
+    room = _online_live_room(code)
+    if room and room.frameDue:
+        room.frameDue = False
+        _online_send_frame(code, room)
+
+
+def _online_send_frame(code: str, room):
+    """Single-pass emission of the room's state as revision-tagged deltas.
+
+    The public state is built and diffed once; the resulting patch is
+    serialized once and shared by every message. Each member then gets one
+    `online_update` (shared public part + its own hands when they changed),
+    members without a snapshot (join/rejoin/resync) get a full
+    `online_state`, and the public channel gets `online_public`.
+    """
+    st = room.state
+    room.framePhase = st.phase
+    ONLINE_FRAME_STATS["frames"] += 1
+    public = room.to_public()
+    changed, append = _online_public_patch(room, public)
+    public_json = None
+    if changed or append:
+        room.rev = room.rev + 1
+        public_json = json.dumps({"set": changed, "append": append}, ensure_ascii=False)
+        transport.emit(
+            "online_public",
+            {"room": code, "base": room.publicRev, "rev": room.rev, "public": public_json},
+            to=_online_public_channel(code),
+        )
+        room.publicRev = room.rev
+
+    sync = room.sync
+    members = room.members
+    for sid in [s for s in sync if s not in members]:
+        sync.pop(sid, None)
+
+    snapshots = []
+    updates = []
+    for sid, seat in list(members.items()):
+        entry = sync.get(sid)
+        if entry is None:
+            snapshots.append((sid, seat))
+            continue
+        hands = room.to_private(seat)
+        encoded = json.dumps(hands, ensure_ascii=False)
+        if entry["hands"] != encoded:
+            updates.append((sid, seat, entry, hands, encoded))
+        elif public_json is not None:
+            updates.append((sid, seat, entry, None, encoded))
+    if public_json is None and updates:
+        # A private-only change (hands) still advances the revision.
+        room.rev = room.rev + 1
+
+    rev = room.rev
+    packed_patch = None
+    for sid, seat, entry, hands, encoded in updates:
+        if ONLINE_WIRE.get(sid) == pw_wire.CODEC:
+            if packed_patch is None and public_json is not None:
+                packed_patch = pw_wire.pack_patch(changed, append)
+            frame = pw_wire.update(code, seat, entry["rev"], rev, packed_patch, hands, hands is not None)
+            entry["rev"] = rev
+            entry["hands"] = encoded
+            transport.emit("online_update", frame, to=sid)
+            continue
+        payload = {"room": code, "seat": seat, "base": entry["rev"], "rev": rev}
+        if public_json is not None:
+            payload["public"] = public_json
+        if hands is not None:
+            payload["hands"] = hands
+        entry["rev"] = rev
+        entry["hands"] = encoded
+        transport.emit("online_update", payload, to=sid)
+    for sid, seat in snapshots:
+        _online_send_snapshot(code, room, sid, seat, public)
+
+# ---------- Online room persistence ----------
+def _online_mark_dirty(code: str):
+    store.mark_dirty(("online", code), functools.partial(_online_room_record, code))
+
+
+def _online_room_record(code: str) -> Optional[str]:
+    """JSON record of a room for the store; None while the room is busy."""
+    room = ONLINE_ROOMS.get(code)
+    if room is None:
+        # A hibernated room is written from its blob, without waking it.
+        blob = ONLINE_HIBERNATED.get(code)
+        return None if blob is None else _online_record_json(code, pw_hibernate.unpack(blob))
+    lock = _online_acquire(code, blocking=False)
+    if lock is None:
+        return None
+    try:
+        return _online_record_json(code, room)
+    finally:
+        lock.release()
+
+
+def _online_record_json(code: str, room) -> str:
+    st = room.state.to_dict()
+    st["botSeats"] = sorted(st["botSeats"])
+    # Live connections (members, per-sid sync) do not survive a restart;
+    # clients re-attach to their seat by clientId.
+    return json.dumps({
+        "code": code,
+        "botLevel": room.botLevel,
+        "clients": room.clients,
+        "rev": room.rev,
+        "publicRev": room.publicRev,
+        "state": st,
+    }, ensure_ascii=False)
+
+
+def _online_get_room(code: str):
+    """Room by code; a hibernated room is thawed, and after a restart the
+    room is loaded from the store on first access and its timers are
+    started again. Call under the room lock."""
+    room = ONLINE_ROOMS.get(code)
+    if room is not None:
+        room.touchedAt = time.time()
+        return room
+    if not code or not pw_shard.owns(code):
+        return None
+    blob = ONLINE_HIBERNATED.take(code)
+    if blob is not None:
+        room = pw_hibernate.unpack(blob)
+        ONLINE_ROOMS.wake(code, room)
+        _online_watch_idle(code, room)
+        return room
+    record = store.load(("online", code))
+    if record is None:
+        return None
+    room = pw_state.Room(code, pw_state.GameState.from_dict(record["state"]),
+                         _online_parse_bot_level(record.get("botLevel")), record.get("clients") or {},
+                         record.get("rev", 0), record.get("publicRev", 0))
+    room.emptySince = time.time()
+    with ONLINE_ROOMS_LOCK:
+        existing = ONLINE_ROOMS.get(code)
+        if existing is not None:
+            return existing
+        ONLINE_ROOMS.add(code, room)
+    _online_restart_timers(code, room)
+    # Nobody is connected yet: the policy applies until someone joins.
+    _online_abandon(code, room)
+    _online_watch_idle(code, room)
+    return room
+
+
+def _online_watch_idle(code: str, room) -> None:
+    """Start the idle clock of a room that just became live."""
+    room.touchedAt = time.time()
+    if ONLINE_HIBERNATE_SECONDS > 0:
+        scheduler.call_later(ONLINE_HIBERNATE_SECONDS, _online_hibernate_due, code, key=("hibernate", code))
+
+
+@_online_serialized
+def _online_hibernate_due(code: str):
+    room = ONLINE_ROOMS.get(code)
+    if room is None:
+        return
+    idle = time.time() - room.touchedAt
+    if idle < ONLINE_HIBERNATE_SECONDS:
+        # Touched since the clock started; look again when it could be idle.
+        scheduler.call_later(ONLINE_HIBERNATE_SECONDS - idle, _online_hibernate_due, code, key=("hibernate", code))
+        return
+    busy = room.frameDue or room.pendingBotTakeover or any(
+        scheduler.pending((key, code)) for key in ONLINE_ROOM_TIMERS)
+    if busy:
+        scheduler.call_later(ONLINE_HIBERNATE_SECONDS, _online_hibernate_due, code, key=("hibernate", code))
+        return
+    ONLINE_HIBERNATED.put(code, pw_hibernate.pack(room))
+    ONLINE_ROOMS.hibernate(code)
+    # The next handler for the code makes a new lock (see _online_acquire).
+    with ONLINE_ROOMS_LOCK:
+        ONLINE_ROOM_LOCKS.pop(code, None)
+
+
+def _online_restart_timers(code: str, room):
+    """Re-arm the timers a rehydrated room was waiting on, from its stored
+    deadlines (dealEndsAt, sweepUntil, lastActionAt)."""
+    st = room.state
+    phase = st.phase
+    now = time.time()
+    if phase == "dealing":
+        delay = max(0.0, float(st.dealEndsAt or now) - now)
+        scheduler.call_later(delay, _online_finish_deal, code, st.dealId, key=("deal", code))
+    elif phase == "playing":
+        if st.turn in st.botSeats:
+            _online_schedule_bot_turn(code)
+    elif phase == "between_tricks":
+        _online_schedule_auto_next_trick(code, st.roundIndex)
+    elif phase == "round_finished":
+        delay = max(0.0, float(st.lastActionAt or now) + ONLINE_NEXT_ROUND_SECONDS - now)
+        scheduler.call_later(delay, _online_auto_next_round, code, st.roundIndex, key=("next_round", code))
+    if phase not in ("lobby", "game_finished"):
+        _online_schedule_predeal(code)
+        # Players who do not come back are replaced by bots as after a disconnect.
+        for client_id, meta in room.clients.items():
+            seat = int(meta.get("seat"))
+            if seat not in st.botSeats:
+                _online_schedule_bot_takeover(code, seat, client_id)
+
 
 def _online_mark_seat_bot_takeover(code: str, room, seat: int):
-    st = room["state"]
-    if st.get("phase") == "lobby":
+    st = room.state
+    if st.phase == "lobby":
         return
-    bot_seats = set(st.get("botSeats", set()))
+    bot_seats = set(st.botSeats)
     if seat not in bot_seats:
-        prev_name = st["names"][seat] or f"Spiller {seat+1}"
-        st["names"][seat] = f"Computer (overtog {prev_name})"
+        prev_name = st.names[seat] or f"Spiller {seat+1}"
+        st.names[seat] = f"Computer (overtog {prev_name})"
         bot_seats.add(seat)
-        st["botSeats"] = bot_seats
+        st.botSeats = bot_seats
 
-    if st.get("phase") == "bidding":
+    if st.phase == "bidding":
         _online_bot_choose_bid(room)
-        if all(b is not None for b in st["bids"]):
-            st["phase"] = "playing"
-            st["turn"] = st["leader"]
-            st["lastActionAt"] = time.time()
+        if all(b is not None for b in st.bids):
+            st.phase = "playing"
+            st.turn = st.leader
+            st.lastActionAt = time.time()
 
     _online_emit_full_state(code, room)
 
-    if st.get("phase") == "playing" and st.get("turn") in st.get("botSeats", set()):
+    if st.phase == "playing" and st.turn in st.botSeats:
         _online_schedule_bot_turn(code)
 
+# A player who stays away this long is replaced by a bot (PW_TAKEOVER_SECONDS;
+# load tests shorten it to exercise the takeover path).
+ONLINE_BOT_TAKEOVER_SECONDS = float(os.environ.get("PW_TAKEOVER_SECONDS", "30"))
+
+
 def _online_schedule_bot_takeover(code: str, seat: int, client_id: Optional[str]):
     room = ONLINE_ROOMS.get(code)
     if not room:
         return
-    pending = room.setdefault("pendingBotTakeover", {})
+    if room.suspended and ONLINE_ABANDONED_POLICY == "suspend":
+        # the seat stays with its clientId while the room is on hold
+        return
+    pending = room.pendingBotTakeover
     if seat in pending:
         return
     marker = time.time()
     pending[seat] = marker
+    scheduler.call_later(
+        ONLINE_BOT_TAKEOVER_SECONDS,
+        _online_bot_takeover_due, code, seat, client_id, marker,
+        key=("takeover", code, seat),
+    )
 
-    def _task():
+
+@_online_serialized
+def _online_bot_takeover_due(code: str, seat: int, client_id: Optional[str], marker: float):
+    room2 = ONLINE_ROOMS.get(code)
+    if not room2:
+        return
+    st2 = room2.state
+    pending2 = room2.pendingBotTakeover
+    if pending2.get(seat) != marker:
+        return
+    pending2.pop(seat, None)
+    if st2.phase == "lobby":
+        return
+    if seat in room2.members.values():
+        return
+    if client_id and client_id in room2.clients:
         try:
-            socketio.sleep(30)
-            room2 = ONLINE_ROOMS.get(code)
-            if not room2:
-                return
-            st2 = room2["state"]
-            pending2 = room2.get("pendingBotTakeover", {})
-            if pending2.get(seat) != marker:
-                return
-            pending2.pop(seat, None)
-            if st2.get("phase") == "lobby":
-                return
-            if seat in room2.get("members", {}).values():
-                return
-            if client_id and client_id in (room2.get("clients") or {}):
-                try:
-                    last_seen = float(room2["clients"][client_id].get("lastSeen", 0) or 0)
-                except Exception:
-                    last_seen = 0.0
-                if time.time() - last_seen < 30:
-                    return
-                room2["clients"].pop(client_id, None)
-            _online_mark_seat_bot_takeover(code, room2, seat)
+            last_seen = float(room2.clients[client_id].get("lastSeen", 0) or 0)
         except Exception:
+            last_seen = 0.0
+        if time.time() - last_seen < ONLINE_BOT_TAKEOVER_SECONDS:
             return
+        room2.clients.pop(client_id, None)
+    _online_mark_seat_bot_takeover(code, room2, seat)
+    if room2.suspended:
+        # fastforward policy: the room may be all bots now
+        _online_abandon(code, room2)
+
 
-    socketio.start_background_task(_task)
 def _online_schedule_auto_next_round(code: str, round_index: int):
     # Start next round automatically 2 seconds after the final card of a round is played.
-    def _task():
-        try:
-            socketio.sleep(2)
-            room = ONLINE_ROOMS.get(code)
-            if not room:
-                return
-            st = room["state"]
-            # Only advance if we are still on the same finished round
-            if st.get("phase") != "round_finished":
-                return
-            if st.get("roundIndex") != round_index:
-                return
-            # Prevent duplicate advancement
-            if st.get("autoNextDoneFor") == round_index:
-                return
-            st["autoNextDoneFor"] = round_index
-
-            n = st["n"]
-            if st["roundIndex"] >= 13:
-                st["phase"] = "game_finished"
-            else:
-                st["roundIndex"] += 1
-                # Start next round with a short 'dealing' phase.
-                _online_start_deal_phase(code, room, st["roundIndex"])
-                return
+    scheduler.call_later(ONLINE_NEXT_ROUND_SECONDS, _online_auto_next_round, code, round_index, key=("next_round", code))
 
-            _online_emit_full_state(code, room)
-            if st.get("phase") == "playing" and st.get("turn") in st.get("botSeats", set()):
-                _online_schedule_bot_turn(code)
-        except Exception:
-            # don't crash the server on background task errors
-            return
 
-    socketio.start_background_task(_task)
+@_online_serialized
+def _online_auto_next_round(code: str, round_index: int):
+    room = _online_live_room(code)
+    if not room:
+        return
+    st = room.state
+    # Only advance if we are still on the same finished round
+    if st.phase != "round_finished":
+        return
+    if st.roundIndex != round_index:
+        return
+    # Prevent duplicate advancement
+    if st.autoNextDoneFor == round_index:
+        return
+    st.autoNextDoneFor = round_index
+
+    if st.roundIndex >= 13:
+        st.phase = "game_finished"
+    else:
+        st.roundIndex += 1
+        # Start next round with a short 'dealing' phase.
+        _online_start_deal_phase(code, room, st.roundIndex)
+        return
+
+    _online_emit_full_state(code, room)
+    if st.phase == "playing" and st.turn in st.botSeats:
+        _online_schedule_bot_turn(code)
 
 
+# Abandoned rooms (see ONLINE_ABANDONED_POLICY). A suspended room has no
+# game timers; timer callbacks already on their way (and the bot pool's
+# done-callback) find it through _online_live_room and do nothing.
+ONLINE_ROOM_TIMERS = ("deal", "bot_turn", "bot_move", "bot_watchdog", "next_trick", "next_round", "frame", "predeal")
+ONLINE_SUSPENDED: Set[str] = set()
+ONLINE_ABANDONED_STATS = {"suspended": 0, "resumed": 0, "fastForwarded": 0}
+
+
+def _online_live_room(code: str):
+    """The room for a timer callback: None when it is gone or suspended."""
+    room = ONLINE_ROOMS.get(code)
+    if room is None or room.suspended:
+        return None
+    return room
+
+
+def _online_abandon(code: str, room) -> None:
+    """Apply the abandoned-room policy to a room nobody is connected to.
+    Call under the room lock; it is safe to call again."""
+    st = room.state
+    if ONLINE_ABANDONED_POLICY == "run" or room.members or st.phase in ("lobby", "game_finished"):
+        return
+    if ONLINE_ABANDONED_POLICY == "fastforward" and len(st.botSeats) == st.n:
+        _online_fast_forward(code, room)
+        return
+    for key in ONLINE_ROOM_TIMERS:
+        scheduler.cancel((key, code))
+    room.frameDue = False
+    if ONLINE_ABANDONED_POLICY == "suspend":
+        # Players get their seats back by clientId, however long they stay away.
+        for seat in room.pendingBotTakeover:
+            scheduler.cancel(("takeover", code, seat))
+        room.pendingBotTakeover = {}
+    if not room.suspended:
+        room.suspended = True
+        ONLINE_SUSPENDED.add(code)
+        ONLINE_ABANDONED_STATS["suspended"] += 1
+
+
+def _online_resume(code: str, room) -> None:
+    """Someone is back: re-arm the timers of a suspended room."""
+    if room.suspended:
+        room.suspended = False
+        ONLINE_SUSPENDED.discard(code)
+        ONLINE_ABANDONED_STATS["resumed"] += 1
+        _online_restart_timers(code, room)
+
+
+def _online_fast_forward(code: str, room) -> None:
+    """Play an all-bot room to the end in one go: engine moves only (the
+    baseline bots, no search), no pacing and no emits but the last one."""
+    for key in ONLINE_ROOM_TIMERS:
+        scheduler.cancel((key, code))
+    room.frameDue = False
+    if room.suspended:
+        room.suspended = False
+        ONLINE_SUSPENDED.discard(code)
+    st = room.state
+    while st.phase != "game_finished":
+        phase = st.phase
+        if phase == "dealing":
+            st.phase = "bidding"
+        elif phase == "bidding":
+            _online_bot_choose_bid(room)
+            st.phase = "playing"
+            st.turn = st.leader
+        elif phase == "playing":
+            seat = st.turn
+            if pw_engine.play_card(st, seat, _online_bot_choose_card(room, seat)) is None:
+                break  # cannot happen with the baseline bot; never spin
+        elif phase == "between_tricks":
+            pw_engine.next_trick(st)
+        elif phase == "round_finished":
+            if st.roundIndex >= 13:
+                st.phase = "game_finished"
+            else:
+                _online_deal_round(st, st.roundIndex + 1)
+                st.phase = "dealing"
+        else:
+            break
+    st.sweepUntil = None
+    st.dealEndsAt = None
+    st.lastActionAt = time.time()
+    ONLINE_ABANDONED_STATS["fastForwarded"] += 1
+    _online_emit_full_state(code, room, now=True)
+
 
 def _online_cleanup_sid(sid):
-    for code, room in list(ONLINE_ROOMS.items()):
+    for code in ONLINE_SEATS.rooms_of(sid):
+        with _online_locked(code):
+            _online_detach_sid(code, sid)
+
+
+def _online_detach_sid(code: str, sid):
+    room = _online_get_room(code)
+    if room:
         # Detach member; keep seat reservation for a short time so a browser
         # navigation (redirect/reload) can re-attach to the same seat.
-        seat = room["members"].pop(sid, None)
-        client_id = None
-        try:
-            client_id = room.get("sidToClient", {}).pop(sid, None)
-        except Exception:
-            client_id = None
+        seat, client_id = _online_detach(code, room, sid)
         if seat is not None:
-            try:
-                leave_room(code)
-            except Exception:
-                pass
-            st = room["state"]
+            # The others may all have acked already.
+            _online_check_anims(code, room)
+            st = room.state
             # If we know the client id, keep the name and refresh lastSeen.
-            if client_id and room.get("clients") and client_id in room["clients"]:
-                room["clients"][client_id]["lastSeen"] = time.time()
+            if client_id and room.clients and client_id in room.clients:
+                room.clients[client_id]["lastSeen"] = time.time()
             else:
-                if st.get("phase") == "lobby":
-                    st["names"][seat] = None
+                if st.phase == "lobby":
+                    st.names[seat] = None
             # if room empty, keep it briefly (redirects/reloads) then purge later
-            if not room["members"]:
-                room["emptySince"] = time.time()
+            if not room.members:
+                _online_mark_empty(code, room)
+                _online_mark_dirty(code)
             else:
-                room["emptySince"] = None
+                room.emptySince = None
                 _online_emit_full_state(code, room)
 
-            if st.get("phase") != "lobby" and seat is not None:
+            if st.phase != "lobby" and seat is not None:
                 _online_schedule_bot_takeover(code, seat, client_id)
 
 # ---------- Online multiplayer socket events ----------
-@socketio.on("online_create_room")
+@socket_event("online_create_room")
 def online_create_room(data):
     _online_purge_old_rooms()
     client_id = (data.get("clientId") or data.get("client_id") or "").strip() or None
@@ -837,10 +1505,6 @@ def online_create_room(data):
     if bots > n_players - 1:
         bots = n_players - 1
 
-    code = _online_room_code()
-    while code in ONLINE_ROOMS:
-        code = _online_room_code()
-
     names = [None for _ in range(n_players)]
     names[0] = name
 
@@ -848,180 +1512,152 @@ def online_create_room(data):
     for i, seat in enumerate(sorted(list(bot_seats))):
         names[seat] = f"Computer {i+1}"
 
-    room = {
-        "code": code,
-        "emptySince": None,
-        "members": {request.sid: 0},
-        # Stable client mapping (clientId -> seat) to survive redirects/reloads.
-        "clients": {},
-        "sidToClient": {},
-        "state": {
-            "n": n_players,
-            "names": names,
-            "botSeats": bot_seats,
-            "roundIndex": 0,
-            "leader": 0,
-            "turn": 0,
-            "leadSuit": None,
-            "table": [None for _ in range(n_players)],
-            "winner": None,
-            "phase": "lobby",
-            "hands": [None for _ in range(n_players)],
-            "bids": [None for _ in range(n_players)],
-            # Deal animation meta
-            "dealId": 0,
-            "dealSeq": None,
-            "cardsPer": None,
-            "dealEndsAt": None,
-            "tricksRound": [0 for _ in range(n_players)],
-            "tricksTotal": [0 for _ in range(n_players)],
-            "pointsTotal": [0 for _ in range(n_players)],
-            "history": [],
-            "autoNextDoneFor": None,
-        "lastActionAt": time.time(),
-        "botScheduledAt": 0.0,
-        "botScheduledTurn": None,
-        "botWatchdogStarted": False,
-        }
-    }
+    room = pw_state.Room(None, _online_new_state(n_players, names, bot_seats),
+                         _online_parse_bot_level(data.get("botLevel")))
     if client_id:
-        room["clients"][client_id] = {"seat": 0, "lastSeen": time.time()}
-        room["sidToClient"][request.sid] = client_id
-    ONLINE_ROOMS[code] = room
-    join_room(code)
+        room.clients[client_id] = {"seat": 0, "lastSeen": time.time()}
+    try:
+        code = ONLINE_ROOMS.allocate()
+    except pw_rooms.CodeSpaceExhausted:
+        transport.reply("error", {"message": "Der er ingen ledige rumkoder lige nu. Prøv igen om lidt."})
+        return
+    room.code = code
+    ONLINE_ROOMS.add(code, room)
+    _online_watch_idle(code, room)
 
-    # send state (seat 0)
-    st = dict(_online_public_state(room))
-    st["hands"] = [[]] + [None for _ in range(n_players-1)]
-    emit("online_state", {"room": code, "seat": 0, "state": st})
+    with _online_locked(code):
+        _online_attach(code, room, transport.sid(), 0, client_id)
 
-@socketio.on("online_join_room")
+        # send state (seat 0)
+        _online_emit_full_state(code, room, now=True)
+
+@socket_event("online_join_room")
+@_online_serialized_handler
 def online_join_room(data):
     _online_purge_old_rooms()
     code = (data.get("room") or "").strip()
     name = (data.get("name") or "").strip() or "Spiller"
     client_id = (data.get("clientId") or data.get("client_id") or "").strip() or None
     if (not code.isdigit()) or len(code) != 4:
-        emit("error", {"message": "Rumkode skal være 4 tal."})
+        transport.reply("error", {"message": "Rumkode skal være 4 tal."})
         return
-    room = ONLINE_ROOMS.get(code)
+    if not pw_shard.owns(code):
+        # Connected to the wrong worker; the client reconnects with ?shard=code.
+        transport.reply("online_reroute", {"room": code})
+        return
+    room = _online_get_room(code)
     if not room:
-        emit("error", {"message": "Rum ikke fundet."})
+        transport.reply("error", {"message": "Rum ikke fundet."})
         return
 
-    room["emptySince"] = None
-    st = room["state"]
-    n = st["n"]
+    room.emptySince = None
+    st = room.state
+    n = st.n
     # Seats currently occupied by live members
-    occupied = set(room["members"].values())
+    occupied = set(room.members.values())
     # Seats reserved for recently-seen clients (redirect/reload)
     now = time.time()
-    for cid, meta in (room.get("clients") or {}).items():
+    for cid, meta in room.clients.items():
         try:
             if now - float(meta.get("lastSeen", 0)) < 30:
                 occupied.add(int(meta.get("seat")))
         except Exception:
             continue
-    bot_seats = set(st.get("botSeats", set()))
+    bot_seats = set(st.botSeats)
     # If the client has joined before, re-attach to the same seat.
     seat = None
-    if client_id and room.get("clients") and client_id in room["clients"]:
-        seat = int(room["clients"][client_id]["seat"])
-        room["clients"][client_id]["lastSeen"] = now
+    if client_id and room.clients and client_id in room.clients:
+        seat = int(room.clients[client_id]["seat"])
+        room.clients[client_id]["lastSeen"] = now
     else:
         seat = next((i for i in range(n) if i not in occupied and i not in bot_seats), None)
     if seat is None:
-        emit("error", {"message": "Rummet er fuldt."})
+        transport.reply("error", {"message": "Rummet er fuldt."})
         return
 
     # If this client already had a different sid in the room, detach it.
     if client_id:
-        for sid_existing, cid in list((room.get("sidToClient") or {}).items()):
-            if cid == client_id and sid_existing in room["members"]:
-                room["members"].pop(sid_existing, None)
-                room["sidToClient"].pop(sid_existing, None)
+        stale = ONLINE_SEATS.sid_of(client_id, code)
+        if stale is not None:
+            _online_detach(code, room, stale)
 
-    room["members"][request.sid] = seat
+    _online_attach(code, room, transport.sid(), seat, client_id)
     if client_id:
-        room.setdefault("clients", {})[client_id] = {"seat": seat, "lastSeen": now}
-        room.setdefault("sidToClient", {})[request.sid] = client_id
-    st["names"][seat] = name
-    join_room(code)
+        room.clients[client_id] = {"seat": seat, "lastSeen": now}
+    st.names[seat] = name
 
-    _online_emit_full_state(code, room)
+    # the joiner waits for its snapshot: no frame delay
+    _online_emit_full_state(code, room, now=True)
 
-@socketio.on("online_leave_room")
+@socket_event("online_leave_room")
+@_online_serialized_handler
 def online_leave_room(data):
     code = (data.get("room") or "").strip()
     client_id = (data.get("clientId") or data.get("client_id") or "").strip() or None
-    room = ONLINE_ROOMS.get(code)
+    room = _online_get_room(code)
     if not room:
-        emit("online_left")
+        transport.reply("online_left")
         return
 
-    seat = room["members"].pop(request.sid, None)
+    seat, _ = _online_detach(code, room, transport.sid())
     # also clear stable mapping for this client (explicit leave means really gone)
-    try:
-        room.get("sidToClient", {}).pop(request.sid, None)
-    except Exception:
-        pass
     if client_id:
         try:
-            room.get("clients", {}).pop(client_id, None)
+            room.clients.pop(client_id, None)
         except Exception:
             pass
-    leave_room(code)
 
     if seat is not None:
-        st = room["state"]
-        if st.get("phase") == "lobby":
-            st["names"][seat] = None
+        st = room.state
+        if st.phase == "lobby":
+            st.names[seat] = None
         else:
             _online_mark_seat_bot_takeover(code, room, seat)
-            if not room["members"]:
-                room["emptySince"] = time.time()
+            if not room.members:
+                _online_mark_empty(code, room)
             else:
-                room["emptySince"] = None
-            emit("online_left")
+                room.emptySince = None
+            transport.reply("online_left")
             return
         # IMPORTANT: Do NOT delete the room immediately when it becomes empty.
         # Redirects/navigation between phase pages can briefly leave the room
         # with 0 live members, and immediate deletion causes "Rum ikke fundet"
         # on the next page load. We keep the room for a short TTL.
-        if not room["members"]:
-            room["emptySince"] = time.time()
+        if not room.members:
+            _online_mark_empty(code, room)
         else:
-            room["emptySince"] = None
+            room.emptySince = None
             _online_emit_full_state(code, room)
 
-    emit("online_left")
+    transport.reply("online_left")
 
-@socketio.on("online_start_game")
+@socket_event("online_start_game")
+@_online_serialized_handler
 def online_start_game(data):
     code = (data.get("room") or "").strip()
-    room = ONLINE_ROOMS.get(code)
+    room = _online_get_room(code)
     if not room:
-        emit("error", {"message": "Rum ikke fundet."})
+        transport.reply("error", {"message": "Rum ikke fundet."})
         return
 
-    st = room["state"]
-    if st["phase"] != "lobby":
+    st = room.state
+    if st.phase != "lobby":
         return
 
-    human_joined = len(room["members"])
+    human_joined = len(room.members)
     if human_joined < 1:
-        emit("error", {"message": "Der skal være mindst 1 menneske og mindst 2 spillere i alt (inkl. computere)."})
+        transport.reply("error", {"message": "Der skal være mindst 1 menneske og mindst 2 spillere i alt (inkl. computere)."})
         return
 
     # Auto-fill bots to match total players minus physical (human) players.
-    n_players = int(st.get("n") or 0)
+    n_players = st.n
     if n_players < 2:
-        emit("error", {"message": "Der skal være mindst 2 spillere i alt."})
+        transport.reply("error", {"message": "Der skal være mindst 2 spillere i alt."})
         return
 
-    human_seats = set(room.get("members", {}).values())
+    human_seats = set(room.members.values())
     bot_seats = set(range(n_players)) - human_seats
-    names = list(st.get("names") or [])
+    names = list(st.names)
     if len(names) < n_players:
         names.extend([None for _ in range(n_players - len(names))])
     elif len(names) > n_players:
@@ -1036,20 +1672,21 @@ def online_start_game(data):
             if not names[seat]:
                 names[seat] = f"Spiller {seat+1}"
 
-    st["names"] = names
-    st["botSeats"] = bot_seats
+    st.names = names
+    st.botSeats = bot_seats
 
     # Start round 1 with a short 'dealing' phase so clients can animate
     # the deal visibly before bots can advance the game.
-    st["roundIndex"] = 0
+    st.roundIndex = 0
     _online_start_deal_phase(code, room, 0)
 
 
-@socketio.on("online_update_lobby")
+@socket_event("online_update_lobby")
+@_online_serialized_handler
 def online_update_lobby(data):
     """Host-only lobby configuration.
 
-    Allows changing player count and bot count while phase is 'lobby'.
+    Allows changing player count, bot count and bot strength while phase is 'lobby'.
     Safety rules:
       - Only seat 0 (host) may change config
       - Only allowed while only the host is connected (no other humans)
@@ -1057,26 +1694,26 @@ def online_update_lobby(data):
     """
     _online_purge_old_rooms()
     code = (data.get("room") or "").strip()
-    room = ONLINE_ROOMS.get(code)
+    room = _online_get_room(code)
     if not room:
-        emit("error", {"message": "Rum ikke fundet."})
+        transport.reply("error", {"message": "Rum ikke fundet."})
         return
 
-    seat = room["members"].get(request.sid)
+    seat = room.members.get(transport.sid())
     if seat != 0:
-        emit("error", {"message": "Kun værten kan ændre opsætningen."})
+        transport.reply("error", {"message": "Kun værten kan ændre opsætningen."})
         return
 
-    st = room["state"]
-    if st.get("phase") != "lobby":
+    st = room.state
+    if st.phase != "lobby":
         return
 
     # If other humans are connected, don't allow reshaping seats.
-    if len(room["members"]) > 1:
-        emit("error", {"message": "Kan ikke ændre opsætning når andre spillere er i rummet."})
+    if len(room.members) > 1:
+        transport.reply("error", {"message": "Kan ikke ændre opsætning når andre spillere er i rummet."})
         return
 
-    n_players = int(data.get("players") or st.get("n") or 4)
+    n_players = int(data.get("players") or st.n or 4)
     if n_players < 2 or n_players > 8:
         n_players = 4
 
@@ -1099,7 +1736,7 @@ def online_update_lobby(data):
     if incoming_name:
         host_name = incoming_name
     else:
-        host_name = _normalize_name((st.get("names") or ["Spiller 1"])[0], "Spiller 1")
+        host_name = _normalize_name((st.names or ["Spiller 1"])[0], "Spiller 1")
 
     names = [None for _ in range(n_players)]
     names[0] = host_name
@@ -1108,160 +1745,236 @@ def online_update_lobby(data):
     for i, s in enumerate(sorted(list(bot_seats))):
         names[s] = f"Computer {i+1}"
 
-    room["state"] = {
-        "n": n_players,
-        "names": names,
-        "botSeats": bot_seats,
-        "roundIndex": 0,
-        "leader": 0,
-        "turn": 0,
-        "leadSuit": None,
-        "table": [None for _ in range(n_players)],
-        "winner": None,
-        "phase": "lobby",
-        "hands": [None for _ in range(n_players)],
-        "bids": [None for _ in range(n_players)],
-        # Deal animation meta
-        "dealId": 0,
-        "dealSeq": None,
-        "cardsPer": None,
-        "dealEndsAt": None,
-        "tricksRound": [0 for _ in range(n_players)],
-        "tricksTotal": [0 for _ in range(n_players)],
-        "pointsTotal": [0 for _ in range(n_players)],
-        "history": [],
-        "autoNextDoneFor": None,
-        "lastActionAt": time.time(),
-        "botScheduledAt": 0.0,
-        "botScheduledTurn": None,
-        "botWatchdogStarted": False,
-    }
+    room.state = _online_new_state(n_players, names, bot_seats)
+    room.botLevel = _online_parse_bot_level(data.get("botLevel"), room.botLevel)
 
     _online_emit_full_state(code, room)
 
-@socketio.on("online_set_bid")
+@socket_event("online_set_bid")
+@_online_serialized_handler
 def online_set_bid(data):
     code = (data.get("room") or "").strip()
-    room = ONLINE_ROOMS.get(code)
+    room = _online_get_room(code)
     if not room:
-        emit("error", {"message": "Rum ikke fundet."})
+        transport.reply("error", {"message": "Rum ikke fundet."})
         return
 
-    st = room["state"]
-    if st["phase"] != "bidding":
+    st = room.state
+    if st.phase != "bidding":
         return
 
-    seat = room["members"].get(request.sid, None)
+    seat = room.members.get(transport.sid(), None)
     if seat is None:
-        emit("error", {"message": "Du er ikke i rummet."})
+        transport.reply("error", {"message": "Du er ikke i rummet."})
         return
 
-    if st["bids"][seat] is not None:
-        emit("error", {"message": "Dit bud er allerede gemt."})
+    if st.bids[seat] is not None:
+        transport.reply("error", {"message": "Dit bud er allerede gemt."})
         return
 
-    max_bid = int(st.get("cardsPer") or ONLINE_ROUND_CARDS[st["roundIndex"]])
+    max_bid = int(st.cardsPer or ONLINE_ROUND_CARDS[st.roundIndex])
     try:
         bid = int(data.get("bid"))
     except Exception:
         bid = 0
     if bid < 0 or bid > max_bid:
-        emit("error", {"message": f"Bud skal være mellem 0 og {max_bid}."})
+        transport.reply("error", {"message": f"Bud skal være mellem 0 og {max_bid}."})
         return
 
-    st["bids"][seat] = bid
+    st.bids[seat] = bid
 
     # when all bids submitted -> start playing
-    if all(b is not None for b in st["bids"]):
-        st["phase"] = "playing"
-        st["turn"] = st["leader"]
-        st["lastActionAt"] = time.time()
+    if all(b is not None for b in st.bids):
+        st.phase = "playing"
+        st.turn = st.leader
+        st.lastActionAt = time.time()
 
     _online_emit_full_state(code, room)
 
     # If the bidding phase just transitioned into playing and it is a bot's
     # turn (very common with 2 players when the leader rotates each round),
     # we must schedule the bot's opening lead immediately.
-    if st.get("phase") == "playing" and st.get("turn") in st.get("botSeats", set()):
+    if st.phase == "playing" and st.turn in st.botSeats:
         _online_schedule_bot_turn(code)
 
-@socketio.on("online_play_card")
+@socket_event("online_play_card")
+@_online_serialized_handler
 def online_play_card(data):
     code = (data.get("room") or "").strip()
     card_key = (data.get("card") or "").strip()
-    room = ONLINE_ROOMS.get(code)
+    room = _online_get_room(code)
     if not room:
-        emit("error", {"message": "Rum ikke fundet."})
+        transport.reply("error", {"message": "Rum ikke fundet."})
         return
 
-    st = room["state"]
-    if st["phase"] != "playing":
+    st = room.state
+    if st.phase != "playing":
         return
 
-    seat = room["members"].get(request.sid, None)
+    seat = room.members.get(transport.sid(), None)
     if seat is None:
-        emit("error", {"message": "Du er ikke i rummet."})
+        transport.reply("error", {"message": "Du er ikke i rummet."})
         return
-    if st["turn"] != seat:
-        emit("error", {"message": "Det er ikke din tur."})
+    if st.turn != seat:
+        transport.reply("error", {"message": "Det er ikke din tur."})
         return
 
-    _online_internal_play_card(code, room, seat, card_key)
+    card = pw_cards.KEY_TO_ID.get(card_key)
+    if card is None:
+        return
+    _online_internal_play_card(code, room, seat, card)
     return
 
-@socketio.on("online_next")
+@socket_event("online_next")
+@_online_serialized_handler
 def online_next(data):
     code = (data.get("room") or "").strip()
-    room = ONLINE_ROOMS.get(code)
+    room = _online_get_room(code)
     if not room:
-        emit("error", {"message": "Rum ikke fundet."})
+        transport.reply("error", {"message": "Rum ikke fundet."})
         return
 
-    st = room["state"]
-    n = st["n"]
+    st = room.state
 
-    if st["phase"] == "between_tricks":
-        sweep_until = st.get("sweepUntil")
+    if st.phase == "between_tricks":
+        sweep_until = st.sweepUntil
         if sweep_until and time.time() < sweep_until:
             # Ignore early "next" clicks while the trick is still sweeping to the winner.
             return
-        st["leader"] = st["winner"]
-        st["turn"] = st["leader"]
-        st["leadSuit"] = None
-        st["table"] = [None for _ in range(n)]
-        st["winner"] = None
-        st["sweepUntil"] = None
-        st["phase"] = "playing"
-
-    elif st["phase"] == "round_finished":
-        if st["roundIndex"] >= 13:
-            st["phase"] = "game_finished"
+        pw_engine.next_trick(st)
+        st.sweepUntil = None
+
+    elif st.phase == "round_finished":
+        if st.roundIndex >= 13:
+            st.phase = "game_finished"
         else:
-            st["roundIndex"] += 1
-            hands, _ = _online_deal(n, st["roundIndex"])
-            st["hands"] = hands
-            st["leader"] = (st["roundIndex"] % st["n"])
-            st["turn"] = st["leader"]
-            st["leadSuit"] = None
-            st["table"] = [None for _ in range(n)]
-            st["winner"] = None
-            st["bids"] = [None for _ in range(n)]
-            st["tricksRound"] = [0 for _ in range(n)]
-            st["phase"] = "bidding"
-
-    _online_bot_choose_bid(room)
-    if all(b is not None for b in st["bids"]):
-        st["phase"] = "playing"
-        st["turn"] = st["leader"]
-        st["lastActionAt"] = time.time()
+            _online_start_round(st, st.roundIndex + 1)
+            st.phase = "bidding"
+            _online_schedule_predeal(code)
+
+    if st.phase == "bidding":
+        _online_bot_choose_bid(room)
+        if all(b is not None for b in st.bids):
+            st.phase = "playing"
+            st.turn = st.leader
+            st.lastActionAt = time.time()
 
     _online_emit_full_state(code, room)
-    if st.get("phase") == "playing" and st.get("turn") in st.get("botSeats", set()):
+    if st.phase == "playing" and st.turn in st.botSeats:
         _online_schedule_bot_turn(code)
 
-@socketio.on("disconnect")
+@socket_event("online_watch")
+@_online_serialized_handler
+def online_watch(data):
+    """Subscribe to the room's public channel (no seat, no hands)."""
+    code = (data.get("room") or "").strip()
+    if not pw_shard.owns(code):
+        transport.reply("online_reroute", {"room": code})
+        return
+    room = _online_get_room(code)
+    if not room:
+        transport.reply("error", {"message": "Rum ikke fundet."})
+        return
+    _online_emit_full_state(code, room, now=True)
+    transport.join(_online_public_channel(code))
+    _online_send_snapshot(code, room, transport.sid(), None)
+
+@socket_event("online_resync")
+@_online_serialized_handler
+def online_resync(data):
+    """Client detected a revision gap: send a fresh snapshot to this sid."""
+    code = (data.get("room") or "").strip()
+    room = _online_get_room(code)
+    if not room:
+        transport.reply("error", {"message": "Rum ikke fundet."})
+        return
+    # Flush pending public changes first so the snapshot's rev is exact.
+    room.sync.pop(transport.sid(), None)
+    _online_emit_full_state(code, room, now=True)
+    if transport.sid() not in room.members:
+        _online_send_snapshot(code, room, transport.sid(), None)
+
+@socket_event("online_anim_done")
+@_online_serialized_handler
+def online_anim_done(data):
+    """The client finished animating revision `rev` of a paced step."""
+    code = (data.get("room") or "").strip()
+    room = _online_get_room(code)
+    if not room or room.animRev is None:
+        return
+    seat = room.members.get(transport.sid())
+    try:
+        rev = int(data.get("rev"))
+    except (TypeError, ValueError):
+        return
+    if seat is None or rev < room.animRev:
+        return
+    room.animAcks.add(seat)
+    _online_check_anims(code, room)
+
+@socket_event("online_round_analysis")
+@_online_serialized_handler
+def online_round_analysis(data):
+    """Exact best-bid analysis of a finished round (small rounds only).
+
+    For every seat: the score it could guarantee for each bid on the hands
+    as dealt, with the other seats playing against it, and the best bid.
+    Solved in the bot pool; the reply goes to this sid only.
+    """
+    code = (data.get("room") or "").strip()
+    room = _online_get_room(code)
+    if not room:
+        transport.reply("error", {"message": "Rum ikke fundet."})
+        return
+    st = room.state
+    try:
+        round_no = int(data.get("round") or 0)
+    except (TypeError, ValueError):
+        round_no = 0
+    dealt_rounds = st.dealtHistory
+    if not 1 <= round_no <= len(dealt_rounds):
+        transport.reply("error", {"message": "Runden er ikke færdig."})
+        return
+    dealt = dealt_rounds[round_no - 1]
+    if sum(len(h) for h in dealt) > pw_solver.ANALYSIS_MAX_CARDS:
+        transport.reply("error", {"message": "Runden er for stor til analyse."})
+        return
+    row = st.history[round_no - 1]
+    leader = (round_no - 1) % st.n
+    sid = transport.sid()
+
+    def _send(seats):
+        for item in seats:
+            item["bid"] = row["bids"][item["seat"]]
+            item["taken"] = row["taken"][item["seat"]]
+        transport.emit("online_round_analysis", {"room": code, "round": round_no, "seats": seats}, to=sid)
+
+    future = bot_pool.submit(pw_solver.round_analysis, dealt, leader)
+    if future is None:
+        _send(pw_solver.round_analysis(dealt, leader))
+        return
+
+    def _done(f):
+        if f.cancelled() or f.exception() is not None:
+            transport.emit("error", {"message": "Analysen mislykkedes."}, to=sid)
+            return
+        _send(f.result())
+    future.add_done_callback(_done)
+
+@socket_event("online_wire")
+def online_wire(data):
+    """Pick the wire codec for this connection (see pw_wire)."""
+    codec = pw_wire.negotiate((data or {}).get("accept"))
+    if codec == pw_wire.JSON:
+        ONLINE_WIRE.pop(transport.sid(), None)
+    else:
+        ONLINE_WIRE[transport.sid()] = codec
+    transport.reply("online_wire", {"codec": codec})
+
+@socket_event("disconnect")
 def online_disconnect():
-    _online_cleanup_sid(request.sid)
+    ONLINE_WIRE.pop(transport.sid(), None)
+    _online_cleanup_sid(transport.sid())
 
 
 if __name__ == "__main__":
@@ -0,0 +1,128 @@
+"""Asyncio server entry point (ASGI, native WebSockets).
+
+Serves the same Socket.IO events as app.py from python-socketio's
+AsyncServer on one event loop, instead of Flask-SocketIO's threading mode
+where every connected player holds a thread. The handlers in app.py are
+unchanged: they run on the loop through ``pw_transport.AsyncTransport``.
+Room timers and bot turns run on an ``AsyncScheduler`` (loop timer
+handles, no threads), so an idle connection costs a few kilobytes.
+Pages and admin endpoints are still served by the Flask app, on the
+default thread pool.
+
+  uvicorn asgi:application --host 0.0.0.0 --port $PORT
+
+The threading server (gunicorn app:app) stays the default. The cross-process
+queue here is redis:// (AsyncRedisManager); the in-repo pw:// broker is
+threading mode only.
+"""
+from __future__ import annotations
+
+import asyncio
+import io
+import sys
+from typing import Any, Dict, List, Tuple
+
+import socketio
+
+import app as pw
+import pw_scheduler
+import pw_shard
+import pw_transport
+
+
+class WsgiBridge:
+    """Serve a WSGI app over ASGI HTTP, each request on the thread pool."""
+
+    def __init__(self, wsgi_app):
+        self.wsgi_app = wsgi_app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            if scope["type"] == "websocket":
+                await send({"type": "websocket.close"})
+            return
+        body = b""
+        more = True
+        while more:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return
+            body += message.get("body", b"")
+            more = message.get("more_body", False)
+        environ = self._environ(scope, body)
+        loop = asyncio.get_running_loop()
+        status, headers, chunks = await loop.run_in_executor(None, self._call, environ)
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": b"".join(chunks)})
+
+    @staticmethod
+    def _environ(scope, body: bytes) -> Dict[str, Any]:
+        server = scope.get("server") or ("localhost", 80)
+        client = scope.get("client") or ("", 0)
+        environ = {
+            "REQUEST_METHOD": scope["method"],
+            "SCRIPT_NAME": scope.get("root_path", "").encode("utf-8").decode("latin-1"),
+            "PATH_INFO": scope["path"].encode("utf-8").decode("latin-1"),
+            "QUERY_STRING": scope.get("query_string", b"").decode("latin-1"),
+            "SERVER_NAME": str(server[0]),
+            "SERVER_PORT": str(server[1]),
+            "SERVER_PROTOCOL": f"HTTP/{scope.get('http_version', '1.1')}",
+            "REMOTE_ADDR": client[0],
+            "CONTENT_LENGTH": str(len(body)),
+            "wsgi.version": (1, 0),
+            "wsgi.url_scheme": scope.get("scheme", "http"),
+            "wsgi.input": io.BytesIO(body),
+            "wsgi.errors": sys.stderr,
+            "wsgi.multithread": True,
+            "wsgi.multiprocess": False,
+            "wsgi.run_once": False,
+        }
+        for name, value in scope.get("headers", []):
+            key = name.decode("latin-1").upper().replace("-", "_")
+            value = value.decode("latin-1")
+            if key == "CONTENT_TYPE":
+                environ["CONTENT_TYPE"] = value
+            elif key != "CONTENT_LENGTH":
+                key = "HTTP_" + key
+                environ[key] = f"{environ[key]},{value}" if key in environ else value
+        return environ
+
+    def _call(self, environ) -> Tuple[int, List[Tuple[bytes, bytes]], List[bytes]]:
+        started: Dict[str, Any] = {}
+
+        def start_response(status, headers, exc_info=None):
+            started["status"] = int(status.split(" ", 1)[0])
+            started["headers"] = [(k.lower().encode("latin-1"), v.encode("latin-1")) for k, v in headers]
+
+        result = self.wsgi_app(environ, start_response)
+        try:
+            chunks = [bytes(c) for c in result]
+        finally:
+            if hasattr(result, "close"):
+                result.close()
+        return started["status"], started["headers"], chunks
+
+
+def _client_manager():
+    url = pw_shard.MESSAGE_QUEUE
+    if not url:
+        return None
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return socketio.AsyncRedisManager(url)
+    raise ValueError(f"PW_MESSAGE_QUEUE {url!r}: the asyncio server supports redis:// only")
+
+
+sio = socketio.AsyncServer(async_mode="asgi", cors_allowed_origins="*", client_manager=_client_manager(),
+                           serializer=pw.metrics.packet_class())
+pw.transport = pw_transport.AsyncTransport(sio)
+pw.scheduler = pw_scheduler.AsyncScheduler()
+pw.transport.register(pw.SOCKET_HANDLERS)
+
+
+async def _startup():
+    loop = asyncio.get_running_loop()
+    pw.scheduler.bind(loop)
+    pw.transport.bind(loop)
+
+
+application = socketio.ASGIApp(sio, other_asgi_app=WsgiBridge(pw.app), on_startup=_startup)
@@ -1555,10 +1555,10 @@ function runTrickSweepAnimationQueued(winnerSeat, cardsBySeat){
   try{
     const pending = Object.values(PW_ANIM.flyPromises || {}).filter(Boolean);
     if (pending.length){
-      return Promise.allSettled(pending).then(() => {
-        setTimeout(() => runTrickSweepAnimation(winnerSeat, cardsBySeat), 20);
-        return PW_ANIM.sweepPromise;
-      });
+      // Resolves when the sweep itself is done, not when it starts.
+      return Promise.allSettled(pending).then(() => new Promise((res) => {
+        setTimeout(() => { runTrickSweepAnimation(winnerSeat, cardsBySeat); res(PW_ANIM.sweepPromise); }, 20);
+      }));
     }
   }catch(e){ /* ignore */ }
   runTrickSweepAnimation(winnerSeat, cardsBySeat);
@@ -1723,10 +1723,19 @@ function bootFromUrl(){
   // socket connect. Without a guard we can join twice and get a new seat.
   if (!roomCode && !joinInProgress) joinRoom(code);
 }
+// Sharded servers route every request on ?shard= to the worker that owns
+// the room: the room code from the URL, or a random code before we have a
+// room (a room created on this connection gets a code on the same shard).
+function shardKey(){
+  const qp = new URLSearchParams(window.location.search || "");
+  const code = normalizeCode(qp.get("code"));
+  if (/^\d{4}$/.test(code)) return code;
+  return String(Math.floor(Math.random() * 10000)).padStart(4, "0");
+}
 const socket = GUIDE_MODE ? {
   connected:false,
   on(){}, off(){}, emit(){}, connect(){}, disconnect(){},
-} : io({ transports: ["websocket", "polling"] });
+} : io({ transports: ["websocket", "polling"], query: { shard: shardKey() } });
 
 
 function emitWhenConnected(fn){
@@ -1750,10 +1759,16 @@ let lastRoundLoggedKey = null;
 let lastGameStartKey = null;
 let lastGameFinishKey = null;
 let prevState = null;
+// Delta sync: revision of the state we hold; patches must build on it.
+let stateRev = null;
+let resyncPending = false;
 
 socket.on("connect", () => {
   const s = el("olRoomStatus");
   if (s) s.textContent = "Forbundet.";
+  // Ask for the compact binary format; until the server answers (or if it
+  // cannot), messages stay JSON.
+  if (typeof TextDecoder !== "undefined") socket.emit("online_wire", { accept: [PW_WIRE_CODEC] });
   bootFromUrl();
 });
 
@@ -1849,6 +1864,21 @@ socket.on("error", (data) => {
   showRoomWarn(msg);
 });
 
+// The room lives on another worker: reconnect routed by its code and join.
+socket.on("online_reroute", (payload) => {
+  const room = normalizeCode(payload?.room);
+  const query = socket.io?.opts?.query || {};
+  if (!room || query.shard === room){
+    joinInProgress = false;
+    pendingJoinRoom = null;
+    showRoomWarn("Rum ikke fundet.");
+    return;
+  }
+  socket.io.opts.query = { ...query, shard: room };
+  socket.disconnect();
+  joinRoom(room);
+});
+
 function handleOnlineState(payload){
   joinInProgress = false;
   pendingJoinRoom = null;
@@ -1856,6 +1886,10 @@ function handleOnlineState(payload){
   joinRetryCount = 0;
   roomCode = payload.room;
   if (payload.seat !== null && payload.seat !== undefined) mySeat = payload.seat;
+  if (payload.rev !== null && payload.rev !== undefined){
+    stateRev = payload.rev;
+    resyncPending = false;
+  }
   prevState = state;
   state = payload.state;
   try{ if (PW_DEBUG?.enabled){ PW_DEBUG.setLastState(); PW_DEBUG.push('state', {phase: state?.phase, turn: state?.turn, leadSuit: state?.leadSuit, n: state?.n, cardsPer: state?.cardsPer}); } }catch(e){}
@@ -1950,6 +1984,7 @@ function handleOnlineState(payload){
   syncPlayerCount();
   updateAutoBotCountDisplay();
   maybeRunAnimations();
+  scheduleAnimAck();
 
 render();
 updateAutoBotCountDisplay();
@@ -1971,8 +2006,170 @@ try{
 }catch(e){ /* ignore */ }
 }
 
+// Paced steps (deal, trick sweep, round end): tell the server once our
+// animations for this revision are done, so it can move on before its fixed
+// timeout when every player is ready. Only seated players ack.
+const ANIM_ACK_PHASES = ["dealing", "between_tricks", "round_finished"];
+let animAckRev = null;
+function scheduleAnimAck(){
+  if (GUIDE_MODE || typeof mySeat !== "number" || !state || !ANIM_ACK_PHASES.includes(state.phase)) return;
+  const room = roomCode;
+  const rev = stateRev;
+  if (rev === null || rev === undefined || animAckRev === rev) return;
+  animAckRev = rev;
+  // Animations start a little after the state arrives (see maybeRunAnimations).
+  setTimeout(async () => {
+    try{
+      await Promise.allSettled([PW_ANIM.dealQueued, PW_ANIM.sweepQueued,
+        ...Object.values(PW_ANIM.flyPromises || {})].filter(Boolean));
+    }catch(e){ /* ignore */ }
+    if (roomCode === room) socket.emit("online_anim_done", { room, rev });
+  }, 200);
+}
+
+function requestResync(){
+  if (resyncPending || !roomCode) return;
+  resyncPending = true;
+  socket.emit("online_resync", { room: roomCode });
+}
+
+// Compact wire format (see pw_wire.py): after "online_wire" the server may
+// send online_state / online_update as MessagePack frames with positional
+// fields and one byte per card. They are turned back into the JSON shape here.
+const PW_WIRE_CODEC = "msgpack1";
+const PW_WIRE_KEYS = ["n", "names", "roundIndex", "cardsPer", "leader", "turn", "leadSuit", "table", "winner", "phase",
+  "bids", "tricksRound", "tricksTotal", "pointsTotal", "history", "botSeats", "botLevel", "dealId",
+  "dealSeq", "hands"];
+const PW_WIRE_HISTORY = ["round", "cardsPer", "bids", "taken", "points"];
+const PW_WIRE_SUITS = ["♠", "♥", "♦", "♣"];
+const PW_WIRE_RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"];
+const PW_WIRE_NO_CARD = 255;
+
+function msgpackDecode(bytes){
+  const view = new DataView(bytes.buffer, bytes.byteOffset, bytes.byteLength);
+  const utf8 = new TextDecoder();
+  let pos = 0;
+  const str = (n) => { const s = utf8.decode(bytes.subarray(pos, pos + n)); pos += n; return s; };
+  const bin = (n) => { const b = bytes.subarray(pos, pos + n); pos += n; return b; };
+  const arr = (n) => { const a = new Array(n); for (let i = 0; i < n; i++) a[i] = read(); return a; };
+  const map = (n) => { const m = {}; for (let i = 0; i < n; i++){ const k = read(); m[k] = read(); } return m; };
+  const u8 = () => bytes[pos++];
+  const u16 = () => { const v = view.getUint16(pos); pos += 2; return v; };
+  const u32 = () => { const v = view.getUint32(pos); pos += 4; return v; };
+  function read(){
+    const t = bytes[pos++];
+    if (t < 0x80) return t;
+    if (t < 0x90) return map(t & 0x0f);
+    if (t < 0xa0) return arr(t & 0x0f);
+    if (t < 0xc0) return str(t & 0x1f);
+    if (t >= 0xe0) return t - 0x100;
+    let v;
+    switch (t){
+      case 0xc0: return null;
+      case 0xc2: return false;
+      case 0xc3: return true;
+      case 0xc4: return bin(u8());
+      case 0xc5: return bin(u16());
+      case 0xc6: return bin(u32());
+      case 0xca: v = view.getFloat32(pos); pos += 4; return v;
+      case 0xcb: v = view.getFloat64(pos); pos += 8; return v;
+      case 0xcc: return u8();
+      case 0xcd: return u16();
+      case 0xce: return u32();
+      case 0xcf: v = Number(view.getBigUint64(pos)); pos += 8; return v;
+      case 0xd0: v = view.getInt8(pos); pos += 1; return v;
+      case 0xd1: v = view.getInt16(pos); pos += 2; return v;
+      case 0xd2: v = view.getInt32(pos); pos += 4; return v;
+      case 0xd3: v = Number(view.getBigInt64(pos)); pos += 8; return v;
+      case 0xd9: return str(u8());
+      case 0xda: return str(u16());
+      case 0xdb: return str(u32());
+      case 0xdc: return arr(u16());
+      case 0xdd: return arr(u32());
+      case 0xde: return map(u16());
+      case 0xdf: return map(u32());
+    }
+    throw new Error("msgpack type 0x" + t.toString(16));
+  }
+  return read();
+}
+
+function pwWireCard(id){
+  return { suit: PW_WIRE_SUITS[Math.floor(id / 13)], rank: PW_WIRE_RANKS[id % 13] };
+}
+
+function pwWireValue(key, v){
+  if (v === null || v === undefined) return null;
+  if (key === "table") return Array.from(v, (c) => (c === PW_WIRE_NO_CARD ? null : pwWireCard(c)));
+  if (key === "hands") return v.map((h) => (h ? Array.from(h, pwWireCard) : null));
+  if (key === "leadSuit") return PW_WIRE_SUITS[v];
+  if (key === "history") return v.map((row) => Object.fromEntries(PW_WIRE_HISTORY.map((f, i) => [f, row[i]])));
+  return v;
+}
+
+function pwWireFields(fields){
+  const out = {};
+  Object.keys(fields || {}).forEach((k) => {
+    const key = /^[0-9]+$/.test(k) ? PW_WIRE_KEYS[Number(k)] : k;
+    out[key] = pwWireValue(key, fields[k]);
+  });
+  return out;
+}
+
+// JSON-shaped message for `event`; JSON messages pass through unchanged.
+function pwWireMessage(event, msg){
+  let bytes = null;
+  if (msg instanceof ArrayBuffer) bytes = new Uint8Array(msg);
+  else if (ArrayBuffer.isView(msg)) bytes = new Uint8Array(msg.buffer, msg.byteOffset, msg.byteLength);
+  if (!bytes) return msg;
+  const items = msgpackDecode(bytes);
+  if (event === "online_state"){
+    return { room: items[0], seat: items[1], rev: items[2], state: pwWireFields(items[3]) };
+  }
+  const out = { room: items[0], seat: items[1], base: items[2], rev: items[3] };
+  if (items[4]) out.public = { set: pwWireFields(items[4][0]), append: pwWireFields(items[4][1]) };
+  if (items.length > 5) out.hands = pwWireValue("hands", items[5]);
+  return out;
+}
+
+// Apply a revision-tagged delta on top of the current state. `public` is the
+// shared, pre-serialized patch (whole top-level fields in `set`, new history
+// rows in `append`); `hands` is only present when our own view changed. The
+// result is a new object so prevState keeps pointing at the old one.
+function applyStateDelta(payload){
+  if (!state || payload.room !== roomCode) return null;
+  if (resyncPending) return null;
+  if (payload.base !== stateRev){
+    requestResync();
+    return null;
+  }
+  const next = Object.assign({}, state);
+  if (payload.public){
+    const patch = (typeof payload.public === "string") ? JSON.parse(payload.public) : payload.public;
+    Object.assign(next, patch.set || {});
+    const append = patch.append || {};
+    Object.keys(append).forEach((key) => {
+      next[key] = (Array.isArray(state[key]) ? state[key] : []).concat(append[key]);
+    });
+  }
+  if (payload.hands) next.hands = payload.hands;
+  return next;
+}
+
+function handleOnlineUpdate(payload){
+  const next = applyStateDelta(payload);
+  if (next) handleOnlineState({ room: payload.room, seat: payload.seat, rev: payload.rev, state: next });
+}
+
+function handleOnlinePublic(payload){
+  const next = applyStateDelta(payload);
+  if (next) handleOnlineState({ room: payload.room, seat: null, rev: payload.rev, state: next });
+}
+
 if (!GUIDE_MODE){
-  socket.on("online_state", handleOnlineState);
+  socket.on("online_state", (msg) => handleOnlineState(pwWireMessage("online_state", msg)));
+  socket.on("online_update", (msg) => handleOnlineUpdate(pwWireMessage("online_update", msg)));
+  socket.on("online_public", handleOnlinePublic);
 }
 if (GUIDE_MODE){
   // Guide mode renders deterministic demo scenes without server/socket.
@@ -2015,6 +2212,7 @@ socket.on("online_left", () => {
   roomCode = null;
   mySeat = null;
   state = null;
+  stateRev = null;
   const rl = el("olRoomLabel"); if (rl) rl.textContent = "-";
   const sl = el("olSeatLabel"); if (sl) sl.textContent = "-";
   const s = el("olRoomStatus");
@@ -2030,6 +2228,7 @@ function myName(){
   return v || s || "Spiller";
 }
 function playerCount(){ return parseInt(el("olPlayerCount")?.value || "4", 10); }
+function botLevel(){ return el("olBotLevel")?.value || "normal"; }
 
 function getHumanCount(){
   if (state && Array.isArray(state.names)){
@@ -2072,6 +2271,11 @@ function syncPlayerCount(){
   } else {
     sel.disabled = false;
   }
+  const levelSel = el("olBotLevel");
+  if (levelSel){
+    if (roomCode && state && state.botLevel) levelSel.value = state.botLevel;
+    levelSel.disabled = !!(roomCode && state) && !(isHost && inLobby);
+  }
   updateAutoBotCountDisplay();
 }
 
@@ -2083,6 +2287,7 @@ function updateLobbyConfig(){
     room: roomCode,
     players: playerCount(),
     bots: 0,
+    botLevel: botLevel(),
     name: myName(),
   });
 }
@@ -2098,7 +2303,8 @@ function createRoom(){
       clientId: getClientId(),
       name: myName(),
       players: playerCount(),
-      bots: 0
+      bots: 0,
+      botLevel: botLevel()
     });
     pendingCreateRoom = false;
   });
@@ -2317,7 +2523,8 @@ function maybeRunAnimations(){
     const key = `dealId_${state.dealId}`;
     if (!window.__pwDealDone[key]){
       window.__pwDealDone[key] = true;
-      setTimeout(() => runDealAnimation(state.dealSeq || []), 120);
+      const seq = state.dealSeq || [];
+      PW_ANIM.dealQueued = new Promise((res) => setTimeout(() => res(runDealAnimation(seq)), 120));
     }
   }
 
@@ -2365,7 +2572,9 @@ function maybeRunAnimations(){
         window.__pwSweepDone = window.__pwSweepDone || {};
         if (!window.__pwSweepDone[key]){
           window.__pwSweepDone[key] = true;
-          setTimeout(()=> runTrickSweepAnimationQueued(state.winner, (prevState && prevState.table) ? prevState.table : (state.table || [])), 30);
+          const winner = state.winner;
+          const cards = (prevState && prevState.table) ? prevState.table : (state.table || []);
+          PW_ANIM.sweepQueued = new Promise((res) => setTimeout(() => res(runTrickSweepAnimationQueued(winner, cards)), 30));
         }
       }catch(e){ /* ignore */ }
     }
@@ -2821,6 +3030,7 @@ el("olPlayerCount")?.addEventListener("change", () => {
   updateLobbyConfig();
   render();
 });
+el("olBotLevel")?.addEventListener("change", updateLobbyConfig);
 
 
 // --- Debug freeze detector (play input) ---
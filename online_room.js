@@ -147,6 +147,9 @@ let autoJoinRequested = false;
 let mySeat = null;
 let state = null;
 let prevState = null;
+// Delta sync: revision of the state we hold; patches must build on it.
+let stateRev = null;
+let resyncPending = false;
 
 socket.on("connect", () => {
   const s = el("olRoomStatus");
@@ -157,9 +160,42 @@ socket.on("error", (data) => {
   showRoomWarn(data?.message || "Ukendt fejl");
 });
 
-socket.on("online_state", (payload) => {
+function requestResync(){
+  if (resyncPending || !roomCode) return;
+  resyncPending = true;
+  socket.emit("online_resync", { room: roomCode });
+}
+
+// Apply a revision-tagged delta: `public` is the shared, pre-serialized patch
+// and `hands` is only present when our own view changed.
+socket.on("online_update", (payload) => {
+  if (!state || payload.room !== roomCode || resyncPending) return;
+  if (payload.base !== stateRev){
+    requestResync();
+    return;
+  }
+  const next = Object.assign({}, state);
+  if (payload.public){
+    const patch = JSON.parse(payload.public);
+    Object.assign(next, patch.set || {});
+    const append = patch.append || {};
+    Object.keys(append).forEach((key) => {
+      next[key] = (Array.isArray(state[key]) ? state[key] : []).concat(append[key]);
+    });
+  }
+  if (payload.hands) next.hands = payload.hands;
+  applyOnlineState({ room: payload.room, seat: payload.seat, rev: payload.rev, state: next });
+});
+
+socket.on("online_state", (payload) => applyOnlineState(payload));
+
+function applyOnlineState(payload){
   roomCode = payload.room;
   if (payload.seat !== null && payload.seat !== undefined) mySeat = payload.seat;
+  if (payload.rev !== null && payload.rev !== undefined){
+    stateRev = payload.rev;
+    resyncPending = false;
+  }
   prevState = state;
   state = payload.state;
   updateOnlinePageFromState();
@@ -172,12 +208,13 @@ socket.on("online_state", (payload) => {
   updateAutoBotCountDisplay();
   maybeRunAnimations();
   render();
-});
+}
 
 socket.on("online_left", () => {
   roomCode = null;
   mySeat = null;
   state = null;
+  stateRev = null;
   const rl = el("olRoomLabel"); if (rl) rl.textContent = "-";
   const sl = el("olSeatLabel"); if (sl) sl.textContent = "-";
   const s = el("olRoomStatus");
@@ -454,6 +454,29 @@ socket.on("state", (s) => {
   render();
 });
 
+// Cell edits arrive as batched patches; anything else as full state.
+socket.on("cell_patch", (msg) => {
+  if (!state || state.phase !== "game") return;
+  let changed = false;
+  for (const p of (msg?.patches || [])) {
+    if (p.rev <= (state.rev || 0)) continue;
+    const row = state.data?.[p.round]?.[p.player];
+    if (!row) continue;
+    row[p.field] = p.value;
+    state.rev = p.rev;
+    changed = true;
+    if (p.round === localCurrentRound) {
+      const inp = document.querySelector(`#roundCard input[data-round="${p.round}"][data-player="${p.player}"][data-field="${p.field}"]`);
+      // Do not overwrite the field the user is typing in.
+      if (inp && inp !== document.activeElement) inp.value = isNumber(p.value) ? String(p.value) : "";
+    }
+  }
+  if (!changed) return;
+  renderRoundHeaderStatus();
+  renderRoundTotalsLine();
+  renderOverview();
+});
+
 socket.on("left", () => {
   roomCode = null;
   state = null;
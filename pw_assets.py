@@ -0,0 +1,171 @@
+"""Static assets: public file list, precompressed variants, caching.
+
+Only the files the pages need are public: HTML/JS/CSS/images in the repo
+root, ``assets/`` and ``cardkit/`` (``PUBLIC_DIRS``/``PUBLIC_TYPES``).
+Everything else (data/, scripts/, *.py, ...) is a 404.
+
+``scripts/build_assets.py`` writes ``dist/``: every JS/CSS file under a
+content-hashed name (``online.<hash>.js``), pages rewritten to point at
+those names, gzip and brotli variants, and ``dist/manifest.json``.
+``Assets`` serves from that manifest when it exists:
+
+- the encoding is picked from Accept-Encoding (br, then gzip, then plain);
+- every variant has a strong ETag, and If-None-Match gets a 304;
+- hashed names are ``Cache-Control: immutable`` for a year, so phase-page
+  navigation does not fetch the bundles again; pages and unhashed names
+  are ``no-cache`` (revalidated by ETag);
+- file contents are read once and kept in memory.
+
+Without ``dist/`` the source files are served the same way (in memory,
+ETag, gzip made on first read), just without hashed names or brotli.
+"""
+from __future__ import annotations
+
+import gzip
+import hashlib
+import json
+import mimetypes
+import os
+import threading
+from typing import Any, Dict, Optional, Tuple
+
+from flask import Response, abort, request
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+DIST = os.path.join(ROOT, "dist")
+
+PUBLIC_DIRS = ("", "assets", "cardkit")
+PUBLIC_TYPES = (".html", ".js", ".css", ".png", ".svg", ".jpg", ".webp", ".ico")
+# Public-looking files that are not part of the site.
+PRIVATE_FILES = ("server.js",)
+# Types worth compressing (images already are).
+COMPRESS_TYPES = (".html", ".js", ".css", ".svg")
+# Hashed into the file name by the build (pages keep their URL).
+HASHED_TYPES = (".js", ".css")
+
+IMMUTABLE = "public, max-age=31536000, immutable"
+REVALIDATE = "no-cache"
+
+ENCODINGS = ("br", "gzip")
+SUFFIX = {"br": ".br", "gzip": ".gz"}
+
+
+def is_public(path: str) -> bool:
+    """Is `path` (relative URL path) a file the site serves?"""
+    folder, _, name = path.rpartition("/")
+    return (folder in PUBLIC_DIRS and name not in PRIVATE_FILES and not name.startswith((".", "_"))
+            and name.endswith(PUBLIC_TYPES))
+
+
+def public_files(root: str = ROOT):
+    """Relative paths of all public files under `root`, sorted."""
+    out = []
+    for folder in PUBLIC_DIRS:
+        base = os.path.join(root, folder)
+        if not os.path.isdir(base):
+            continue
+        for name in os.listdir(base):
+            rel = f"{folder}/{name}" if folder else name
+            if is_public(rel) and os.path.isfile(os.path.join(base, name)):
+                out.append(rel)
+    return sorted(out)
+
+
+def digest(data: bytes) -> str:
+    return hashlib.sha256(data).hexdigest()
+
+
+class Assets:
+    def __init__(self, root: str = ROOT, dist: str = DIST):
+        self.root = root
+        self.dist = dist
+        self.manifest: Dict[str, Dict[str, Any]] = {}
+        self._urls: Dict[str, Tuple[str, bool]] = {}  # URL path -> (manifest key, immutable)
+        self._cache: Dict[Tuple[str, str], Tuple[bytes, str]] = {}  # (key, encoding) -> (body, etag)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.not_modified = 0
+        path = os.path.join(dist, "manifest.json")
+        if os.path.isfile(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self.manifest = json.load(f)["files"]
+            for key, entry in self.manifest.items():
+                self._urls[key] = (key, False)
+                if entry["file"] != key:
+                    self._urls[entry["file"]] = (key, True)
+
+    @property
+    def built(self) -> bool:
+        return bool(self.manifest)
+
+    def url(self, path: str) -> str:
+        """URL to reference `path` by (its hashed name when built)."""
+        entry = self.manifest.get(path)
+        return "/" + (entry["file"] if entry else path)
+
+    def _resolve(self, path: str) -> Optional[Tuple[str, bool]]:
+        if self.built:
+            return self._urls.get(path)
+        return (path, False) if is_public(path) else None
+
+    def _load(self, key: str, encoding: str) -> Optional[Tuple[bytes, str]]:
+        cached = self._cache.get((key, encoding))
+        if cached is not None:
+            return cached
+        if self.built:
+            entry = self.manifest[key]
+            name = entry["encodings"].get(encoding) if encoding != "identity" else entry["file"]
+            if name is None:
+                return None
+            with open(os.path.join(self.dist, name), "rb") as f:
+                body = f.read()
+            tag = entry["etag"]
+        else:
+            if encoding == "br" or (encoding == "gzip" and not key.endswith(COMPRESS_TYPES)):
+                return None
+            try:
+                with open(os.path.join(self.root, key), "rb") as f:
+                    body = f.read()
+            except OSError:
+                return None
+            tag = digest(body)[:20]
+            if encoding == "gzip":
+                body = gzip.compress(body, 9, mtime=0)
+        etag = tag if encoding == "identity" else f"{tag}-{encoding}"
+        with self._lock:
+            self._cache[(key, encoding)] = (body, etag)
+        return body, etag
+
+    def response(self, path: str) -> Response:
+        resolved = self._resolve(path)
+        if resolved is None:
+            abort(404)
+        key, immutable = resolved
+        accepted = request.accept_encodings
+        for encoding in ENCODINGS + ("identity",):
+            if encoding != "identity" and not accepted.quality(encoding):
+                continue
+            loaded = self._load(key, encoding)
+            if loaded is not None:
+                break
+        else:
+            abort(404)
+        body, etag = loaded
+        headers = {"Cache-Control": IMMUTABLE if immutable else REVALIDATE, "Vary": "Accept-Encoding"}
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        mimetype = mimetypes.guess_type(key)[0] or "application/octet-stream"
+        self.hits += 1
+        if request.if_none_match.contains(etag):
+            self.not_modified += 1
+            resp = Response(status=304, headers=headers)
+        else:
+            resp = Response(body, mimetype=mimetype, headers=headers)
+        resp.set_etag(etag)
+        return resp
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            size = sum(len(body) for body, _ in self._cache.values())
+            return {"built": self.built, "files": len(self.manifest), "cached": len(self._cache),
+                    "cachedBytes": size, "hits": self.hits, "notModified": self.not_modified}
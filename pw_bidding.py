@@ -0,0 +1,157 @@
+"""Table-driven bidding for bots.
+
+Expected tricks and the best bid are looked up in a table precomputed by
+batch simulation (scripts/build_bid_table.py). The key is a canonical hand
+signature × player count × cards per player × seat relative to the leader.
+The table is a small binary file, memory-mapped once, so a bid is a
+signature plus one 2-byte read however busy the server is.
+
+Signature (``signature``): trump count, top trump bucket, side aces, side
+kings (capped at 2), and side suits held short (0–1 cards).
+
+File layout (little endian): a 16-byte header ``b"PWBT"``, version (u16),
+min players, max players, max cards (u16 each), number of signatures (u32).
+It is followed by one block per (players, cards, relative seat) with
+``cards <= MAX_CARDS`` and ``relative seat < players``, in that nesting
+order. Each block holds 2 bytes per signature: expected tricks × 32 and the
+best bid. A best bid of ``EMPTY`` means too few samples; callers then fall
+back to ``pw_engine.baseline_bid``.
+"""
+from __future__ import annotations
+
+import mmap
+import os
+import struct
+from typing import Any, Dict, Optional, Sequence, Tuple
+
+import pw_cards
+import pw_engine
+
+MAGIC = b"PWBT"
+VERSION = 1
+HEADER = struct.Struct("<4sHHHHI")
+MIN_PLAYERS, MAX_PLAYERS, MAX_CARDS = 2, 8, 7
+EMPTY = 0xFF
+SCALE = 32  # expected tricks are stored as round(tricks * SCALE)
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "bid_table.bin")
+
+# Signature radices: trumps 0..7, top trump bucket 0..4, side aces 0..3,
+# side kings 0..2, short side suits 0..3.
+SIGNATURES = 8 * 5 * 4 * 3 * 4
+# Top trump bucket by rank index: none=0, 2..9 -> 1, 10..J -> 2, Q..K -> 3, A -> 4.
+_TOP_BUCKET = (1, 1, 1, 1, 1, 1, 1, 1, 2, 2, 3, 3, 4)
+
+
+def _block_index() -> Dict[Tuple[int, int, int], int]:
+    index = {}
+    for n in range(MIN_PLAYERS, MAX_PLAYERS + 1):
+        for cards in range(1, MAX_CARDS + 1):
+            for rel in range(n):
+                index[(n, cards, rel)] = len(index)
+    return index
+
+
+BLOCKS = _block_index()
+CELLS = len(BLOCKS) * SIGNATURES
+
+
+def signature(hand: Sequence[int]) -> int:
+    trumps = 0
+    top = 0
+    aces = 0
+    kings = 0
+    side_len = [0, 0, 0, 0]
+    for c in hand:
+        suit = pw_cards.SUIT_OF[c]
+        rank = pw_cards.RANK_OF[c]
+        if suit == pw_cards.TRUMP:
+            trumps += 1
+            top = max(top, _TOP_BUCKET[rank])
+        else:
+            side_len[suit] += 1
+            if rank == 12:
+                aces += 1
+            elif rank == 11:
+                kings += 1
+    short = sum(1 for s in range(4) if s != pw_cards.TRUMP and side_len[s] <= 1)
+    return (((min(trumps, 7) * 5 + top) * 4 + min(aces, 3)) * 3 + min(kings, 2)) * 4 + short
+
+
+def cell(n_players: int, cards: int, rel_seat: int, sig: int) -> Optional[int]:
+    block = BLOCKS.get((n_players, cards, rel_seat))
+    return None if block is None else block * SIGNATURES + sig
+
+
+class BidTable:
+    """Read-only view of a bid table file (memory-mapped)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            self._mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, lo, hi, max_cards, sigs = HEADER.unpack_from(self._mm, 0)
+        if (magic, version, lo, hi, max_cards, sigs) != (MAGIC, VERSION, MIN_PLAYERS, MAX_PLAYERS, MAX_CARDS, SIGNATURES):
+            self._mm.close()
+            raise ValueError(f"{path}: not a version {VERSION} bid table")
+        if len(self._mm) != HEADER.size + 2 * CELLS:
+            self._mm.close()
+            raise ValueError(f"{path}: truncated bid table")
+
+    def lookup(self, n_players: int, cards: int, rel_seat: int, hand: Sequence[int]) -> Optional[Tuple[float, int]]:
+        """(expected tricks, best bid) or None when the table has no data."""
+        i = cell(n_players, cards, rel_seat, signature(hand))
+        if i is None:
+            return None
+        off = HEADER.size + 2 * i
+        expected, bid = self._mm[off], self._mm[off + 1]
+        if bid == EMPTY:
+            return None
+        return expected / SCALE, bid
+
+    def close(self) -> None:
+        self._mm.close()
+
+
+def write_table(path: str, expected: Sequence[int], best: Sequence[int]) -> None:
+    """Write a table from per-cell scaled expected tricks and best bids."""
+    tmp = path + ".tmp"
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    with open(tmp, "wb") as f:
+        f.write(HEADER.pack(MAGIC, VERSION, MIN_PLAYERS, MAX_PLAYERS, MAX_CARDS, SIGNATURES))
+        data = bytearray(2 * CELLS)
+        data[0::2] = bytes(expected)
+        data[1::2] = bytes(best)
+        f.write(data)
+    os.replace(tmp, path)
+
+
+_TABLE: Optional[BidTable] = None
+_LOADED = False
+
+
+def default_table() -> Optional[BidTable]:
+    """The shipped table, mapped on first use; None if missing or invalid."""
+    global _TABLE, _LOADED
+    if not _LOADED:
+        _LOADED = True
+        try:
+            _TABLE = BidTable(DEFAULT_PATH)
+        except (OSError, ValueError):
+            _TABLE = None
+    return _TABLE
+
+
+def table_bid(st: Dict[str, Any], seat: int, rng=None) -> int:
+    """Bid policy: best bid from the table, else the baseline heuristic."""
+    table = default_table()
+    hand = st["hands"][seat] or []
+    if table is not None:
+        n = st["n"]
+        hit = table.lookup(n, len(hand), (seat - st["leader"]) % n, hand)
+        if hit is not None:
+            return max(0, min(pw_engine.max_bid(st), hit[1]))
+    return pw_engine.baseline_bid(st, seat, rng)
+
+
+pw_engine.BID_POLICIES["table"] = table_bid
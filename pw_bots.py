@@ -0,0 +1,297 @@
+"""Search bots for card play.
+
+``search`` is a determinized Monte Carlo player: it deals the cards it
+cannot see to the other seats in ways that fit what it knows (cards already
+played, suits a seat has shown out of, hand sizes), plays every legal card
+out to the end of the round on each deal with a fast bid-aware rollout
+policy, and keeps the card with the best average score for its own bid.
+
+Deals are sampled in batches and every candidate card is scored on the same
+deals, so the comparison between candidates is not drowned in deal noise.
+The search stops at a wall-clock budget or a sample cap, whichever comes
+first. Once few enough cards are left (pw_solver.MAX_CARDS), each sampled
+deal is solved exactly instead of rolled out.
+
+Live rooms run searches in ``SearchPool`` (separate processes, so a long
+think in one room never holds the server's GIL); simulations call the
+``mc_card`` policy in-process with a fixed sample count.
+"""
+from __future__ import annotations
+
+import contextlib
+import multiprocessing
+import random
+import sys
+import threading
+import time
+import types
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+import pw_cards
+import pw_engine
+import pw_solver
+import pw_state
+
+SUIT_OF = pw_cards.SUIT_OF
+STRENGTH = pw_cards.STRENGTH
+# Strength of a card when it leads a trick (trump above everything else).
+LEAD_STRENGTH: Tuple[int, ...] = tuple(STRENGTH[SUIT_OF[c]][c] for c in range(pw_cards.DECK_SIZE))
+
+# Strength level -> (time budget in seconds, max sampled deals). None plays
+# the baseline heuristic without searching.
+LEVELS: Dict[str, Optional[Tuple[float, int]]] = {
+    "easy": None,
+    "normal": (0.15, 300),
+    "hard": (0.6, 2000),
+}
+DEFAULT_LEVEL = "normal"
+
+BATCH = 8  # deals sampled per batch (the budget is checked between batches)
+SIM_SAMPLES = 48  # deals per move for the in-process simulation policy
+
+View = Dict[str, Any]
+
+# One per process: searches run one at a time in a pool worker (or in a
+# single-threaded simulation), and the table is bounded.
+_SOLVER = pw_solver.Solver()
+
+
+def view(st: pw_state.GameState, seat: int) -> View:
+    """What `seat` is allowed to know, as a small picklable dict."""
+    return {
+        "n": st.n,
+        "seat": seat,
+        "hand": list(st.hands[seat] or []),
+        "counts": [len(h or []) for h in st.hands],
+        "table": list(st.table),
+        "leader": st.leader,
+        "lead": st.leadSuit,
+        "bids": [int(b or 0) for b in st.bids],
+        "tricks": list(st.tricksRound),
+        "played": st.playedMask,
+        "voids": list(st.voids),
+    }
+
+
+def _legal(hand: Sequence[int], lead: Optional[int]) -> List[int]:
+    if lead is not None:
+        same = [c for c in hand if SUIT_OF[c] == lead]
+        if same:
+            return same
+    return list(hand)
+
+
+def _sample_hands(v: View, unknown: List[int], rng: random.Random, use_voids: bool = True) -> Optional[List[List[int]]]:
+    """Deal the unseen cards to the other seats; None if the voids could not
+    be honoured on this attempt."""
+    seat = v["seat"]
+    voids = v["voids"] if use_voids else [0] * v["n"]
+    pool = list(unknown)
+    rng.shuffle(pool)
+    hands: List[List[int]] = [[] for _ in range(v["n"])]
+    hands[seat] = list(v["hand"])
+    # Most constrained seats pick first.
+    others = sorted((s for s in range(v["n"]) if s != seat and v["counts"][s]), key=lambda s: -bin(voids[s]).count("1"))
+    for s in others:
+        need = v["counts"][s]
+        void = voids[s]
+        if void:
+            take = [c for c in pool if not (void >> SUIT_OF[c]) & 1][:need]
+        else:
+            take = pool[:need]
+        if len(take) < need:
+            return None
+        hands[s] = take
+        if void:
+            taken = set(take)
+            pool = [c for c in pool if c not in taken]
+        else:
+            pool = pool[need:]
+    return hands
+
+
+def sample_batch(v: View, k: int, rng: random.Random) -> List[List[List[int]]]:
+    """`k` deals of the hidden cards consistent with `v`."""
+    seen = pw_cards.mask_of(v["hand"]) | v["played"] | pw_cards.mask_of(c for c in v["table"] if c is not None)
+    unknown = pw_cards.cards_of(pw_cards.FULL_MASK & ~seen)
+    deals = []
+    for _ in range(k):
+        hands = None
+        for _attempt in range(4):
+            hands = _sample_hands(v, unknown, rng)
+            if hands is not None:
+                break
+        if hands is None:
+            hands = _sample_hands(v, unknown, rng, use_voids=False)
+        deals.append(hands)
+    return deals
+
+
+def rollout_card(hand: List[int], table: List[Optional[int]], lead: Optional[int], want: bool) -> int:
+    """Fast rollout policy: win cheaply while short of the bid, otherwise
+    shed the highest card that still loses."""
+    if lead is None:
+        return max(hand, key=LEAD_STRENGTH.__getitem__) if want else min(hand, key=LEAD_STRENGTH.__getitem__)
+    strength = STRENGTH[lead]
+    follow = [c for c in hand if SUIT_OF[c] == lead] or hand
+    best = max(strength[c] for c in table if c is not None)
+    if want:
+        winners = [c for c in follow if strength[c] > best]
+        if winners:
+            return min(winners, key=strength.__getitem__)
+    else:
+        losers = [c for c in follow if strength[c] < best]
+        if losers:
+            return max(losers, key=strength.__getitem__)
+    return min(follow, key=strength.__getitem__)
+
+
+def rollout(v: View, hands: List[List[int]], card: int) -> int:
+    """Play `card` for v["seat"] and the rest of the round on `hands`;
+    returns the round points for v["seat"]."""
+    n = v["n"]
+    seat = v["seat"]
+    bids = v["bids"]
+    hands = [list(h) for h in hands]
+    table = list(v["table"])
+    tricks = list(v["tricks"])
+    leader = v["leader"]
+    lead = v["lead"]
+
+    hands[seat].remove(card)
+    table[seat] = card
+    if lead is None:
+        lead = SUIT_OF[card]
+    while True:
+        for k in range(n):
+            s = (leader + k) % n
+            if table[s] is None:
+                c = rollout_card(hands[s], table, lead, tricks[s] < bids[s])
+                hands[s].remove(c)
+                table[s] = c
+                if lead is None:
+                    lead = SUIT_OF[c]
+        winner = pw_cards.trick_winner(table, lead, leader)
+        tricks[winner] += 1
+        if not hands[winner]:
+            break
+        leader = winner
+        table = [None] * n
+        lead = None
+    return pw_engine.points_for_round(bids[seat], tricks[seat])
+
+
+def search(v: View, budget: Optional[float], max_samples: int, seed: Optional[int] = None) -> int:
+    """Best card for v["seat"] within `budget` seconds (None = no time
+    limit) and `max_samples` sampled deals."""
+    legal = _legal(v["hand"], v["lead"])
+    if len(legal) == 1:
+        return legal[0]
+    deadline = None if budget is None else time.perf_counter() + budget
+    rng = random.Random(seed)
+    totals = [0] * len(legal)
+    samples = 0
+    seat = v["seat"]
+    exact = sum(v["counts"]) + sum(c is not None for c in v["table"]) <= pw_solver.MAX_CARDS
+    while samples < max_samples:
+        for hands in sample_batch(v, min(BATCH, max_samples - samples), rng):
+            if exact:
+                values = _SOLVER.card_values([pw_cards.mask_of(h) for h in hands], v["table"], v["leader"],
+                                             seat, v["bids"][seat], v["tricks"][seat])
+                for i, card in enumerate(legal):
+                    totals[i] += values[card]
+            else:
+                for i, card in enumerate(legal):
+                    totals[i] += rollout(v, hands, card)
+            samples += 1
+        if deadline is not None and time.perf_counter() >= deadline:
+            break
+    # Ties go to the lowest card (legal cards are sorted ids).
+    return legal[max(range(len(legal)), key=lambda i: (totals[i], -i))]
+
+
+def mc_card(st: pw_state.GameState, seat: int, rng=None) -> Optional[int]:
+    """Card policy for simulations: fixed sample count, reproducible."""
+    if not st.hands[seat]:
+        return None
+    seed = rng.getrandbits(32) if rng is not None else None
+    return search(view(st, seat), None, SIM_SAMPLES, seed)
+
+
+pw_engine.CARD_POLICIES["mc"] = mc_card
+
+
+@contextlib.contextmanager
+def _bare_main():
+    """Hide the main script from processes started in the block: spawn
+    re-imports ``sys.modules["__main__"]`` by its file or spec, and an
+    empty module has neither."""
+    main = sys.modules["__main__"]
+    sys.modules["__main__"] = types.ModuleType("__main__")
+    try:
+        yield
+    finally:
+        sys.modules["__main__"] = main
+
+
+class SearchPool:
+    """Worker processes for bot searches and round analysis.
+
+    Searches are CPU bound, so running them on the server's threads would
+    hold the GIL and slow down every other room's handlers. Processes are
+    started lazily from a clean interpreter ("spawn"), and a broken pool is
+    replaced on the next submit. With workers=0 search is disabled and
+    `submit` returns None (callers fall back to the baseline bot).
+
+    A spawned worker normally re-runs the parent's main script (as
+    ``__mp_main__``) before its first task; for ``python app.py`` that is
+    the whole server setup again (store, scheduler, another pool).
+    Workers are started with an empty main module instead, so they only
+    import what the task needs (pw_bots, pw_solver).
+    """
+
+    def __init__(self, workers: int = 1):
+        self.workers = max(0, int(workers))
+        self._lock = threading.Lock()
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._inflight = 0
+        self._submitted = 0
+        self._failed = 0
+
+    def submit(self, fn, *args) -> Optional[Future]:
+        """Run `fn(*args)` (picklable, e.g. `search` or
+        `pw_solver.round_analysis`) in a worker process."""
+        if self.workers <= 0:
+            return None
+        with self._lock:
+            if self._pool is None:
+                self._pool = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"))
+            try:
+                # Workers start on demand, inside submit.
+                with _bare_main():
+                    future = self._pool.submit(fn, *args)
+            except (BrokenProcessPool, RuntimeError):
+                self._pool = None
+                self._failed += 1
+                return None
+            self._inflight += 1
+            self._submitted += 1
+        future.add_done_callback(self._done)
+        return future
+
+    def _done(self, future: Future) -> None:
+        with self._lock:
+            self._inflight -= 1
+            if not future.cancelled() and future.exception() is not None:
+                self._failed += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "workers": self.workers,
+                "inflight": self._inflight,
+                "submitted": self._submitted,
+                "failed": self._failed,
+            }
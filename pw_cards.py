@@ -0,0 +1,99 @@
+"""Compact card encoding for the online game engine.
+
+A card is a small int ``suit * 13 + rank`` (0..51) with suits in
+``SUITS`` order (spades first, spades are trump) and ranks 2..A as 0..12.
+Sorting ids therefore gives the same hand order as the UI (suit, rank).
+A set of cards can also be a 52-bit mask (bit ``id``).
+
+Dicts like ``{"suit": "♠", "rank": "10"}`` and keys like ``"10♠"`` are the
+wire format only; convert with ``to_wire`` / ``KEY_TO_ID`` at the boundary.
+"""
+from __future__ import annotations
+
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+SUITS = ["♠", "♥", "♦", "♣"]  # spar is trump
+RANKS = ["2", "3", "4", "5", "6", "7", "8", "9", "10", "J", "Q", "K", "A"]
+TRUMP = 0
+DECK_SIZE = 52
+
+SUIT_INDEX: Dict[str, int] = {s: i for i, s in enumerate(SUITS)}
+SUIT_OF: Tuple[int, ...] = tuple(c // 13 for c in range(DECK_SIZE))
+RANK_OF: Tuple[int, ...] = tuple(c % 13 for c in range(DECK_SIZE))
+
+# Wire format. The dicts are shared and must never be mutated.
+CARD_DICTS: Tuple[Dict[str, str], ...] = tuple(
+    {"suit": SUITS[c // 13], "rank": RANKS[c % 13]} for c in range(DECK_SIZE)
+)
+CARD_KEYS: Tuple[str, ...] = tuple(f"{RANKS[c % 13]}{SUITS[c // 13]}" for c in range(DECK_SIZE))
+KEY_TO_ID: Dict[str, int] = {k: c for c, k in enumerate(CARD_KEYS)}
+
+FULL_MASK = (1 << DECK_SIZE) - 1
+SUIT_MASK: Tuple[int, ...] = tuple(((1 << 13) - 1) << (13 * s) for s in range(4))
+
+# Trick strength per lead suit: trump > lead suit > anything else, then rank.
+# The highest strength on the table wins the trick.
+STRENGTH: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(
+        (200 if SUIT_OF[c] == TRUMP else 100 if SUIT_OF[c] == lead else 0) + RANK_OF[c]
+        for c in range(DECK_SIZE)
+    )
+    for lead in range(4)
+)
+
+
+def card_id(suit: str, rank: str) -> int:
+    return SUIT_INDEX[suit] * 13 + RANKS.index(rank)
+
+
+def from_wire(card: Dict[str, str]) -> int:
+    return KEY_TO_ID[f"{card['rank']}{card['suit']}"]
+
+
+def to_wire(card: Optional[int]) -> Optional[Dict[str, str]]:
+    return None if card is None else CARD_DICTS[card]
+
+
+def hand_to_wire(hand: Optional[Sequence[int]]) -> Optional[List[Dict[str, str]]]:
+    return None if hand is None else [CARD_DICTS[c] for c in hand]
+
+
+def mask_of(cards: Iterable[int]) -> int:
+    mask = 0
+    for c in cards:
+        mask |= 1 << c
+    return mask
+
+
+def cards_of(mask: int) -> List[int]:
+    out = []
+    while mask:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+def legal_mask(hand_mask: int, lead_suit: Optional[int]) -> int:
+    """Cards that may be played: must follow the lead suit if possible."""
+    if lead_suit is None:
+        return hand_mask
+    follow = hand_mask & SUIT_MASK[lead_suit]
+    return follow if follow else hand_mask
+
+
+def beats(a: int, b: int, lead_suit: int) -> bool:
+    strength = STRENGTH[lead_suit]
+    return strength[a] > strength[b]
+
+
+def trick_winner(table: Sequence[Optional[int]], lead_suit: int, leader: int) -> int:
+    """Seat holding the winning card of a complete trick."""
+    strength = STRENGTH[lead_suit]
+    winner = leader
+    best = strength[table[leader]]
+    for seat, c in enumerate(table):
+        if strength[c] > best:
+            best = strength[c]
+            winner = seat
+    return winner
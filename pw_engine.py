@@ -0,0 +1,270 @@
+"""Socket-free Piratwhist game engine.
+
+Pure functions over a ``pw_state.GameState`` (the object app.py keeps in
+``room.state``): dealing, bidding, card play, trick/round bookkeeping and
+scoring. Nothing here emits, sleeps, schedules or reads the clock, so the
+same code drives live rooms and headless batch simulations
+(scripts/simulate.py). Cards are pw_cards ids and the lead suit is a suit
+index; follow-suit is a mask test (``pw_cards.legal_mask``).
+
+The rules read and write attributes. Bid and card policies only index the
+state by name, so they also take a plain dict with the fields they use
+(scripts/build_bid_table.py).
+"""
+from __future__ import annotations
+
+import random
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence
+
+import pw_cards
+import pw_state
+
+ROUND_CARDS = [7, 6, 5, 4, 3, 2, 1, 1, 2, 3, 4, 5, 6, 7]
+RANK_VALUE = {r: i + 2 for i, r in enumerate(pw_cards.RANKS)}
+DECK = tuple(range(pw_cards.DECK_SIZE))
+_SUIT_OF = pw_cards.SUIT_OF
+
+# play_card results
+PLAYED = "played"
+TRICK_DONE = "trick"
+ROUND_DONE = "round"
+
+State = pw_state.GameState
+CardPolicy = Callable[[State, int, Any], int]
+BidPolicy = Callable[[State, int, Any], int]
+
+
+def new_state(n_players: int, names: Optional[List[Optional[str]]] = None, bot_seats: Iterable[int] = ()) -> State:
+    return pw_state.GameState(n_players, names, bot_seats)
+
+
+def cards_per_round(n_players: int, round_index: int) -> int:
+    """Master rule (52-card deck):
+      cardsPer = min(requestedForRound, floor(52 / nPlayers)) (min 1)
+    """
+    requested = ROUND_CARDS[round_index]
+    return max(1, min(requested, 52 // max(1, n_players)))
+
+
+def deal(n_players: int, round_index: int, rng=random):
+    """Return (hands, cards_per_effective); hands are sorted id lists."""
+    cards_per = cards_per_round(n_players, round_index)
+    # A uniform sample of the dealt cards (cheaper than shuffling all 52).
+    take = rng.sample(DECK, cards_per * n_players)
+    hands = [sorted(take[i::n_players]) for i in range(n_players)]
+    return hands, cards_per
+
+
+def deal_rng(seed: int, round_index: int) -> random.Random:
+    """The RNG for one round of a seeded game. Each round depends on the
+    seed and its index only, so any deal can be redone for an audit and
+    dealing ahead gives the same hands as dealing on time."""
+    return random.Random(f"{seed}:{round_index}")
+
+
+def predeal(st: State, round_index: int) -> bool:
+    """Deal `round_index` of a seeded game ahead of time into st.predealt
+    (private; start_round picks it up). False if there is nothing to do."""
+    if st.seed is None or not 0 <= round_index < len(ROUND_CARDS):
+        return False
+    pre = st.predealt
+    if pre is not None and pre[0] == round_index:
+        return False
+    hands, cards_per = deal(st.n, round_index, deal_rng(st.seed, round_index))
+    st.predealt = (round_index, hands, [list(h) for h in hands], cards_per)
+    return True
+
+
+def start_round(st: State, round_index: int, rng=random) -> bool:
+    """Deal `round_index` and reset round state. A seeded game deals from
+    its seed (`rng` is not used) and takes the hands from predeal() when
+    they are ready; returns True in that case."""
+    n = st.n
+    pre = st.predealt
+    st.predealt = None
+    ready = pre is not None and pre[0] == round_index
+    if ready:
+        _, hands, dealt, cards_per = pre
+    else:
+        if st.seed is not None:
+            rng = deal_rng(st.seed, round_index)
+        hands, cards_per = deal(n, round_index, rng)
+        dealt = [list(h) for h in hands]
+    st.roundIndex = round_index
+    st.hands = hands
+    st.handMasks = [pw_cards.mask_of(h) for h in hands]
+    st.dealt = dealt
+    st.cardsPer = cards_per
+    st.leader = round_index % n
+    st.turn = st.leader
+    st.leadSuit = None
+    st.table = [None for _ in range(n)]
+    st.winner = None
+    st.bids = [None for _ in range(n)]
+    st.tricksRound = [0 for _ in range(n)]
+    st.playedMask = 0
+    st.voids = [0 for _ in range(n)]
+    return ready
+
+
+def points_for_round(bid: int, taken: int) -> int:
+    if bid == taken:
+        return 10 + bid
+    return -abs(taken - bid)
+
+
+def max_bid(st: State) -> int:
+    return int(st.get("cardsPer") or ROUND_CARDS[st["roundIndex"]])
+
+
+def all_bids_in(st: State) -> bool:
+    return all(b is not None for b in st["bids"])
+
+
+def _hand_masks(st: State) -> List[int]:
+    # st.handMasks is None for a state read back from a record or a
+    # hibernation blob; rebuild it from the hands.
+    st.handMasks = [pw_cards.mask_of(h or ()) for h in st.hands]
+    return st.handMasks
+
+
+def legal_cards(st: State, seat: int) -> List[int]:
+    masks = st.handMasks or _hand_masks(st)
+    return pw_cards.cards_of(pw_cards.legal_mask(masks[seat], st.leadSuit))
+
+
+def play_card(st: State, seat: int, card: int) -> Optional[str]:
+    """Play `card` for `seat`. Returns None if the move is illegal, else
+    PLAYED, TRICK_DONE (winner set, phase between_tricks) or ROUND_DONE
+    (history appended, phase round_finished)."""
+    if st.phase != "playing" or st.turn != seat:
+        return None
+    masks = st.handMasks or _hand_masks(st)
+    lead = st.leadSuit
+    if not pw_cards.legal_mask(masks[seat], lead) >> card & 1:
+        return None  # not in the hand, or not following suit
+
+    st.hands[seat].remove(card)
+    masks[seat] ^= 1 << card
+    suit = _SUIT_OF[card]
+    if lead is None:
+        st.leadSuit = suit
+    elif suit != lead:
+        st.voids[seat] |= 1 << lead
+    st.playedMask |= 1 << card
+    table = st.table
+    table[seat] = card
+
+    n = st.n
+    nxt = (seat + 1) % n
+    for _ in range(n):
+        if table[nxt] is None:
+            st.turn = nxt
+            break
+        nxt = (nxt + 1) % n
+
+    if None in table:
+        return PLAYED
+
+    winner = pw_cards.trick_winner(table, st.leadSuit, st.leader)
+    st.winner = winner
+    st.tricksRound[winner] += 1
+    st.tricksTotal[winner] += 1
+
+    if any(st.hands):
+        st.phase = "between_tricks"
+        return TRICK_DONE
+
+    bids = [int(b or 0) for b in st.bids]
+    taken = list(st.tricksRound)
+    points = [points_for_round(bids[i], taken[i]) for i in range(n)]
+    for i in range(n):
+        st.pointsTotal[i] += points[i]
+    st.history.append({
+        "round": st.roundIndex + 1,
+        "cardsPer": max_bid(st),
+        "bids": bids,
+        "taken": taken,
+        "points": points,
+    })
+    st.dealtHistory.append(st.dealt)
+    st.phase = "round_finished"
+    return ROUND_DONE
+
+
+def next_trick(st: State) -> None:
+    """Clear the finished trick; its winner leads the next one."""
+    st.leader = st.winner
+    st.turn = st.leader
+    st.leadSuit = None
+    st.table = [None for _ in range(st.n)]
+    st.winner = None
+    st.phase = "playing"
+
+
+# ---------- Bot policies ----------
+def baseline_bid(st: State, seat: int, rng=None) -> int:
+    hand = st["hands"][seat] or []
+    sp = sum(1 for c in hand if pw_cards.SUIT_OF[c] == pw_cards.TRUMP)
+    hi = sum(1 for c in hand if RANK_VALUE[pw_cards.RANKS[pw_cards.RANK_OF[c]]] >= 11)
+    return max(0, min(max_bid(st), int(round((sp * 0.6) + (hi * 0.35)))))
+
+
+def baseline_card(st: State, seat: int, rng=None) -> Optional[int]:
+    """Lowest card of the lead suit, else the lowest spade, else the lowest
+    card by suit symbol."""
+    hand = st["hands"][seat]
+    if not hand:
+        return None
+    # Hands are sorted ids, so the first card of a suit is its lowest.
+    lead = st.get("leadSuit")
+    if lead is not None:
+        same = [c for c in hand if pw_cards.SUIT_OF[c] == lead]
+        if same:
+            return same[0]
+    tr = [c for c in hand if pw_cards.SUIT_OF[c] == pw_cards.TRUMP]
+    if tr:
+        return tr[0]
+    return min(hand, key=lambda c: (pw_cards.SUITS[pw_cards.SUIT_OF[c]], pw_cards.RANK_OF[c]))
+
+
+def bot_bids(st: State, seats: Iterable[int], policy: BidPolicy = baseline_bid, rng=None) -> None:
+    """Fill in bids for `seats` that have not bid yet."""
+    for seat in seats:
+        if st["bids"][seat] is None:
+            st["bids"][seat] = policy(st, seat, rng)
+
+
+CARD_POLICIES: Dict[str, CardPolicy] = {"baseline": baseline_card}
+BID_POLICIES: Dict[str, BidPolicy] = {"baseline": baseline_bid}
+
+
+def play_game(
+    n_players: int,
+    card_policies: Sequence[CardPolicy],
+    bid_policies: Sequence[BidPolicy],
+    rng=random,
+    rounds: int = len(ROUND_CARDS),
+    on_round_start: Optional[Callable[[State], None]] = None,
+) -> State:
+    """Play a full game headlessly and return the final state."""
+    st = new_state(n_players, bot_seats=range(n_players))
+    for round_index in range(rounds):
+        start_round(st, round_index, rng)
+        if on_round_start is not None:
+            on_round_start(st)
+        st.phase = "bidding"
+        for seat in range(n_players):
+            st.bids[seat] = bid_policies[seat](st, seat, rng)
+        st.phase = "playing"
+        while True:
+            seat = st.turn
+            result = play_card(st, seat, card_policies[seat](st, seat, rng))
+            if result is None:
+                raise RuntimeError(f"policy for seat {seat} chose an illegal card")
+            if result == TRICK_DONE:
+                next_trick(st)
+            elif result == ROUND_DONE:
+                break
+    st.phase = "game_finished"
+    return st
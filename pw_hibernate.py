@@ -0,0 +1,168 @@
+"""Hibernation: idle online rooms packed into one compact blob each.
+
+``pack(room)`` turns a ``pw_state.Room`` into bytes and ``unpack`` gives
+back an equal room:
+
+- cards (pw_cards ids 0..51) take one byte each: the table, every hand,
+  the dealt hands and the dealt history become short ``bytes`` (``NO_CARD``
+  for an empty place);
+- state fields are stored positionally in ``GameState.FIELDS`` order, and
+  the usual deal sequence is rebuilt instead of stored;
+- the result goes through ``marshal`` and ``zlib``.
+
+Per-connection caches that the next frame rebuilds (``sentPublic``,
+``sync``, ``framePhase``) are not kept: after a thaw the public channel
+gets every field once and members get a full ``online_state``.
+
+``Hibernator`` holds the blobs by code, in memory or, with a directory, as
+one file per room. Files are scratch space for this process (the store
+keeps the durable copy) and are cleared on start.
+"""
+from __future__ import annotations
+
+import marshal
+import os
+import threading
+import zlib
+from typing import Any, Dict, List, Optional, Union
+
+from pw_state import GameState, Room
+
+FORMAT = 4
+NO_CARD = 0xFF
+STATE_KEYS = GameState.FIELDS
+# Room fields kept as they are; everything else is a live cache.
+ROOM_KEYS = ("emptySince", "members", "sidToClient", "suspended", "touchedAt")
+
+
+def _cards(cards) -> bytes:
+    return bytes(NO_CARD if c is None else c for c in cards)
+
+
+def _uncards(blob: bytes) -> List[Optional[int]]:
+    return [None if c == NO_CARD else c for c in blob]
+
+
+def _hands(hands):
+    return None if hands is None else [None if h is None else _cards(h) for h in hands]
+
+
+def _unhands(hands):
+    return None if hands is None else [None if h is None else list(h) for h in hands]
+
+
+def _deal_seq(st) -> List[int]:
+    n = st.n
+    return [i % n for i in range((st.cardsPer or 0) * n)]
+
+
+def pack(room: Room) -> bytes:
+    st = room.state
+    values = []
+    for key in STATE_KEYS:
+        value = getattr(st, key)
+        if value is None:
+            pass
+        elif key == "table":
+            value = _cards(value)
+        elif key in ("hands", "dealt"):
+            value = _hands(value)
+        elif key == "dealtHistory":
+            value = [_hands(h) for h in value]
+        elif key == "dealSeq" and value == _deal_seq(st):
+            value = True
+        values.append(value)
+    head = (room.code, room.botLevel, room.clients, room.rev, room.publicRev)
+    rest = tuple(getattr(room, k) for k in ROOM_KEYS)
+    return zlib.compress(marshal.dumps((FORMAT, head, rest, tuple(values))), 1)
+
+
+def unpack(blob: bytes) -> Room:
+    version, head, rest, values = marshal.loads(zlib.decompress(blob))
+    if version != FORMAT:
+        raise ValueError(f"unknown hibernation format {version}")
+    st = GameState(values[0])
+    for key, value in zip(STATE_KEYS, values):
+        if value is None:
+            pass
+        elif key == "table":
+            value = _uncards(value)
+        elif key in ("hands", "dealt"):
+            value = _unhands(value)
+        elif key == "dealtHistory":
+            value = [_unhands(h) for h in value]
+        elif key == "dealSeq" and value is True:
+            value = None  # rebuilt below, once cardsPer is known
+        setattr(st, key, value)
+    if values[STATE_KEYS.index("dealSeq")] is True:
+        st.dealSeq = _deal_seq(st)
+    room = Room(head[0], st, *head[1:])
+    for key, value in zip(ROOM_KEYS, rest):
+        setattr(room, key, value)
+    return room
+
+
+class Hibernator:
+    """Blobs of hibernated rooms by code; in memory, or files in `path`."""
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path or None
+        self._blobs: Dict[str, Union[bytes, int]] = {}  # code -> blob, or its size when on disk
+        self._lock = threading.Lock()
+        self.frozen = 0
+        self.thawed = 0
+        self._bytes = 0
+        if self.path:
+            os.makedirs(self.path, exist_ok=True)
+            for name in os.listdir(self.path):
+                if name.endswith(".room"):
+                    os.remove(os.path.join(self.path, name))
+
+    def _file(self, code: str) -> str:
+        return os.path.join(self.path, f"{code}.room")
+
+    def __contains__(self, code: object) -> bool:
+        return code in self._blobs
+
+    def __len__(self) -> int:
+        return len(self._blobs)
+
+    def put(self, code: str, blob: bytes) -> None:
+        if self.path:
+            with open(self._file(code), "wb") as f:
+                f.write(blob)
+        with self._lock:
+            self._blobs[code] = len(blob) if self.path else blob
+            self._bytes += len(blob)
+            self.frozen += 1
+
+    def get(self, code: str) -> Optional[bytes]:
+        """The blob of `code` (left in place), None if it is not hibernated."""
+        with self._lock:
+            blob = self._blobs.get(code)
+        if isinstance(blob, int):
+            with open(self._file(code), "rb") as f:
+                blob = f.read()
+        return blob
+
+    def take(self, code: str) -> Optional[bytes]:
+        """Remove and return the blob of `code` (None if not hibernated)."""
+        blob = self.get(code)
+        if blob is not None:
+            self.discard(code)
+            self.thawed += 1
+        return blob
+
+    def discard(self, code: str) -> None:
+        with self._lock:
+            blob = self._blobs.pop(code, None)
+            if blob is None:
+                return
+            self._bytes -= blob if isinstance(blob, int) else len(blob)
+        if isinstance(blob, int):
+            os.remove(self._file(code))
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"rooms": len(self._blobs), "bytes": self._bytes, "frozen": self.frozen,
+                    "thawed": self.thawed, "backend": "disk" if self.path else "memory"}
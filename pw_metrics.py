@@ -0,0 +1,253 @@
+"""Server metrics: handler latency, emits and load gauges.
+
+``Registry`` keeps counters and fixed-bucket histograms. Recording is
+lock-free: every thread writes into its own shard (a ``threading.local``
+set of dicts), so a handler only bumps numbers nobody else touches. A
+scrape copies and sums the shards under the registry lock; shards of
+threads that have ended are folded into a retired total and dropped
+(threading mode starts a thread per event).
+
+Recorded here:
+
+- ``pw_handler_seconds{event}``: socket handler run time (``timed``);
+- ``pw_handler_errors_total{event}``: handlers that raised;
+- ``pw_emits_total{event}`` / ``pw_emit_bytes_total{event}``: outgoing
+  events and their encoded size, counted where Socket.IO encodes the
+  packet (``packet_class``); a room broadcast is encoded, and counted,
+  once.
+
+Gauges (rooms by phase, threads, scheduler lag, ...) are read at scrape
+time from the ``gauges`` callback. ``prometheus()`` renders the text
+exposition format, ``snapshot()`` the JSON feed for admin.html.
+"""
+from __future__ import annotations
+
+import bisect
+import functools
+import inspect
+import math
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+from socketio import packet
+
+# Upper bounds in seconds (+Inf is implied).
+BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+
+HELP = {
+    "pw_handler_seconds": ("histogram", "Socket event handler run time."),
+    "pw_handler_errors_total": ("counter", "Socket event handlers that raised."),
+    "pw_emits_total": ("counter", "Events sent, by event name (room broadcasts count once)."),
+    "pw_emit_bytes_total": ("counter", "Encoded size of the events sent, in bytes."),
+}
+
+# (name, labels, value); labels as a tuple of (key, value) pairs
+Gauge = Tuple[str, Tuple[Tuple[str, str], ...], float]
+
+
+class _Shard:
+    __slots__ = ("thread", "counters", "hists")
+
+    def __init__(self, thread: threading.Thread):
+        self.thread = thread
+        self.counters: Dict[Tuple[str, str], float] = {}
+        # (name, label) -> bucket counts (len(BUCKETS) + 1, last is +Inf) + [sum]
+        self.hists: Dict[Tuple[str, str], List[float]] = {}
+
+
+class Registry:
+    def __init__(self, gauges: Optional[Callable[[], Iterable[Gauge]]] = None,
+                 gauge_help: Optional[Dict[str, str]] = None):
+        self.gauges = gauges
+        self.gauge_help = dict(gauge_help or {})
+        self._local = threading.local()
+        self._shards: List[_Shard] = []
+        self._retired = _Shard(threading.current_thread())
+        self._lock = threading.Lock()
+        self.started = time.time()
+
+    # --- recording (no locks on the hot path) ---
+    def _shard(self) -> _Shard:
+        shard = getattr(self._local, "shard", None)
+        if shard is None:
+            shard = self._local.shard = _Shard(threading.current_thread())
+            with self._lock:
+                self._shards.append(shard)
+        return shard
+
+    def inc(self, name: str, label: str, value: float = 1) -> None:
+        counters = self._shard().counters
+        key = (name, label)
+        counters[key] = counters.get(key, 0) + value
+
+    def observe(self, name: str, label: str, seconds: float) -> None:
+        hists = self._shard().hists
+        row = hists.get((name, label))
+        if row is None:
+            row = hists[(name, label)] = [0] * (len(BUCKETS) + 2)
+        row[bisect.bisect_left(BUCKETS, seconds)] += 1
+        row[-1] += seconds
+
+    def timed(self, event: str, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """`fn` recording its run time as pw_handler_seconds{event}. Extra
+        positional arguments beyond what `fn` takes are dropped."""
+        params = inspect.signature(fn).parameters
+        arity = None if any(p.kind is p.VAR_POSITIONAL for p in params.values()) else len(params)
+        clock = time.perf_counter
+
+        @functools.wraps(fn)
+        def run(*args):
+            t0 = clock()
+            try:
+                return fn(*(args if arity is None else args[:arity]))
+            except Exception:
+                self.inc("pw_handler_errors_total", event)
+                raise
+            finally:
+                self.observe("pw_handler_seconds", event, clock() - t0)
+        return run
+
+    def packet_class(self, base=packet.Packet):
+        """A Socket.IO packet class (the server's ``serializer``) counting
+        every event it encodes."""
+        registry = self
+
+        class MeteredPacket(base):
+            def encode(self):
+                encoded = super().encode()
+                if self.packet_type in (packet.EVENT, packet.BINARY_EVENT) and self.data:
+                    if isinstance(encoded, list):
+                        size = sum(len(p) if isinstance(p, (bytes, bytearray)) else len(p.encode("utf-8"))
+                                   for p in encoded)
+                    else:
+                        size = len(encoded.encode("utf-8")) if isinstance(encoded, str) else len(encoded)
+                    event = str(self.data[0])
+                    registry.inc("pw_emits_total", event)
+                    registry.inc("pw_emit_bytes_total", event, size)
+                return encoded
+        return MeteredPacket
+
+    # --- reading ---
+    def _collect(self) -> Tuple[Dict[Tuple[str, str], float], Dict[Tuple[str, str], List[float]]]:
+        with self._lock:
+            live = []
+            for shard in self._shards:
+                if shard.thread.is_alive():
+                    live.append(shard)
+                else:
+                    _merge(self._retired, shard.counters.copy(), shard.hists.copy())
+            self._shards = live
+            counters = dict(self._retired.counters)
+            hists = {k: list(v) for k, v in self._retired.hists.items()}
+            for shard in live:
+                # dict.copy() is atomic under the GIL; the rows may be one
+                # observation behind, which a scrape can live with
+                for key, value in shard.counters.copy().items():
+                    counters[key] = counters.get(key, 0) + value
+                for key, row in shard.hists.copy().items():
+                    total = hists.setdefault(key, [0] * len(row))
+                    for i, v in enumerate(row):
+                        total[i] += v
+        return counters, hists
+
+    def _gauges(self) -> List[Gauge]:
+        return list(self.gauges()) if self.gauges is not None else []
+
+    def snapshot(self) -> Dict[str, Any]:
+        """JSON feed: per-event latency summary, emits, gauges."""
+        counters, hists = self._collect()
+        handlers = {}
+        for (name, event), row in sorted(hists.items()):
+            if name != "pw_handler_seconds":
+                continue
+            count = sum(row[:-1])
+            handlers[event] = {
+                "count": count,
+                "errors": counters.get(("pw_handler_errors_total", event), 0),
+                "meanMs": round(row[-1] / count * 1000.0, 3) if count else 0.0,
+                "p50Ms": _quantile_ms(row, 0.5),
+                "p95Ms": _quantile_ms(row, 0.95),
+                "p99Ms": _quantile_ms(row, 0.99),
+            }
+        emits: Dict[str, Dict[str, float]] = {}
+        for (name, event), value in counters.items():
+            if name == "pw_emits_total":
+                emits.setdefault(event, {"count": 0, "bytes": 0})["count"] = value
+            elif name == "pw_emit_bytes_total":
+                emits.setdefault(event, {"count": 0, "bytes": 0})["bytes"] = value
+        gauges: Dict[str, Any] = {}
+        for name, labels, value in self._gauges():
+            if labels:
+                gauges.setdefault(name, {})[",".join(v for _, v in labels)] = value
+            else:
+                gauges[name] = value
+        return {"uptime": round(time.time() - self.started, 1), "handlers": handlers,
+                "emits": dict(sorted(emits.items())), "gauges": gauges}
+
+    def prometheus(self) -> str:
+        """Text exposition format (version 0.0.4)."""
+        counters, hists = self._collect()
+        lines: List[str] = []
+        seen = set()
+
+        def header(name: str, kind: str, text: str) -> None:
+            if name not in seen:
+                seen.add(name)
+                lines.append(f"# HELP {name} {text}")
+                lines.append(f"# TYPE {name} {kind}")
+
+        for (name, label), row in sorted(hists.items()):
+            header(name, *HELP.get(name, ("histogram", name)))
+            lab = f'event="{_escape(label)}"'
+            cumulative = 0
+            for bound, n in zip(BUCKETS + (math.inf,), row[:-1]):
+                cumulative += n
+                le = "+Inf" if bound == math.inf else repr(bound)
+                lines.append(f'{name}_bucket{{{lab},le="{le}"}} {cumulative}')
+            lines.append(f"{name}_sum{{{lab}}} {row[-1]!r}")
+            lines.append(f"{name}_count{{{lab}}} {cumulative}")
+        for (name, label), value in sorted(counters.items()):
+            header(name, *HELP.get(name, ("counter", name)))
+            lines.append(f'{name}{{event="{_escape(label)}"}} {_number(value)}')
+        for name, labels, value in sorted(self._gauges()):
+            header(name, "gauge", self.gauge_help.get(name, name))
+            lab = ",".join(f'{k}="{_escape(v)}"' for k, v in labels)
+            lines.append(f"{name}{{{lab}}} {_number(value)}" if lab else f"{name} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+def _merge(into: _Shard, counters, hists) -> None:
+    for key, value in counters.items():
+        into.counters[key] = into.counters.get(key, 0) + value
+    for key, row in hists.items():
+        total = into.hists.setdefault(key, [0] * len(row))
+        for i, v in enumerate(row):
+            total[i] += v
+
+
+def _quantile_ms(row: List[float], q: float) -> float:
+    """`q` quantile of a bucket row, interpolated inside its bucket."""
+    counts = row[:-1]
+    count = sum(counts)
+    if not count:
+        return 0.0
+    rank = q * count
+    seen = 0
+    lower = 0.0
+    for bound, n in zip(BUCKETS + (math.inf,), counts):
+        if n and seen + n >= rank:
+            if bound == math.inf:
+                return round(lower * 1000.0, 3)
+            return round((lower + (bound - lower) * (rank - seen) / n) * 1000.0, 3)
+        seen += n
+        lower = bound if bound != math.inf else lower
+    return round(lower * 1000.0, 3)
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
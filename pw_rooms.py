@@ -0,0 +1,396 @@
+"""Room registry: code allocation, idle-room expiry and phase counts.
+
+``CodePool`` hands out room codes in O(1) from a lazily shuffled
+permutation of the whole code space (a sparse Fisher-Yates shuffle: only
+positions that have been touched are stored). Free codes sit in the
+prefix ``[0, free)``; allocating swaps a random free slot to the end of
+the prefix, and ``take``/``release`` move a given code across the
+boundary. When the prefix is empty, ``allocate`` raises
+``CodeSpaceExhausted``. It never slows down by retrying collisions.
+
+``RoomRegistry`` is the dict of live online rooms (same ``get``/``in``/
+``len``/``items`` surface as before), plus:
+
+- an expiry min-heap of (emptySince + ttl, code). ``expired(now)`` pops
+  only the entries that are due, each validated against the room's current
+  emptySince, so a purge costs O(k log n) for k expired rooms instead of a
+  scan;
+- per-phase room counts, updated from ``note_phase`` (called where state
+  is emitted), for monitoring without scanning;
+- hibernation: ``hibernate`` takes a room out of the live dict while its
+  code, phase count and expiry stay (a hibernated room expires like a
+  live one), ``wake`` puts it back.
+
+``SeatIndex`` maps sids and clientIds to the rooms and seats they hold, so
+disconnects and rejoins touch only the rooms involved.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import random
+import threading
+from collections import Counter
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+from pw_state import Room
+
+
+class CodeSpaceExhausted(RuntimeError):
+    pass
+
+
+class CodePool:
+    """Free codes out of `size`, encoded by `encode(index)` and mapped back
+    by `decode(code)` (None for a code outside this pool)."""
+
+    def __init__(self, size: int, encode: Callable[[int], str], decode: Callable[[str], Optional[int]], rng=None):
+        self.size = int(size)
+        self.encode = encode
+        self.decode = decode
+        self._rng = rng or random.Random()
+        self._free = self.size
+        self._at: Dict[int, int] = {}  # slot -> index (identity when absent)
+        self._pos: Dict[int, int] = {}  # index -> slot (identity when absent)
+        self._lock = threading.Lock()
+
+    def _swap(self, i: int, j: int) -> None:
+        if i == j:
+            return
+        vi = self._at.get(i, i)
+        vj = self._at.get(j, j)
+        for slot, value in ((i, vj), (j, vi)):
+            if slot == value:
+                self._at.pop(slot, None)
+                self._pos.pop(value, None)
+            else:
+                self._at[slot] = value
+                self._pos[value] = slot
+
+    def allocate(self) -> str:
+        with self._lock:
+            if self._free <= 0:
+                raise CodeSpaceExhausted(f"all {self.size} codes are in use")
+            i = self._rng.randrange(self._free)
+            self._free -= 1
+            self._swap(i, self._free)
+            return self.encode(self._at.get(self._free, self._free))
+
+    def take(self, code: str) -> bool:
+        """Mark `code` as used; False if it already was (or is foreign)."""
+        index = self.decode(code)
+        if index is None:
+            return False
+        with self._lock:
+            slot = self._pos.get(index, index)
+            if slot >= self._free:
+                return False
+            self._free -= 1
+            self._swap(slot, self._free)
+            return True
+
+    def release(self, code: str) -> bool:
+        """Return `code` to the pool; False if it was already free."""
+        index = self.decode(code)
+        if index is None:
+            return False
+        with self._lock:
+            slot = self._pos.get(index, index)
+            if slot < self._free:
+                return False
+            self._swap(slot, self._free)
+            self._free += 1
+            return True
+
+    def used(self, code: str) -> bool:
+        """True if `code` is one of this pool's codes and is taken."""
+        index = self.decode(code)
+        if index is None:
+            return False
+        with self._lock:
+            return self._pos.get(index, index) >= self._free
+
+    @property
+    def free(self) -> int:
+        return self._free
+
+
+def digit_pool(shard: int = 0, shards: int = 1, digits: int = 4, rng=None) -> CodePool:
+    """Numeric codes with code % shards == shard (all of them when shards=1)."""
+    space = 10 ** digits
+
+    def encode(i: int) -> str:
+        return f"{shard + i * shards:0{digits}d}"
+
+    def decode(code: str) -> Optional[int]:
+        if len(code) != digits or not code.isdigit() or int(code) % shards != shard:
+            return None
+        return int(code) // shards
+
+    return CodePool(len(range(shard, space, shards)), encode, decode, rng)
+
+
+def alphabet_pool(alphabet: str, length: int, rng=None) -> CodePool:
+    """Fixed-length codes over `alphabet`."""
+    base = len(alphabet)
+    value = {ch: k for k, ch in enumerate(alphabet)}
+
+    def encode(i: int) -> str:
+        out = []
+        for _ in range(length):
+            i, k = divmod(i, base)
+            out.append(alphabet[k])
+        return "".join(reversed(out))
+
+    def decode(code: str) -> Optional[int]:
+        if len(code) != length or any(ch not in value for ch in code):
+            return None
+        i = 0
+        for ch in code:
+            i = i * base + value[ch]
+        return i
+
+    return CodePool(base ** length, encode, decode, rng)
+
+
+class RoomRegistry:
+    def __init__(self, codes: CodePool, ttl: float):
+        self.codes = codes
+        self.ttl = float(ttl)
+        self._rooms: Dict[str, Room] = {}
+        self._heap: List[Tuple[float, int, str, float]] = []
+        self._seq = itertools.count()
+        self._phase: Dict[str, Optional[str]] = {}
+        self._by_phase: Counter = Counter()
+        self._asleep: Dict[str, Optional[float]] = {}  # hibernated code -> emptySince
+        self._lock = threading.Lock()
+        self.removed = 0
+
+    # --- mapping surface ---
+    def get(self, code: str, default=None) -> Optional[Room]:
+        return self._rooms.get(code, default)
+
+    def __getitem__(self, code: str) -> Room:
+        return self._rooms[code]
+
+    def __contains__(self, code: object) -> bool:
+        return code in self._rooms
+
+    def __len__(self) -> int:
+        return len(self._rooms)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._rooms)
+
+    def keys(self):
+        return self._rooms.keys()
+
+    def values(self):
+        return self._rooms.values()
+
+    def items(self):
+        return self._rooms.items()
+
+    # --- lifecycle ---
+    def allocate(self) -> str:
+        """A free code (raises CodeSpaceExhausted)."""
+        return self.codes.allocate()
+
+    def reserve(self, code: str) -> None:
+        """Keep `code` out of allocation without a live room (e.g. a room
+        that is only in the store)."""
+        self.codes.take(code)
+
+    def in_use(self, code: str) -> bool:
+        """`code` is a well-formed code held by a room: live, hibernated,
+        only in the store, or allocated and about to be added."""
+        return self.codes.used(code)
+
+    def add(self, code: str, room: Room) -> None:
+        with self._lock:
+            self.codes.take(code)
+            self._rooms[code] = room
+            self._set_phase(code, room.state.phase)
+        since = room.emptySince
+        if since:
+            self.mark_empty(code, since)
+
+    def remove(self, code: str) -> Optional[Room]:
+        """Drop a live or hibernated room and free its code."""
+        with self._lock:
+            room = self._rooms.pop(code, None)
+            if room is None and self._asleep.pop(code, False) is False:
+                return None
+            self._drop_phase(code)
+            self.removed += 1
+        self.codes.release(code)
+        return room
+
+    # --- hibernation ---
+    def hibernate(self, code: str) -> Optional[Room]:
+        """Take `code` out of the live rooms, keeping everything else."""
+        with self._lock:
+            room = self._rooms.pop(code, None)
+            if room is not None:
+                self._asleep[code] = room.emptySince
+            return room
+
+    def wake(self, code: str, room: Room) -> None:
+        """Put a hibernated room back (its expiry entry is still queued)."""
+        with self._lock:
+            self._asleep.pop(code, None)
+            self._rooms[code] = room
+            self._set_phase(code, room.state.phase)
+
+    def hibernated(self, code: str) -> bool:
+        return code in self._asleep
+
+    # --- expiry ---
+    def mark_empty(self, code: str, since: float) -> None:
+        """The room emptied at `since`; it expires ttl later unless its
+        emptySince changes in the meantime."""
+        self._push(since + self.ttl, code, since)
+
+    def defer(self, code: str, at: float) -> None:
+        """Look at `code` again at time `at` (it was busy when due)."""
+        room = self._rooms.get(code)
+        if room is not None and room.emptySince:
+            self._push(at, code, room.emptySince)
+
+    def _push(self, deadline: float, code: str, since: float) -> None:
+        with self._lock:
+            heapq.heappush(self._heap, (deadline, next(self._seq), code, since))
+
+    def expired(self, now: float) -> List[str]:
+        """Pop the codes of rooms that have been empty for ttl by `now`.
+        Stale entries (room gone, refilled or re-emptied) are dropped."""
+        out = []
+        with self._lock:
+            heap = self._heap
+            while heap and heap[0][0] <= now:
+                _, _, code, since = heapq.heappop(heap)
+                room = self._rooms.get(code)
+                current = room.emptySince if room is not None else self._asleep.get(code)
+                if current == since:
+                    out.append(code)
+        return out
+
+    # --- phases ---
+    def note_phase(self, code: str, phase: Optional[str]) -> None:
+        with self._lock:
+            if code in self._rooms:
+                self._set_phase(code, phase)
+
+    def _set_phase(self, code: str, phase: Optional[str]) -> None:
+        if code in self._phase:
+            if self._phase[code] == phase:
+                return
+            self._drop_phase(code)
+        self._phase[code] = phase
+        self._by_phase[phase] += 1
+
+    def _drop_phase(self, code: str) -> None:
+        if code in self._phase:
+            old = self._phase.pop(code)
+            self._by_phase[old] -= 1
+            if not self._by_phase[old]:
+                del self._by_phase[old]
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "rooms": len(self._rooms),
+                "byPhase": {str(k): v for k, v in self._by_phase.items()},
+                "freeCodes": self.codes.free,
+                "expiryQueue": len(self._heap),
+                "hibernated": len(self._asleep),
+                "removed": self.removed,
+            }
+
+
+class SeatIndex:
+    """Global reverse indexes over the rooms' ``members``/``sidToClient``:
+
+    - sid -> {code: (seat, clientId)}
+    - clientId -> {code: (seat, sid)}
+
+    so a disconnect finds its rooms, and a rejoin finds the client's old
+    sid, without scanning. Only live attachments are indexed; seat
+    reservations of clients that are away stay in the room's ``clients``.
+    Callers change a room's members and the index together, under the
+    room lock; ``check`` compares the two.
+    """
+
+    def __init__(self):
+        self._sids: Dict[str, Dict[str, Tuple[int, Optional[str]]]] = {}
+        self._clients: Dict[str, Dict[str, Tuple[int, str]]] = {}
+        self._lock = threading.Lock()
+
+    def attach(self, sid: str, code: str, seat: int, client_id: Optional[str] = None) -> None:
+        with self._lock:
+            old = self._sids.setdefault(sid, {}).get(code)
+            if old is not None and old[1] and old[1] != client_id:
+                self._unlink_client(old[1], code, sid)
+            self._sids[sid][code] = (seat, client_id)
+            if client_id:
+                self._clients.setdefault(client_id, {})[code] = (seat, sid)
+
+    def detach(self, sid: str, code: str) -> Optional[Tuple[int, Optional[str]]]:
+        """Drop `sid` from room `code`; its (seat, clientId) if it was there."""
+        with self._lock:
+            rooms = self._sids.get(sid)
+            entry = rooms.pop(code, None) if rooms else None
+            if rooms is not None and not rooms:
+                del self._sids[sid]
+            if entry is not None and entry[1]:
+                self._unlink_client(entry[1], code, sid)
+            return entry
+
+    def _unlink_client(self, client_id: str, code: str, sid: str) -> None:
+        rooms = self._clients.get(client_id)
+        if rooms and rooms.get(code, (None, None))[1] == sid:
+            del rooms[code]
+            if not rooms:
+                del self._clients[client_id]
+
+    def rooms_of(self, sid: str) -> List[str]:
+        with self._lock:
+            return list(self._sids.get(sid, ()))
+
+    def sid_of(self, client_id: str, code: str) -> Optional[str]:
+        """The live sid of `client_id` in room `code`, if any."""
+        with self._lock:
+            entry = self._clients.get(client_id, {}).get(code)
+            return entry[1] if entry else None
+
+    def check(self, rooms, asleep=()) -> List[str]:
+        """Differences between the index and `rooms` (empty when in sync).
+        Entries of the `asleep` (hibernated) rooms are not compared."""
+        errors = []
+        with self._lock:
+            sids = {(sid, code): entry for sid, by_room in self._sids.items() for code, entry in by_room.items()}
+            clients = {(cid, code): entry for cid, by_room in self._clients.items() for code, entry in by_room.items()}
+        live = set()
+        for code, room in list(rooms.items()):
+            to_client = room.sidToClient
+            for sid, seat in list(room.members.items()):
+                live.add((sid, code))
+                cid = to_client.get(sid)
+                if sids.get((sid, code)) != (seat, cid):
+                    errors.append(f"[{code}] sid {sid}: index {sids.get((sid, code))} != room {(seat, cid)}")
+                if cid and clients.get((cid, code)) != (seat, sid):
+                    errors.append(f"[{code}] client {cid}: index {clients.get((cid, code))} != room {(seat, sid)}")
+            for sid in to_client:
+                if sid not in room.members:
+                    errors.append(f"[{code}] sidToClient has non-member {sid}")
+        for sid, code in sids.keys() - live:
+            if code not in asleep:
+                errors.append(f"[{code}] indexed sid {sid} is not a member")
+        for (cid, code), (_, sid) in clients.items():
+            if (sid, code) not in live and code not in asleep:
+                errors.append(f"[{code}] indexed client {cid} has no member sid {sid}")
+        return errors
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"sids": len(self._sids), "clients": len(self._clients)}
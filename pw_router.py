@@ -0,0 +1,153 @@
+"""Shard router: one public port in front of N shard workers.
+
+Every request carrying ``?shard=<key>`` (online.js adds the room code, or a
+random code before a room exists, to every Socket.IO request) goes to
+``pw_shard.shard_of(key)``. Other Socket.IO and admin requests go to shard
+0 (scorekeeper rooms live there); plain page and asset requests are spread
+round-robin.
+
+Only the request head is parsed. Plain requests are forwarded with
+``Connection: close``; after an ``Upgrade`` (WebSocket) the two sockets are
+piped until either side closes. Each client connection gets one thread.
+
+scripts/run_shards.py runs it in front of the workers; any balancer that
+can route on the ``shard`` query argument with the same rule (digits:
+value % shards) can take its place.
+"""
+from __future__ import annotations
+
+import itertools
+import selectors
+import socket
+import threading
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import pw_shard
+
+MAX_HEAD = 64 * 1024
+BUFFER = 64 * 1024
+
+Address = Tuple[str, int]
+
+
+def _read_head(conn: socket.socket) -> Tuple[Optional[bytes], bytes]:
+    """(request head incl. the blank line, bytes read past it)."""
+    buf = b""
+    while b"\r\n\r\n" not in buf:
+        if len(buf) > MAX_HEAD:
+            return None, b""
+        chunk = conn.recv(BUFFER)
+        if not chunk:
+            return None, b""
+        buf += chunk
+    end = buf.index(b"\r\n\r\n") + 4
+    return buf[:end], buf[end:]
+
+
+class Router:
+    def __init__(self, listen: Address, backends: Sequence[Address]):
+        if not backends:
+            raise ValueError("no backends")
+        self.backends: List[Address] = list(backends)
+        self._server = socket.create_server(listen)
+        self.address = self._server.getsockname()[:2]
+        self._rr = itertools.count()
+        self._lock = threading.Lock()
+        self.requests = [0] * len(self.backends)
+        self.errors = 0
+
+    def pick(self, target: str) -> int:
+        """Backend index for a request target ("/path?query")."""
+        parts = urlsplit(target)
+        key = (parse_qs(parts.query).get("shard") or [""])[0]
+        if key:
+            return pw_shard.shard_of(key, len(self.backends))
+        if parts.path.startswith(("/socket.io", "/admin")):
+            return 0
+        return next(self._rr) % len(self.backends)
+
+    def serve_forever(self) -> None:
+        while True:
+            try:
+                conn, peer = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handle, args=(conn, peer), daemon=True).start()
+
+    def start(self) -> "Router":
+        threading.Thread(target=self.serve_forever, name="pw-router", daemon=True).start()
+        return self
+
+    def close(self) -> None:
+        self._server.close()
+
+    def _handle(self, conn: socket.socket, peer) -> None:
+        upstream = None
+        try:
+            head, rest = _read_head(conn)
+            if head is None:
+                return
+            lines = head.decode("latin-1").split("\r\n")
+            try:
+                _method, target, _version = lines[0].split(" ", 2)
+            except ValueError:
+                conn.sendall(b"HTTP/1.1 400 Bad Request\r\nConnection: close\r\nContent-Length: 0\r\n\r\n")
+                return
+            headers = [line for line in lines[1:] if line]
+            upgrade = any(h.lower().startswith("upgrade:") for h in headers)
+            if not upgrade:
+                headers = [h for h in headers if not h.lower().startswith(("connection:", "keep-alive:"))]
+                headers.append("Connection: close")
+            headers.append(f"X-Forwarded-For: {peer[0]}")
+            index = self.pick(target)
+            with self._lock:
+                self.requests[index] += 1
+            try:
+                upstream = socket.create_connection(self.backends[index], timeout=10.0)
+            except OSError:
+                with self._lock:
+                    self.errors += 1
+                conn.sendall(b"HTTP/1.1 502 Bad Gateway\r\nConnection: close\r\nContent-Length: 0\r\n\r\n")
+                return
+            upstream.settimeout(None)
+            upstream.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            upstream.sendall("\r\n".join([lines[0], *headers, "", ""]).encode("latin-1") + rest)
+            self._pipe(conn, upstream)
+        except OSError:
+            pass
+        finally:
+            for s in (conn, upstream):
+                if s is not None:
+                    try:
+                        s.close()
+                    except OSError:
+                        pass
+
+    @staticmethod
+    def _pipe(client: socket.socket, upstream: socket.socket) -> None:
+        """Copy both ways; done when the backend closes (the client closing
+        first only half-closes towards the backend)."""
+        sel = selectors.DefaultSelector()
+        sel.register(client, selectors.EVENT_READ, upstream)
+        sel.register(upstream, selectors.EVENT_READ, client)
+        try:
+            while True:
+                for key, _ in sel.select():
+                    src, dst = key.fileobj, key.data
+                    data = src.recv(BUFFER)
+                    if not data:
+                        if src is upstream:
+                            return
+                        sel.unregister(client)
+                        upstream.shutdown(socket.SHUT_WR)
+                        continue
+                    dst.sendall(data)
+        finally:
+            sel.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"backends": [f"{h}:{p}" for h, p in self.backends], "requests": list(self.requests),
+                    "errors": self.errors}
@@ -0,0 +1,322 @@
+"""Timers for every room task: deals, bot turns, sweeps, frames, idle clocks.
+
+``Scheduler`` is one timer thread over a deadline heap plus a small worker
+pool, so the thread count does not grow with the number of rooms.
+``AsyncScheduler`` offers the same interface on an asyncio loop (asgi.py)
+and runs callbacks on the loop thread.
+
+A ``key`` names a task: scheduling the same key again replaces the pending
+call, and ``cancel(key)``/``pending(key)`` act on it. ``retry`` re-queues a
+fired timer under its key (room tasks that found their room busy). A task
+that raises is logged and counted in ``metrics()["errors"]``.
+"""
+from __future__ import annotations
+
+import heapq
+import itertools
+import logging
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+# Cancelled timers kept in the heap before it is worth compacting.
+COMPACT_MIN = 64
+
+log = logging.getLogger("pw_scheduler")
+
+
+class Timer:
+    """Handle for one scheduled call. Cancelling is O(1); the heap entry is
+    dropped lazily when it reaches the top, or when cancelled entries make
+    up most of the heap."""
+
+    __slots__ = ("deadline", "fn", "args", "key", "cancelled")
+
+    def __init__(self, deadline: float, fn: Callable[..., Any], args: Tuple[Any, ...], key: Optional[Hashable]):
+        self.deadline = deadline
+        self.fn = fn
+        self.args = args
+        self.key = key
+        self.cancelled = False
+
+
+class Scheduler:
+    """One timer thread + a small worker pool for all rooms.
+
+    Events are kept in a min-heap ordered by deadline (monotonic clock). A
+    `key` acts as a cancellation token: scheduling a new event with the same
+    key replaces the pending one, and `cancel(key)` drops it. Thread count
+    stays at 1 + workers no matter how many rooms are open.
+    """
+
+    def __init__(self, workers: int = 4, name: str = "pw-scheduler"):
+        self.workers = max(1, int(workers))
+        self.name = name
+        self._heap: List[Tuple[float, int, Timer]] = []
+        self._seq = itertools.count()
+        self._keys: Dict[Hashable, Timer] = {}
+        self._cond = threading.Condition()
+        self._thread: Optional[threading.Thread] = None
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._cancelled = 0
+        self._local = threading.local()
+        self._running = 0
+        self._executed = 0
+        self._errors = 0
+        self._lag_last = 0.0
+        self._lag_max = 0.0
+
+    # --- scheduling ---
+    def call_later(self, delay: float, fn: Callable[..., Any], *args: Any, key: Optional[Hashable] = None) -> Timer:
+        return self.call_at(time.monotonic() + max(0.0, float(delay)), fn, *args, key=key)
+
+    def call_at(self, deadline: float, fn: Callable[..., Any], *args: Any, key: Optional[Hashable] = None) -> Timer:
+        timer = Timer(deadline, fn, args, key)
+        with self._cond:
+            if key is not None:
+                self._cancel_locked(self._keys.get(key))
+                self._keys[key] = timer
+            heapq.heappush(self._heap, (deadline, next(self._seq), timer))
+            self._ensure_started()
+            self._cond.notify()
+        return timer
+
+    def retry(self, timer: Timer, delay: float) -> Optional[Timer]:
+        """Run a fired `timer` again after `delay`, under the same key. If
+        the key was scheduled again in the meantime, the newer call wins
+        and this returns None."""
+        with self._cond:
+            if timer.key is not None and timer.key in self._keys:
+                return None
+            return self.call_later(delay, timer.fn, *timer.args, key=timer.key)
+
+    def current(self) -> Optional[Timer]:
+        """The timer whose callback is running on this thread, if any."""
+        return getattr(self._local, "timer", None)
+
+    def cancel(self, key: Hashable) -> bool:
+        with self._cond:
+            timer = self._keys.pop(key, None)
+            return self._cancel_locked(timer)
+
+    def pending(self, key: Hashable) -> bool:
+        with self._cond:
+            timer = self._keys.get(key)
+            return timer is not None and not timer.cancelled
+
+    def _cancel_locked(self, timer: Optional[Timer]) -> bool:
+        if timer is None or timer.cancelled:
+            return False
+        timer.cancelled = True
+        self._cancelled += 1
+        if self._cancelled > COMPACT_MIN and self._cancelled * 2 > len(self._heap):
+            # Long timers (idle clocks, takeovers) would sit in the heap
+            # until their deadline; rebuild it without them instead.
+            self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+            heapq.heapify(self._heap)
+            self._cancelled = 0
+        return True
+
+    # --- metrics ---
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            depth = len(self._heap) - self._cancelled
+            lag_next = 0.0
+            if self._heap:
+                lag_next = max(0.0, time.monotonic() - self._heap[0][0])
+            running, executed, errors = self._running, self._executed, self._errors
+        return {
+            "queueDepth": depth,
+            "running": running,
+            "workers": self.workers,
+            "executed": executed,
+            "errors": errors,
+            "lagMs": round(max(self._lag_last, lag_next) * 1000.0, 3),
+            "maxLagMs": round(self._lag_max * 1000.0, 3),
+        }
+
+    # --- internals ---
+    def _ensure_started(self) -> None:
+        if self._thread is not None:
+            return
+        self._pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix=f"{self.name}-worker")
+        self._thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+        self._thread.start()
+
+    def _next_due(self) -> Timer:
+        with self._cond:
+            while True:
+                while self._heap and self._heap[0][2].cancelled:
+                    heapq.heappop(self._heap)
+                    self._cancelled -= 1
+                if not self._heap:
+                    self._cond.wait()
+                    continue
+                wait_for = self._heap[0][0] - time.monotonic()
+                if wait_for > 0:
+                    self._cond.wait(wait_for)
+                    continue
+                _, _, timer = heapq.heappop(self._heap)
+                if timer.key is not None and self._keys.get(timer.key) is timer:
+                    del self._keys[timer.key]
+                self._lag_last = max(0.0, time.monotonic() - timer.deadline)
+                self._lag_max = max(self._lag_max, self._lag_last)
+                return timer
+
+    def _run(self) -> None:
+        while True:
+            timer = self._next_due()
+            try:
+                self._pool.submit(self._execute, timer)
+            except RuntimeError:
+                # Interpreter shutdown: the pool no longer accepts work.
+                return
+
+    def _execute(self, timer: Timer) -> None:
+        with self._cond:
+            self._running += 1
+        self._local.timer = timer
+        failed = False
+        try:
+            timer.fn(*timer.args)
+        except Exception:
+            # don't crash the worker on room task errors
+            log.exception("scheduled task %r (key %r) failed", timer.fn, timer.key)
+            failed = True
+        finally:
+            self._local.timer = None
+            with self._cond:
+                self._running -= 1
+                self._executed += 1
+                self._errors += failed
+
+
+class AsyncScheduler:
+    """The Scheduler interface on an asyncio event loop (asgi.py).
+
+    Timers are loop timer handles and callbacks run on the loop thread
+    itself, so there are no scheduler threads at all. Callbacks must not
+    block. `call_later` may be called from any thread (e.g. bot pool
+    callbacks); before `bind` timers are held and armed at startup.
+    """
+
+    def __init__(self, name: str = "pw-scheduler"):
+        self.name = name
+        self._loop = None
+        self._loop_thread: Optional[int] = None
+        self._lock = threading.Lock()
+        self._keys: Dict[Hashable, Timer] = {}
+        self._early: List[Timer] = []
+        self._current: Optional[Timer] = None
+        self._pending = 0
+        self._executed = 0
+        self._errors = 0
+        self._lag_last = 0.0
+        self._lag_max = 0.0
+
+    def bind(self, loop) -> None:
+        """Run timers on `loop` (call from the loop, at startup)."""
+        with self._lock:
+            self._loop = loop
+            self._loop_thread = threading.get_ident()
+            early, self._early = self._early, []
+        for timer in early:
+            self._arm(timer)
+
+    # --- scheduling ---
+    def call_later(self, delay: float, fn: Callable[..., Any], *args: Any, key: Optional[Hashable] = None) -> Timer:
+        return self.call_at(time.monotonic() + max(0.0, float(delay)), fn, *args, key=key)
+
+    def call_at(self, deadline: float, fn: Callable[..., Any], *args: Any, key: Optional[Hashable] = None) -> Timer:
+        timer = Timer(deadline, fn, args, key)
+        with self._lock:
+            if key is not None:
+                self._cancel_locked(self._keys.get(key))
+                self._keys[key] = timer
+            self._pending += 1
+            loop = self._loop
+            if loop is None:
+                self._early.append(timer)
+                return timer
+        if threading.get_ident() == self._loop_thread:
+            self._arm(timer)
+        else:
+            loop.call_soon_threadsafe(self._arm, timer)
+        return timer
+
+    def retry(self, timer: Timer, delay: float) -> Optional[Timer]:
+        """Run a fired `timer` again after `delay`, under the same key,
+        unless the key was scheduled again in the meantime."""
+        again = Timer(time.monotonic() + max(0.0, float(delay)), timer.fn, timer.args, timer.key)
+        with self._lock:
+            if timer.key is not None:
+                if timer.key in self._keys:
+                    return None
+                self._keys[timer.key] = again
+            self._pending += 1
+        if threading.get_ident() == self._loop_thread:
+            self._arm(again)
+        else:
+            self._loop.call_soon_threadsafe(self._arm, again)
+        return again
+
+    def current(self) -> Optional[Timer]:
+        """The timer whose callback is running (on the loop thread), if any."""
+        if threading.get_ident() != self._loop_thread:
+            return None
+        return self._current
+
+    def cancel(self, key: Hashable) -> bool:
+        with self._lock:
+            return self._cancel_locked(self._keys.pop(key, None))
+
+    def pending(self, key: Hashable) -> bool:
+        with self._lock:
+            timer = self._keys.get(key)
+            return timer is not None and not timer.cancelled
+
+    def _cancel_locked(self, timer: Optional[Timer]) -> bool:
+        if timer is None or timer.cancelled:
+            return False
+        timer.cancelled = True
+        self._pending -= 1
+        return True
+
+    # --- internals (loop thread) ---
+    def _arm(self, timer: Timer) -> None:
+        # The loop clock is time.monotonic, like Timer deadlines.
+        self._loop.call_at(timer.deadline, self._fire, timer)
+
+    def _fire(self, timer: Timer) -> None:
+        with self._lock:
+            if timer.cancelled:
+                return
+            timer.cancelled = True  # fired; a late cancel is a no-op
+            self._pending -= 1
+            if timer.key is not None and self._keys.get(timer.key) is timer:
+                del self._keys[timer.key]
+        self._lag_last = max(0.0, time.monotonic() - timer.deadline)
+        self._lag_max = max(self._lag_max, self._lag_last)
+        self._current = timer
+        try:
+            timer.fn(*timer.args)
+        except Exception:
+            log.exception("scheduled task %r (key %r) failed", timer.fn, timer.key)
+            self._errors += 1
+        finally:
+            self._current = None
+            self._executed += 1
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            depth = self._pending
+        return {
+            "queueDepth": depth,
+            "running": 0,
+            "workers": 0,
+            "executed": self._executed,
+            "errors": self._errors,
+            "lagMs": round(self._lag_last * 1000.0, 3),
+            "maxLagMs": round(self._lag_max * 1000.0, 3),
+        }
@@ -0,0 +1,314 @@
+"""Room-affinity sharding across worker processes.
+
+In sharded mode every online room lives in exactly one worker process,
+chosen by its code: 4-digit code % PW_SHARDS. Each worker only hands out
+codes that belong to it (PW_SHARD), a router (pw_router) sends every HTTP
+and Socket.IO request carrying ``?shard=<code>`` to the owning worker, and
+scorekeeper rooms all stay on shard 0. Workers share nothing in memory, so
+each one gets its own core and GIL.
+
+Emits that must reach another process (broadcasts, rooms owned by another
+shard) go through a message queue. ``client_manager`` picks the
+python-socketio manager for PW_MESSAGE_QUEUE:
+
+- ``pw://host:port``: ``BrokerManager``, talking to ``Broker`` below (a
+  small in-repo fan-out broker, enough for one host and for tests);
+- ``redis://...``: python-socketio's RedisManager (needs the redis package).
+
+Both skip the queue for emits to a room this shard owns or to a sid that
+is connected here. With affinity routing that is nearly every emit, so
+the queue carries no per-move traffic and does not cap throughput.
+
+Broker wire format: 4-byte big-endian length + JSON message, both ways.
+The broker forwards every frame to every other connection.
+"""
+from __future__ import annotations
+
+import json
+import logging
+import os
+import queue
+import socket
+import struct
+import threading
+import time
+import zlib
+from typing import Any, Dict, Optional, Tuple
+
+import socketio
+
+SHARD = int(os.environ.get("PW_SHARD", "0"))
+SHARDS = max(1, int(os.environ.get("PW_SHARDS", "1")))
+MESSAGE_QUEUE = os.environ.get("PW_MESSAGE_QUEUE", "")
+
+_FRAME = struct.Struct(">I")
+MAX_FRAME = 16 * 1024 * 1024
+RECONNECT_SECONDS = 1.0
+
+log = logging.getLogger("pw_shard")
+
+
+def shard_of(key: str, shards: int = SHARDS) -> int:
+    """Shard for a routing key: a room code or any other client key.
+    Digits map by value (so room 0007 is on shard 7 % shards), anything
+    else by CRC32."""
+    key = (key or "").strip()
+    if key.isdigit():
+        return int(key) % shards
+    return zlib.crc32(key.encode("utf-8")) % shards
+
+
+def owns(code: str) -> bool:
+    """Does this worker own online room `code`?"""
+    return shard_of(code) == SHARD
+
+
+def owns_room(name: str) -> bool:
+    """Does this worker own Socket.IO room `name`? Online rooms are 4
+    digits (optionally "<code>:public"), scorekeeper rooms are 6 characters
+    and live on shard 0. Anything else is not known to be local."""
+    base = (name or "").partition(":")[0]
+    if len(base) == 4 and base.isdigit():
+        return int(base) % SHARDS == SHARD
+    return len(base) == 6 and SHARD == 0
+
+
+def parse_address(url: str, default_port: int = 6390) -> Tuple[str, int]:
+    """("host", port) from "pw://host:port" or "host:port"."""
+    rest = url.split("://", 1)[-1].strip("/")
+    host, _, port = rest.rpartition(":")
+    if not host:
+        return rest or "127.0.0.1", default_port
+    return host, int(port)
+
+
+def _send_frame(sock: socket.socket, payload: bytes) -> None:
+    sock.sendall(_FRAME.pack(len(payload)) + payload)
+
+
+def _recv_exact(sock: socket.socket, n: int) -> Optional[bytes]:
+    buf = bytearray()
+    while len(buf) < n:
+        chunk = sock.recv(n - len(buf))
+        if not chunk:
+            return None
+        buf += chunk
+    return bytes(buf)
+
+
+def _recv_frame(sock: socket.socket) -> Optional[bytes]:
+    head = _recv_exact(sock, _FRAME.size)
+    if head is None:
+        return None
+    (size,) = _FRAME.unpack(head)
+    if size > MAX_FRAME:
+        raise ValueError(f"frame of {size} bytes")
+    return _recv_exact(sock, size)
+
+
+class _LocalEmits:
+    """Manager mixin: no queue round trip for emits that only this process
+    can deliver (a local sid, or a room owned by this shard)."""
+
+    def emit(self, event, data, namespace=None, room=None, skip_sid=None, callback=None, to=None, **kwargs):
+        room = to or room
+        if room is not None and callback is None and not kwargs.get("ignore_queue"):
+            if owns_room(room) or self.is_connected(room, namespace or "/"):
+                self.local_emits += 1
+                kwargs["ignore_queue"] = True
+        return super().emit(event, data, namespace=namespace, room=room, skip_sid=skip_sid,
+                            callback=callback, **kwargs)
+
+    def leave_room(self, sid, namespace, room):
+        # A disconnecting sid no longer counts as connected, which would
+        # send the leave through the queue; the room is ours, do it here.
+        if owns_room(room):
+            return super(socketio.PubSubManager, self).leave_room(sid, namespace, room)
+        return super().leave_room(sid, namespace, room)
+
+
+class BrokerManager(_LocalEmits, socketio.PubSubManager):
+    """python-socketio client manager backed by ``Broker``."""
+
+    name = "pwbroker"
+
+    def __init__(self, url: str, channel: str = "socketio", write_only: bool = False, logger=None):
+        super().__init__(channel=channel, write_only=write_only, logger=logger)
+        self.address = parse_address(url)
+        self._sock: Optional[socket.socket] = None
+        self._lock = threading.Lock()
+        self.local_emits = 0
+        self.published = 0
+        self.received = 0
+        self.reconnects = 0
+
+    def _connect(self) -> socket.socket:
+        with self._lock:
+            if self._sock is None:
+                sock = socket.create_connection(self.address, timeout=5.0)
+                sock.settimeout(None)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+                self._sock = sock
+                self.reconnects += 1
+            return self._sock
+
+    def _drop(self, sock: socket.socket) -> None:
+        with self._lock:
+            if self._sock is sock:
+                self._sock = None
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+    def _publish(self, data) -> None:
+        payload = json.dumps(data, separators=(",", ":")).encode("utf-8")
+        for _attempt in range(2):
+            try:
+                sock = self._connect()
+            except OSError as exc:
+                log.warning("message queue %s unreachable: %s", self.address, exc)
+                return
+            try:
+                with self._lock:
+                    _send_frame(sock, payload)
+                self.published += 1
+                return
+            except OSError:
+                self._drop(sock)
+
+    def _listen(self):
+        while True:
+            try:
+                sock = self._connect()
+            except OSError:
+                time.sleep(RECONNECT_SECONDS)
+                continue
+            try:
+                while True:
+                    frame = _recv_frame(sock)
+                    if frame is None:
+                        break
+                    self.received += 1
+                    yield frame
+            except (OSError, ValueError):
+                pass
+            self._drop(sock)
+            time.sleep(RECONNECT_SECONDS)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"backend": "pw", "address": f"{self.address[0]}:{self.address[1]}", "connected": self._sock is not None,
+                "localEmits": self.local_emits, "published": self.published, "received": self.received,
+                "connects": self.reconnects}
+
+
+def client_manager(url: str = MESSAGE_QUEUE):
+    """Socket.IO client manager for `url` (None without a queue)."""
+    if not url:
+        return None
+    if url.startswith("pw://"):
+        return BrokerManager(url)
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        class ShardRedisManager(_LocalEmits, socketio.RedisManager):
+            local_emits = 0
+
+            def metrics(self) -> Dict[str, Any]:
+                return {"backend": "redis", "localEmits": self.local_emits}
+
+        return ShardRedisManager(url)
+    raise ValueError(f"unsupported PW_MESSAGE_QUEUE {url!r}")
+
+
+class Broker:
+    """Fan-out broker: every frame from one connection goes to all others.
+
+    Each connection has its own send queue and writer thread, so a slow
+    subscriber never blocks a publisher.
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 6390):
+        self._server = socket.create_server((host, port), reuse_port=False)
+        self.address = self._server.getsockname()[:2]
+        self._lock = threading.Lock()
+        self._peers: Dict[socket.socket, "queue.SimpleQueue[Optional[bytes]]"] = {}
+        self.frames = 0
+        self._closed = False
+
+    def start(self) -> "Broker":
+        threading.Thread(target=self.serve_forever, name="pw-broker", daemon=True).start()
+        return self
+
+    def serve_forever(self) -> None:
+        while not self._closed:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            conn.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            out: "queue.SimpleQueue[Optional[bytes]]" = queue.SimpleQueue()
+            with self._lock:
+                self._peers[conn] = out
+            threading.Thread(target=self._read, args=(conn,), daemon=True).start()
+            threading.Thread(target=self._write, args=(conn, out), daemon=True).start()
+
+    def _read(self, conn: socket.socket) -> None:
+        try:
+            while True:
+                frame = _recv_frame(conn)
+                if frame is None:
+                    break
+                self.frames += 1
+                with self._lock:
+                    targets = [q for peer, q in self._peers.items() if peer is not conn]
+                for q in targets:
+                    q.put(frame)
+        except (OSError, ValueError):
+            pass
+        with self._lock:
+            out = self._peers.pop(conn, None)
+        if out is not None:
+            out.put(None)
+
+    @staticmethod
+    def _write(conn: socket.socket, out) -> None:
+        try:
+            while True:
+                frame = out.get()
+                if frame is None:
+                    break
+                _send_frame(conn, frame)
+        except OSError:
+            pass
+        try:
+            conn.close()
+        except OSError:
+            pass
+
+    def close(self) -> None:
+        self._closed = True
+        self._server.close()
+        with self._lock:
+            peers = list(self._peers.items())
+            self._peers.clear()
+        for conn, out in peers:
+            out.put(None)
+            try:
+                conn.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._lock:
+            return {"address": f"{self.address[0]}:{self.address[1]}", "peers": len(self._peers), "frames": self.frames}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    ap = argparse.ArgumentParser(description="Run the Socket.IO message broker for sharded mode.")
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, default=6390)
+    args = ap.parse_args()
+    broker = Broker(args.host, args.port)
+    print(f"pw broker on {broker.address[0]}:{broker.address[1]}", flush=True)
+    broker.serve_forever()
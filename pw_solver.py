@@ -0,0 +1,203 @@
+"""Exact (double-dummy) solver for small Piratwhist endgames.
+
+With every hand known, ``Solver.value`` finds the best round score one
+seat can guarantee from a position when the other seats play against it:
+alpha-beta search where `seat` maximises
+``points_for_round(bid, tricks)`` and everyone else minimises it. Cards
+are pw_cards ids and hands are bit masks.
+
+Positions are memoised in a transposition table keyed on the remaining
+hand masks, the trick in progress, the leader and the target's remaining
+trick need. The table is an LRU with a fixed entry cap, so memory stays
+flat no matter how many rooms or deals go through one solver. A Solver
+is not thread-safe; use one per thread or process.
+"""
+from __future__ import annotations
+
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, List, Optional, Sequence, Tuple
+
+import pw_cards
+import pw_engine
+
+SUIT_OF = pw_cards.SUIT_OF
+SUIT_MASK = pw_cards.SUIT_MASK
+STRENGTH = pw_cards.STRENGTH
+
+# Cards left in all hands combined (trick in progress included) up to
+# which search is cheap enough per sampled deal for a live bot move, and
+# dealt cards up to which a finished round can be analysed.
+MAX_CARDS = 12
+ANALYSIS_MAX_CARDS = 20
+TABLE_ENTRIES = 200_000
+
+_EXACT, _LOWER, _UPPER = 0, 1, 2
+
+
+class TranspositionTable:
+    """Bounded LRU map from position keys to (flag, value)."""
+
+    def __init__(self, max_entries: int = TABLE_ENTRIES):
+        self.max_entries = max(1, int(max_entries))
+        self._data: "OrderedDict[Hashable, Tuple[int, int]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable) -> Optional[Tuple[int, int]]:
+        entry = self._data.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._data.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, entry: Tuple[int, int]) -> None:
+        data = self._data
+        data[key] = entry
+        data.move_to_end(key)
+        if len(data) > self.max_entries:
+            data.popitem(last=False)
+            self.evictions += 1
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"entries": len(self._data), "maxEntries": self.max_entries,
+                "hits": self.hits, "misses": self.misses, "evictions": self.evictions}
+
+
+def _terminal(need: int, bid: int) -> int:
+    # `need` = bid minus tricks taken
+    return pw_engine.points_for_round(bid, bid - need)
+
+
+def _moves(hand: int, lead: Optional[int], live: int) -> List[int]:
+    """Legal cards, one per run of equivalent cards (same hand, same suit,
+    no live card between them), highest first."""
+    legal = pw_cards.legal_mask(hand, lead)
+    out = []
+    for c in reversed(pw_cards.cards_of(legal)):
+        lower = live & SUIT_MASK[SUIT_OF[c]] & ((1 << c) - 1)
+        if lower and (hand >> (lower.bit_length() - 1)) & 1:
+            continue  # the next lower live card is ours: same value
+        out.append(c)
+    return out
+
+
+class Solver:
+    def __init__(self, max_entries: int = TABLE_ENTRIES):
+        self.table = TranspositionTable(max_entries)
+        self.nodes = 0
+
+    def value(self, hands: Sequence[int], table: Sequence[Optional[int]], leader: int,
+              seat: int, bid: int, taken: int) -> int:
+        """Round points `seat` can guarantee from this position.
+
+        `hands` are masks per seat, `table` the trick in progress (None for
+        seats that have not played), `taken` the tricks `seat` already has.
+        """
+        return self._search(tuple(hands), tuple(-1 if c is None else c for c in table), leader,
+                            seat, bid - taken, bid, -1000, 1000)
+
+    def card_values(self, hands: Sequence[int], table: Sequence[Optional[int]], leader: int,
+                    seat: int, bid: int, taken: int) -> Dict[int, int]:
+        """Exact value of every legal card for `seat`, which must be on turn."""
+        hands = tuple(hands)
+        tbl = tuple(-1 if c is None else c for c in table)
+        lead = SUIT_OF[tbl[leader]] if tbl[leader] >= 0 else None
+        live = _live(hands, tbl)
+        values: Dict[int, int] = {}
+        for c in _moves(hands[seat], lead, live):
+            values[c] = self._after(hands, tbl, leader, seat, c, seat, bid - taken, bid, -1000, 1000)
+        # A card skipped as equivalent takes the value of the next lower
+        # live card, which is in the same hand (lowest first, so it is set).
+        for c in pw_cards.cards_of(pw_cards.legal_mask(hands[seat], lead)):
+            if c not in values:
+                lower = live & SUIT_MASK[SUIT_OF[c]] & ((1 << c) - 1)
+                values[c] = values[lower.bit_length() - 1]
+        return values
+
+    # --- search ---
+    def _search(self, hands, tbl, leader, seat, need, bid, alpha, beta) -> int:
+        if not any(hands) and all(c < 0 for c in tbl):
+            return _terminal(need, bid)
+        key = (hands, tbl, leader, seat, need, bid)
+        entry = self.table.get(key)
+        if entry is not None:
+            flag, v = entry
+            if flag == _EXACT:
+                return v
+            if flag == _LOWER and v >= beta:
+                return v
+            if flag == _UPPER and v <= alpha:
+                return v
+        self.nodes += 1
+        n = len(hands)
+        turn = leader
+        for k in range(n):
+            turn = (leader + k) % n
+            if tbl[turn] < 0:
+                break
+        lead = SUIT_OF[tbl[leader]] if tbl[leader] >= 0 else None
+        live = _live(hands, tbl)
+        a0, b0 = alpha, beta
+        if turn == seat:
+            v = -1000
+            for c in _moves(hands[turn], lead, live):
+                v = max(v, self._after(hands, tbl, leader, turn, c, seat, need, bid, alpha, beta))
+                alpha = max(alpha, v)
+                if alpha >= beta:
+                    break
+        else:
+            v = 1000
+            for c in _moves(hands[turn], lead, live):
+                v = min(v, self._after(hands, tbl, leader, turn, c, seat, need, bid, alpha, beta))
+                beta = min(beta, v)
+                if alpha >= beta:
+                    break
+        flag = _UPPER if v <= a0 else _LOWER if v >= b0 else _EXACT
+        self.table.put(key, (flag, v))
+        return v
+
+    def _after(self, hands, tbl, leader, turn, card, seat, need, bid, alpha, beta) -> int:
+        hands = hands[:turn] + (hands[turn] & ~(1 << card),) + hands[turn + 1:]
+        tbl = tbl[:turn] + (card,) + tbl[turn + 1:]
+        if -1 in tbl:
+            return self._search(hands, tbl, leader, seat, need, bid, alpha, beta)
+        strength = STRENGTH[SUIT_OF[tbl[leader]]]
+        winner = leader
+        for s, c in enumerate(tbl):
+            if strength[c] > strength[tbl[winner]]:
+                winner = s
+        if winner == seat:
+            need -= 1
+        return self._search(hands, (-1,) * len(hands), winner, seat, need, bid, alpha, beta)
+
+
+def _live(hands: Sequence[int], tbl: Sequence[int]) -> int:
+    live = 0
+    for h in hands:
+        live |= h
+    for c in tbl:
+        if c >= 0:
+            live |= 1 << c
+    return live
+
+
+def round_analysis(dealt: Sequence[Sequence[int]], leader: int, solver: Optional[Solver] = None) -> List[Dict[str, Any]]:
+    """Per seat: the guaranteed score for every possible bid on the dealt
+    hands (others playing against the seat) and the best bid."""
+    solver = solver or Solver()
+    hands = [pw_cards.mask_of(h) for h in dealt]
+    n = len(hands)
+    cards_per = len(dealt[0]) if dealt else 0
+    out = []
+    for seat in range(n):
+        values = [solver.value(hands, [None] * n, leader, seat, bid, 0) for bid in range(cards_per + 1)]
+        best = max(range(len(values)), key=lambda b: (values[b], -b))
+        out.append({"seat": seat, "bestBid": best, "bestPoints": values[best], "pointsByBid": values})
+    return out
+
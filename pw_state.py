@@ -0,0 +1,209 @@
+"""Typed game and room state: slotted classes instead of nested dicts.
+
+``GameState`` is one game (what pw_engine plays on) and ``Room`` is the
+online room around it. Every field is a slot, set by the one constructor,
+so the hot paths read attributes (``st.turn``, ``room.members``) and a
+room costs a fraction of the dicts it replaces. Fields that do not apply
+yet hold None, never "missing".
+
+Code that indexes by name (scripts, JSON records, the store) still works:
+``st["turn"]``, ``st.get("turn")``, ``dict(st)``, ``"turn" in st``. That
+path is several times slower than an attribute, so the server does not
+use it.
+
+``Room.to_public()`` and ``Room.to_private(seat)`` are the wire
+projections (cards as ``{"suit", "rank"}`` dicts, hands hidden). They are
+built fresh on each call and not kept on the room: a frame builds the
+public part once and each hand view once, and drops them when it is sent.
+"""
+from __future__ import annotations
+
+import time
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pw_cards
+
+
+class _Fields:
+    """Mapping access to the slots listed in FIELDS."""
+
+    __slots__ = ()
+    FIELDS: Tuple[str, ...] = ()
+
+    __getitem__ = object.__getattribute__
+    __setitem__ = object.__setattr__
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return getattr(self, key, default)
+
+    def __contains__(self, key: object) -> bool:
+        return key in self.FIELDS
+
+    def __iter__(self):
+        return iter(self.FIELDS)
+
+    def keys(self) -> Tuple[str, ...]:
+        return self.FIELDS
+
+    def items(self) -> List[Tuple[str, Any]]:
+        return [(k, getattr(self, k)) for k in self.FIELDS]
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {k: getattr(self, k) for k in self.FIELDS}
+
+
+class GameState(_Fields):
+    FIELDS = (
+        "n", "names", "botSeats", "roundIndex", "leader", "turn", "leadSuit", "table", "winner", "phase",
+        "hands", "bids", "cardsPer", "tricksRound", "tricksTotal", "pointsTotal", "history",
+        # Public knowledge for search bots: cards already played this round
+        # (bit mask) and, per seat, suits it has shown out of (bit per suit).
+        "playedMask", "voids",
+        # Private: hands as dealt this round, and per finished round (for
+        # post-round analysis). Never sent to clients.
+        "dealt", "dealtHistory",
+        # Private: the deal seed; every round's hands follow from it
+        # (pw_engine.deal_rng). None deals from the caller's RNG.
+        "seed",
+        # Online pacing: deal animation, trick sweep, bot turn bookkeeping.
+        "dealId", "dealSeq", "dealEndsAt", "autoNextDoneFor", "sweepUntil", "lastActionAt",
+        "botScheduledAt", "botScheduledTurn",
+    )
+    # predealt: the next round dealt ahead (pw_engine.predeal), as
+    # (roundIndex, hands, dealt, cardsPer). Not a field: it is never stored
+    # or sent, and is dealt again from the seed when missing.
+    # handMasks: per seat, the hand as a pw_cards mask (pw_engine keeps it
+    # in step with hands). Not a field either: rebuilt from hands when None.
+    __slots__ = FIELDS + ("predealt", "handMasks")
+
+    def __init__(self, n_players: int, names: Optional[List[Optional[str]]] = None, bot_seats: Iterable[int] = ()):
+        self.n = n_players
+        self.names = list(names) if names is not None else [None] * n_players
+        self.botSeats = set(bot_seats)
+        self.roundIndex = 0
+        self.leader = 0
+        self.turn = 0
+        self.leadSuit = None
+        self.table = [None] * n_players
+        self.winner = None
+        self.phase = "lobby"
+        self.hands = [None] * n_players
+        self.bids = [None] * n_players
+        self.cardsPer = None
+        self.tricksRound = [0] * n_players
+        self.tricksTotal = [0] * n_players
+        self.pointsTotal = [0] * n_players
+        self.history = []
+        self.playedMask = 0
+        self.voids = [0] * n_players
+        self.dealt = None
+        self.dealtHistory = []
+        self.seed = None
+        self.predealt = None
+        self.handMasks = None
+        self.dealId = 0
+        self.dealSeq = None
+        self.dealEndsAt = None
+        self.autoNextDoneFor = None
+        self.sweepUntil = None
+        self.lastActionAt = None
+        self.botScheduledAt = 0.0
+        self.botScheduledTurn = None
+
+    @classmethod
+    def from_dict(cls, fields: Dict[str, Any]) -> "GameState":
+        """A state from its dict form (a store record); unknown keys are
+        dropped."""
+        st = cls(int(fields["n"]))
+        for key in cls.FIELDS:
+            if key in fields:
+                setattr(st, key, fields[key])
+        st.botSeats = set(st.botSeats or ())
+        if isinstance(st.leadSuit, str):
+            # Records written while the lead suit was kept as its glyph.
+            st.leadSuit = pw_cards.SUIT_INDEX[st.leadSuit]
+        return st
+
+
+class Room(_Fields):
+    FIELDS = (
+        "code", "botLevel", "state",
+        # Connections: sid -> seat, sid -> clientId, and clientId -> {seat,
+        # lastSeen} reservations that outlive a connection.
+        "members", "sidToClient", "clients",
+        # Delta sync: state revision, last public fields sent, per-sid hand views.
+        "rev", "publicRev", "sentPublic", "sync",
+        # Frames: one pending, and the phase of the last one sent.
+        "frameDue", "framePhase",
+        # Animation acks: the revision a paced step waits on (None: not
+        # waiting) and the seats that have acked it.
+        "animRev", "animAcks",
+        # Lifecycle: emptied at, last touched, on hold (nobody connected),
+        # pending takeovers (seat -> marker).
+        "emptySince", "touchedAt", "suspended", "pendingBotTakeover",
+    )
+    __slots__ = FIELDS
+
+    def __init__(self, code: Optional[str], state: GameState, bot_level: Optional[str],
+                 clients: Optional[Dict[str, Dict[str, Any]]] = None, rev: int = 0, public_rev: int = 0):
+        self.code = code
+        self.botLevel = bot_level
+        self.state = state
+        self.members = {}
+        self.sidToClient = {}
+        self.clients = clients if clients is not None else {}
+        self.rev = rev
+        self.publicRev = public_rev
+        self.sentPublic = {}
+        self.sync = {}
+        self.frameDue = False
+        self.framePhase = None
+        self.animRev = None
+        self.animAcks = set()
+        self.emptySince = None
+        self.touchedAt = time.time()
+        self.suspended = False
+        self.pendingBotTakeover = {}
+
+    # --- projections ---
+    def to_public(self) -> Dict[str, Any]:
+        """Everything every member and spectator may see (no hands)."""
+        st = self.state
+        return {
+            "n": st.n,
+            "names": st.names,
+            "roundIndex": st.roundIndex,
+            "cardsPer": st.cardsPer,
+            "leader": st.leader,
+            "turn": st.turn,
+            # The state keeps a suit index; clients get the glyph.
+            "leadSuit": None if st.leadSuit is None else pw_cards.SUITS[st.leadSuit],
+            "table": [pw_cards.to_wire(c) for c in st.table],
+            "winner": st.winner,
+            "phase": st.phase,
+            "bids": st.bids,
+            "tricksRound": st.tricksRound,
+            "tricksTotal": st.tricksTotal,
+            "pointsTotal": st.pointsTotal,
+            "history": st.history,
+            "botSeats": sorted(st.botSeats),
+            "botLevel": self.botLevel,
+            # Deal animation metadata (cards themselves remain private).
+            "dealId": st.dealId,
+            "dealSeq": st.dealSeq,
+        }
+
+    def to_private(self, seat: int) -> List[Optional[List[Dict[str, str]]]]:
+        """The hands as `seat` sees them: its own hand, except in one-card
+        rounds while dealing and bidding, where it sees everybody's but
+        its own."""
+        st = self.state
+        hands = st.hands
+        if st.cardsPer == 1 and st.phase in ("dealing", "bidding"):
+            return [(pw_cards.hand_to_wire(hands[i]) if i != seat else None) for i in range(st.n)]
+        hand = pw_cards.hand_to_wire(hands[seat]) if hands[seat] else []
+        return [hand if i == seat else None for i in range(st.n)]
@@ -0,0 +1,222 @@
+"""Room persistence with write-behind batching.
+
+Request handlers only call ``mark_dirty(key, snapshot)``: an O(1) dict
+write under a lock. A writer thread wakes every ``interval`` seconds,
+calls each dirty room's ``snapshot()`` (several changes to one room in
+an interval become one write) and writes the batch in one transaction. A
+snapshot returns the serialized room, or None when the room is busy; the
+room then stays dirty until the next pass.
+
+Keys are ``(kind, code)`` tuples, e.g. ``("online", "1234")``.
+``RoomStore`` itself keeps nothing (persistence disabled);
+``SQLiteStore`` keeps rooms in an SQLite database in WAL mode.
+"""
+from __future__ import annotations
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+Key = Tuple[str, str]
+Snapshot = Callable[[], Optional[str]]
+
+DEFAULT_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "rooms.sqlite3")
+
+
+class RoomStore:
+    """Store interface; this base class persists nothing."""
+
+    def load(self, key: Key) -> Optional[Dict[str, Any]]:
+        return None
+
+    def exists(self, key: Key) -> bool:
+        return False
+
+    def codes(self, kind: str) -> List[str]:
+        return []
+
+    def mark_dirty(self, key: Key, snapshot: Snapshot) -> None:
+        pass
+
+    def delete(self, key: Key) -> None:
+        pass
+
+    def prune(self, max_age_seconds: float) -> int:
+        return 0
+
+    def flush(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"backend": "none"}
+
+
+class SQLiteStore(RoomStore):
+    def __init__(self, path: str, interval: float = 0.5):
+        self.path = path
+        self.interval = max(0.01, float(interval))
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS rooms ("
+            " kind TEXT NOT NULL, code TEXT NOT NULL, data TEXT NOT NULL, updated REAL NOT NULL,"
+            " PRIMARY KEY (kind, code))"
+        )
+        self._db_lock = threading.Lock()
+        self._cond = threading.Condition()
+        self._dirty: Dict[Key, Snapshot] = {}
+        self._deleted: Dict[Key, None] = {}
+        self._thread: Optional[threading.Thread] = None
+        self._closed = False
+        self._written = 0
+        self._batches = 0
+        self._errors = 0
+        self._last_batch = 0.0
+        self._max_batch = 0.0
+
+    # --- reads ---
+    def load(self, key: Key) -> Optional[Dict[str, Any]]:
+        with self._cond:
+            if key in self._deleted:
+                return None
+        with self._db_lock:
+            row = self._db.execute("SELECT data FROM rooms WHERE kind=? AND code=?", key).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def exists(self, key: Key) -> bool:
+        with self._cond:
+            if key in self._dirty:
+                return True
+            if key in self._deleted:
+                return False
+        with self._db_lock:
+            return self._db.execute("SELECT 1 FROM rooms WHERE kind=? AND code=?", key).fetchone() is not None
+
+    def codes(self, kind: str) -> List[str]:
+        """Codes of all stored rooms of `kind` (pending writes included)."""
+        with self._cond:
+            pending = {c for k, c in self._dirty if k == kind}
+            deleted = {c for k, c in self._deleted if k == kind}
+        with self._db_lock:
+            rows = self._db.execute("SELECT code FROM rooms WHERE kind=?", (kind,)).fetchall()
+        return sorted((pending | {r[0] for r in rows}) - deleted)
+
+    # --- writes (request path) ---
+    def mark_dirty(self, key: Key, snapshot: Snapshot) -> None:
+        with self._cond:
+            self._dirty[key] = snapshot
+            self._deleted.pop(key, None)
+            if self._thread is None and not self._closed:
+                self._thread = threading.Thread(target=self._run, name="pw-store", daemon=True)
+                self._thread.start()
+
+    def delete(self, key: Key) -> None:
+        with self._cond:
+            self._dirty.pop(key, None)
+            self._deleted[key] = None
+
+    def prune(self, max_age_seconds: float) -> int:
+        with self._db_lock:
+            cur = self._db.execute("DELETE FROM rooms WHERE updated < ?", (time.time() - max_age_seconds,))
+            return cur.rowcount
+
+    # --- writer ---
+    def _run(self) -> None:
+        while True:
+            with self._cond:
+                self._cond.wait(self.interval)
+                if self._closed:
+                    return
+            self.flush()
+
+    def flush(self) -> None:
+        with self._cond:
+            dirty, self._dirty = self._dirty, {}
+            deleted, self._deleted = self._deleted, {}
+        if not dirty and not deleted:
+            return
+        t0 = time.perf_counter()
+        rows = []
+        retry = {}
+        now = time.time()
+        for key, snapshot in dirty.items():
+            try:
+                data = snapshot()
+            except Exception:
+                # e.g. the room changed while being serialized; try again next pass
+                self._errors += 1
+                data = None
+            if data is None:
+                retry[key] = snapshot
+                continue
+            rows.append((key[0], key[1], data, now))
+        try:
+            with self._db_lock:
+                self._db.execute("BEGIN")
+                if rows:
+                    self._db.executemany("INSERT OR REPLACE INTO rooms (kind, code, data, updated) VALUES (?, ?, ?, ?)", rows)
+                if deleted:
+                    self._db.executemany("DELETE FROM rooms WHERE kind=? AND code=?", list(deleted))
+                self._db.execute("COMMIT")
+        except sqlite3.Error:
+            self._errors += 1
+            with self._db_lock:
+                if self._db.in_transaction:
+                    self._db.execute("ROLLBACK")
+            retry.update(dirty)
+            rows = []
+        else:
+            deleted = {}
+        with self._cond:
+            # A newer mark or a delete since the swap wins.
+            for key, snapshot in retry.items():
+                if key not in self._dirty and key not in self._deleted:
+                    self._dirty[key] = snapshot
+            for key in deleted:
+                if key not in self._dirty:
+                    self._deleted.setdefault(key, None)
+        self._written += len(rows)
+        self._batches += 1
+        self._last_batch = time.perf_counter() - t0
+        self._max_batch = max(self._max_batch, self._last_batch)
+
+    def close(self) -> None:
+        with self._cond:
+            if self._closed:
+                return
+            self._closed = True
+            self._cond.notify_all()
+            thread = self._thread
+        if thread is not None:
+            thread.join(5.0)
+        self.flush()
+        with self._db_lock:
+            self._db.close()
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._cond:
+            pending = len(self._dirty) + len(self._deleted)
+        return {
+            "backend": "sqlite",
+            "pending": pending,
+            "written": self._written,
+            "batches": self._batches,
+            "errors": self._errors,
+            "lastBatchMs": round(self._last_batch * 1000.0, 3),
+            "maxBatchMs": round(self._max_batch * 1000.0, 3),
+        }
+
+
+def open_store(path: Optional[str], interval: float = 0.5) -> RoomStore:
+    """SQLite store at `path`, or a no-op store when `path` is empty."""
+    if not path:
+        return RoomStore()
+    return SQLiteStore(path, interval)
@@ -0,0 +1,143 @@
+"""Socket transport used by the game handlers in app.py.
+
+Handlers are plain synchronous functions registered with ``@socket_event``
+(app.py). They talk to clients only through the module-level ``transport``
+there:
+
+- ``sid()``: the connection whose event is being handled;
+- ``reply(event, data)``: emit to that connection;
+- ``emit(event, data, to)``: emit to a sid or a room;
+- ``join(room)`` / ``leave(room)``: room membership of that connection.
+
+``FlaskTransport`` is the threading-mode server (Flask-SocketIO, one thread
+per request). ``AsyncTransport`` runs the same handlers on an asyncio loop
+under python-socketio's AsyncServer (asgi.py): each handler runs to
+completion on the loop thread, and its emits and room changes go into one
+outbox that a single task sends in order. Emits from other threads (bot
+pool callbacks) are handed to the loop thread-safely.
+"""
+from __future__ import annotations
+
+import asyncio
+import contextvars
+import functools
+import inspect
+import threading
+from typing import Any, Callable, Dict, Optional
+
+from flask import request
+import flask_socketio
+
+
+class FlaskTransport:
+    def __init__(self, socketio: flask_socketio.SocketIO):
+        self.socketio = socketio
+
+    def sid(self) -> str:
+        return request.sid
+
+    def reply(self, event: str, data: Any = None) -> None:
+        if data is None:
+            flask_socketio.emit(event)
+        else:
+            flask_socketio.emit(event, data)
+
+    def emit(self, event: str, data: Any, to: str) -> None:
+        self.socketio.emit(event, data, to=to)
+
+    def join(self, room: str) -> None:
+        flask_socketio.join_room(room)
+
+    def leave(self, room: str) -> None:
+        flask_socketio.leave_room(room)
+
+
+_EMIT, _JOIN, _LEAVE = 0, 1, 2
+
+
+class AsyncTransport:
+    def __init__(self, sio):
+        self.sio = sio
+        self._sid: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("pw_sid", default=None)
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._outbox: Optional[asyncio.Queue] = None
+        self._early = []
+        self.sent = 0
+        self.errors = 0
+
+    def bind(self, loop: asyncio.AbstractEventLoop) -> None:
+        """Start sending on `loop` (call from the loop, at startup)."""
+        self._loop = loop
+        self._loop_thread = threading.get_ident()
+        self._outbox = asyncio.Queue()
+        for item in self._early:
+            self._outbox.put_nowait(item)
+        self._early = []
+        loop.create_task(self._drain())
+
+    # --- handler side ---
+    def sid(self) -> Optional[str]:
+        return self._sid.get()
+
+    def reply(self, event: str, data: Any = None) -> None:
+        self._put((_EMIT, event, data, self._sid.get()))
+
+    def emit(self, event: str, data: Any, to: str) -> None:
+        self._put((_EMIT, event, data, to))
+
+    def join(self, room: str) -> None:
+        self._put((_JOIN, self._sid.get(), room, None))
+
+    def leave(self, room: str) -> None:
+        self._put((_LEAVE, self._sid.get(), room, None))
+
+    def _put(self, item) -> None:
+        if self._outbox is None:
+            self._early.append(item)
+        elif threading.get_ident() == self._loop_thread:
+            self._outbox.put_nowait(item)
+        else:
+            self._loop.call_soon_threadsafe(self._outbox.put_nowait, item)
+
+    async def _drain(self) -> None:
+        while True:
+            op, a, b, c = await self._outbox.get()
+            try:
+                if op == _EMIT:
+                    if b is None:
+                        await self.sio.emit(a, to=c)
+                    else:
+                        await self.sio.emit(a, b, to=c)
+                elif op == _JOIN:
+                    await self.sio.enter_room(a, b)
+                else:
+                    await self.sio.leave_room(a, b)
+                self.sent += 1
+            except Exception:
+                # a client gone mid-send must not stop the outbox
+                self.errors += 1
+
+    # --- registration ---
+    def handler(self, fn: Callable[..., Any]) -> Callable[..., Any]:
+        """AsyncServer handler `(sid, *args)` running sync `fn` with the
+        arguments it takes and `sid()` set to the sender."""
+        params = inspect.signature(fn).parameters
+        arity = None if any(p.kind is p.VAR_POSITIONAL for p in params.values()) else len(params)
+
+        @functools.wraps(fn)
+        async def run(sid, *args):
+            token = self._sid.set(sid)
+            try:
+                return fn(*(args if arity is None else args[:arity]))
+            finally:
+                self._sid.reset(token)
+        return run
+
+    def register(self, handlers: Dict[str, Callable[..., Any]]) -> None:
+        for event, fn in handlers.items():
+            self.sio.on(event, self.handler(fn))
+
+    def metrics(self) -> Dict[str, Any]:
+        return {"outbox": self._outbox.qsize() if self._outbox is not None else len(self._early),
+                "sent": self.sent, "errors": self.errors}
@@ -0,0 +1,145 @@
+"""Compact binary wire format for online room messages.
+
+JSON stays the default. A client that sends ``online_wire`` with
+``{"accept": ["msgpack1"]}`` after connecting gets ``online_state`` and
+``online_update`` as one binary MessagePack frame each, in a positional
+schema:
+
+- ``online_state``:  [room, seat, rev, state]
+- ``online_update``: [room, seat, base, rev, patch]  (+ hands, when sent)
+- state / patch ``set`` / ``append`` are maps keyed by the index of the field
+  in ``PUBLIC_KEYS`` (unknown fields keep their name); a patch is
+  [set, append];
+- a card is one byte (``pw_cards`` id 0..51): the table is a bin of n bytes
+  (``NO_CARD`` for an empty place), hands are a list of bin or nil;
+- lead suit is the suit index, history rows are
+  [round, cardsPer, bids, taken, points].
+
+``online_public`` (the shared spectator channel) stays JSON, since one emit
+reaches clients of both kinds. Without the msgpack package the server
+only offers JSON. ``decode`` turns a frame back into the JSON-shaped
+message (online.js has the same decoder).
+"""
+from __future__ import annotations
+
+import json
+from typing import Any, Dict, List, Optional, Sequence
+
+import pw_cards
+
+try:
+    import msgpack
+except ImportError:  # optional: JSON only
+    msgpack = None
+
+CODEC = "msgpack1"
+JSON = "json"
+
+PUBLIC_KEYS = (
+    "n", "names", "roundIndex", "cardsPer", "leader", "turn", "leadSuit", "table", "winner", "phase",
+    "bids", "tricksRound", "tricksTotal", "pointsTotal", "history", "botSeats", "botLevel", "dealId",
+    "dealSeq", "hands",
+)
+KEY_INDEX = {k: i for i, k in enumerate(PUBLIC_KEYS)}
+HISTORY_FIELDS = ("round", "cardsPer", "bids", "taken", "points")
+NO_CARD = 0xFF
+
+
+def negotiate(accept: Optional[Sequence[str]]) -> str:
+    """Codec for a client accepting `accept` (JSON unless both sides can)."""
+    if msgpack is not None and accept and CODEC in accept:
+        return CODEC
+    return JSON
+
+
+# --- encoding ---
+# Wire card dicts are the shared pw_cards.CARD_DICTS; map them back by identity.
+_CARD_OF = {id(d): c for c, d in enumerate(pw_cards.CARD_DICTS)}
+
+
+def _card(card) -> int:
+    c = _CARD_OF.get(id(card))
+    return pw_cards.from_wire(card) if c is None else c
+
+
+def _cards(cards) -> bytes:
+    return bytes(NO_CARD if c is None else _card(c) for c in cards)
+
+
+def _hands(hands) -> List[Optional[bytes]]:
+    return [None if h is None else _cards(h) for h in hands]
+
+
+def _value(key: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if key == "table":
+        return _cards(value)
+    if key == "hands":
+        return _hands(value)
+    if key == "leadSuit":
+        return pw_cards.SUIT_INDEX[value]
+    if key == "history":
+        return [[row[f] for f in HISTORY_FIELDS] for row in value]
+    return value
+
+
+def _fields(fields: Dict[str, Any]) -> Dict[Any, Any]:
+    return {KEY_INDEX.get(k, k): _value(k, v) for k, v in fields.items()}
+
+
+def pack_patch(changed: Dict[str, Any], append: Dict[str, Any]) -> bytes:
+    """The shared public part of a frame, packed once for all its messages."""
+    return msgpack.packb([_fields(changed), _fields(append)])
+
+
+def state(room: str, seat: Optional[int], rev: int, payload_state: Dict[str, Any]) -> bytes:
+    return msgpack.packb([room, seat, rev, _fields(payload_state)])
+
+
+def update(room: str, seat: int, base: int, rev: int, patch: Optional[bytes], hands=None, with_hands=False) -> bytes:
+    pack = msgpack.packb
+    # fixarray header + elements; the shared patch is spliced in as packed
+    parts = [b"\x96" if with_hands else b"\x95", pack(room), pack(seat), pack(base), pack(rev),
+             patch if patch is not None else b"\xc0"]
+    if with_hands:
+        parts.append(pack(_hands(hands)))
+    return b"".join(parts)
+
+
+# --- decoding (tests, benchmarks; online.js mirrors this) ---
+def _unvalue(key: str, value: Any) -> Any:
+    if value is None:
+        return None
+    if key == "table":
+        return [None if c == NO_CARD else pw_cards.CARD_DICTS[c] for c in value]
+    if key == "hands":
+        return [None if h is None else [pw_cards.CARD_DICTS[c] for c in h] for h in value]
+    if key == "leadSuit":
+        return pw_cards.SUITS[value]
+    if key == "history":
+        return [dict(zip(HISTORY_FIELDS, row)) for row in value]
+    return value
+
+
+def _unfields(fields: Dict[Any, Any]) -> Dict[str, Any]:
+    out = {}
+    for k, v in fields.items():
+        key = PUBLIC_KEYS[k] if isinstance(k, int) else k
+        out[key] = _unvalue(key, v)
+    return out
+
+
+def decode(event: str, frame: bytes) -> Dict[str, Any]:
+    """JSON-shaped message for a binary `event` frame."""
+    items = msgpack.unpackb(frame, strict_map_key=False)
+    if event == "online_state":
+        room, seat, rev, st = items
+        return {"room": room, "seat": seat, "rev": rev, "state": _unfields(st)}
+    room, seat, base, rev, patch = items[:5]
+    msg = {"room": room, "seat": seat, "base": base, "rev": rev}
+    if patch is not None:
+        msg["public"] = json.dumps({"set": _unfields(patch[0]), "append": _unfields(patch[1])}, ensure_ascii=False)
+    if len(items) > 5:
+        msg["hands"] = _unvalue("hands", items[5])
+    return msg
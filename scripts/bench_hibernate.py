@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+"""Memory benchmark: idle online rooms, live vs hibernated (pw_hibernate).
+
+Creates --rooms rooms through the real Socket.IO handlers (one test
+client, no network, no animation pacing). Every other room stays in the
+lobby with its host; the rest are in a game with bots in the other seats,
+waiting for the host's bid. Then:
+
+- traced memory of the live rooms (tracemalloc);
+- every room goes through the hibernation check; memory again, with the
+  blob sizes and the pack time;
+- every room is woken by a handler (online_resync) and its state, clients
+  and members must equal what they were before; thaw time per room.
+
+  python scripts/bench_hibernate.py --rooms 10000
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import json
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("PW_STORE_PATH", "")
+os.environ.setdefault("PW_ONLINE_PACE", "0")
+os.environ.setdefault("PW_FRAME_MS", "0")
+os.environ.setdefault("PW_HIBERNATE_SECONDS", "3600")  # only this script hibernates
+
+import app as pw  # noqa: E402
+
+
+def traced() -> int:
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0]
+
+
+def fingerprint(room) -> str:
+    st = dict(room["state"])
+    st["botSeats"] = sorted(st["botSeats"])
+    return json.dumps([st, room.get("clients"), room.get("members"), room.get("sidToClient")], sort_keys=True)
+
+
+def create_rooms(client, n: int):
+    codes = []
+    for i in range(n):
+        in_game = i % 2 == 1
+        client.emit("online_create_room", {"clientId": f"bench{i}", "name": f"Vært {i}", "players": 4,
+                                           "bots": 3 if in_game else 1})
+        code = next(ev["args"][0]["room"] for ev in client.get_received() if ev["name"] == "online_state")
+        if in_game:
+            client.emit("online_start_game", {"room": code})
+            client.get_received()
+        codes.append(code)
+    return codes
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rooms", type=int, default=10000)
+    args = ap.parse_args(argv)
+
+    client = pw.socketio.test_client(pw.app)
+    tracemalloc.start()
+    base = traced()
+    t0 = time.perf_counter()
+    codes = create_rooms(client, args.rooms)
+    deadline = time.time() + 30
+    while pw.scheduler.metrics()["queueDepth"] > len(codes) and time.time() < deadline:
+        time.sleep(0.05)  # deals finishing (the rest are the hibernation timers)
+    client.get_received()
+    print(f"{len(codes)} rooms created in {time.perf_counter() - t0:.1f}s; "
+          f"phases {pw.ONLINE_ROOMS.metrics()['byPhase']}")
+    live = traced()
+
+    before = {}
+    t0 = time.perf_counter()
+    for code in codes:
+        room = pw.ONLINE_ROOMS[code]
+        before[code] = fingerprint(room)
+        room["touchedAt"] = 0.0
+        pw.scheduler.cancel(("hibernate", code))  # run the check now instead
+    t1 = time.perf_counter()
+    for code in codes:
+        pw._online_hibernate_due(code)
+    pack_s = time.perf_counter() - t1
+    del room
+    asleep = traced()
+    hib = pw.ONLINE_HIBERNATED.metrics()
+    skipped = len(codes) - hib["rooms"]
+
+    t1 = time.perf_counter()
+    for code in codes:
+        client.emit("online_resync", {"room": code})
+        client.get_received()
+    thaw_s = time.perf_counter() - t1
+    awake = traced()
+    tracemalloc.stop()
+
+    errors = 0
+    for code in codes:
+        room = pw.ONLINE_ROOMS.get(code)
+        if room is None or fingerprint(room) != before[code]:
+            print(f"[{code}] differs after thaw")
+            errors += 1
+    for e in pw.ONLINE_SEATS.check(pw.ONLINE_ROOMS, pw.ONLINE_HIBERNATED):
+        print(f"seat index: {e}")
+        errors += 1
+
+    n = max(1, len(codes))
+    print(f"live:       {(live - base) / n:>8.0f} bytes/room")
+    print(f"hibernated: {(asleep - base) / n:>8.0f} bytes/room (blobs {hib['bytes'] / max(1, hib['rooms']):.0f} bytes; "
+          f"{skipped} rooms busy, not packed)")
+    print(f"room objects: {(live - asleep) / n + hib['bytes'] / n:>6.0f} -> {hib['bytes'] / n:.0f} bytes/room "
+          f"({(live - base) / max(1, asleep - base):.1f}x less in total)")
+    print(f"pack {pack_s / n * 1e6:.0f} us/room, wake by handler {thaw_s / n * 1e6:.0f} us/room "
+          f"(after waking: {(awake - base) / n:.0f} bytes/room)")
+    return 1 if errors or skipped else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""Throughput of the sharded deployment at 1, 2, 4, ... shards.
+
+For every shard count this starts scripts/run_shards.py (broker, N gunicorn
+workers, router). Game pacing is off (PW_ONLINE_PACE=0) and persistence is
+disabled. It then plays --rooms-per-shard full games per shard at once
+through the router over real Socket.IO WebSocket connections. Each room has
+one human seat, played by the benchmark, and bots in the others. Rooms are
+spread evenly over the shards by their routing key.
+
+The rate is cards played per second over all rooms. Each room's work stays
+in its own worker, so with enough cores the rate should grow linearly with
+the shard count (efficiency close to 1.0). Beyond the number of cores there
+is nothing left to scale onto. The client processes and the router need
+CPU too, so leave them some headroom.
+
+  python scripts/bench_shards.py --shards 1,2,4 --rooms-per-shard 40
+
+The last column is the queue traffic per shard (frames published). With
+affinity routing it should be 0: no per-move emit crosses processes.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from concurrent.futures import ProcessPoolExecutor
+
+import simple_websocket
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+TOKEN = "bench"
+
+
+class Room:
+    """One human seat over an Engine.IO/Socket.IO WebSocket, playing the
+    lowest legal card and bidding 1."""
+
+    def __init__(self, port: int, key: str, players: int, bot_level: str):
+        self.ws = simple_websocket.Client.connect(
+            f"ws://127.0.0.1:{port}/socket.io/?EIO=4&transport=websocket&shard={key}")
+        self.ws.receive(10)  # engine.io open
+        self.ws.send("40")
+        self.key = key
+        self.players = players
+        self.bot_level = bot_level
+        self.state = None
+        self.seat = None
+        self.code = None
+        self.started = False
+        self.last = None
+
+    def emit(self, event, data) -> None:
+        self.ws.send("42" + json.dumps([event, data]))
+
+    def play(self, timeout: float) -> int:
+        deadline = time.time() + timeout
+        self.emit("online_create_room", {"clientId": f"bench-{self.key}-{random.random()}", "name": "Bench",
+                                         "players": self.players, "bots": self.players - 1, "botLevel": self.bot_level})
+        while time.time() < deadline:
+            msg = self.ws.receive(max(0.1, deadline - time.time()))
+            if msg is None:
+                break
+            if msg == "2":
+                self.ws.send("3")
+                continue
+            if not msg.startswith("42"):
+                continue
+            event, payload = json.loads(msg[2:])[:2]
+            if event == "online_state":
+                self.code, self.seat, self.state = payload["room"], payload["seat"], payload["state"]
+            elif event == "online_update" and self.state is not None:
+                if "public" in payload:
+                    patch = json.loads(payload["public"])
+                    self.state.update(patch["set"])
+                    for k, v in patch["append"].items():
+                        self.state[k] = (self.state.get(k) or []) + v
+                if "hands" in payload:
+                    self.state["hands"] = payload["hands"]
+            elif event == "error":
+                raise RuntimeError(payload.get("message"))
+            else:
+                continue
+            if self.state["phase"] == "game_finished":
+                self.ws.close()
+                return self.state["n"] * sum(row["cardsPer"] for row in self.state["history"])
+            self.act()
+        self.ws.close()
+        raise TimeoutError(f"room {self.code} did not finish")
+
+    def act(self) -> None:
+        st = self.state
+        phase = st["phase"]
+        if phase == "lobby" and not self.started:
+            self.started = True
+            self.emit("online_start_game", {"room": self.code})
+        elif phase == "bidding" and st["bids"][self.seat] is None:
+            step = ("bid", st["roundIndex"])
+            if step != self.last:
+                self.last = step
+                self.emit("online_set_bid", {"room": self.code, "bid": min(1, int(st["cardsPer"] or 0))})
+        elif phase == "playing" and st["turn"] == self.seat and st["table"][self.seat] is None:
+            hand = st["hands"][self.seat] or []
+            step = ("play", st["roundIndex"], len(hand))
+            if hand and step != self.last:
+                self.last = step
+                lead = st.get("leadSuit")
+                card = next((c for c in hand if c["suit"] == lead), hand[0])
+                self.emit("online_play_card", {"room": self.code, "card": card["rank"] + card["suit"]})
+
+
+def run_client(task):
+    """Client process: play rooms with the given keys, one thread each."""
+    port, keys, players, bot_level, timeout = task
+    results = []
+    errors = []
+
+    def one(key):
+        try:
+            results.append(Room(port, key, players, bot_level).play(timeout))
+        except Exception as exc:  # reported, counted as a failed room
+            errors.append(f"{key}: {exc!r}")
+
+    threads = [threading.Thread(target=one, args=(k,)) for k in keys]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    return sum(results), errors
+
+
+def _get(port: int, path: str):
+    with urllib.request.urlopen(f"http://127.0.0.1:{port}{path}", timeout=5) as r:
+        return json.loads(r.read())
+
+
+def start_shards(shards: int, port: int, base_port: int, broker_port: int):
+    env = dict(os.environ, PW_ONLINE_PACE="0", PW_STORE_PATH="", PW_BOT_WORKERS="0", ADMIN_TOKEN=TOKEN)
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "scripts", "run_shards.py"), "--shards", str(shards),
+                             "--host", "127.0.0.1", "--port", str(port), "--base-port", str(base_port),
+                             "--broker-port", str(broker_port)],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    ready = set()
+    while len(ready) < shards:
+        if time.time() > deadline or proc.poll() is not None:
+            proc.kill()
+            raise RuntimeError(f"{shards} shards did not start")
+        for i in range(shards):
+            try:
+                if _get(port, f"/admin/scheduler?token={TOKEN}&shard={i}")["shard"]["index"] == i:
+                    ready.add(i)
+            except (OSError, ValueError):
+                pass
+        time.sleep(0.2)
+    return proc
+
+
+def stop_shards(proc) -> None:
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--shards", default="1,2,4", help="comma-separated shard counts")
+    ap.add_argument("--rooms-per-shard", type=int, default=40)
+    ap.add_argument("--players", type=int, default=4)
+    ap.add_argument("--bot-level", default="easy")
+    ap.add_argument("--clients", type=int, default=0, help="client processes (0 = one per shard)")
+    ap.add_argument("--timeout", type=float, default=600.0)
+    args = ap.parse_args(argv)
+
+    counts = [int(x) for x in args.shards.split(",") if x.strip()]
+    print(f"cores={os.cpu_count()} rooms/shard={args.rooms_per_shard} players={args.players} bots={args.bot_level}")
+    print(f"{'shards':>6} {'rooms':>6} {'cards':>8} {'secs':>7} {'cards/s':>9} {'speedup':>8} {'eff':>5}  published")
+    base_rate = None
+    failed = 0
+    for shards in counts:
+        port, broker_port = _free_port(), _free_port()
+        proc = start_shards(shards, port, 15000 + 100 * shards, broker_port)
+        try:
+            rooms = shards * args.rooms_per_shard
+            keys = [f"{i:04d}" for i in range(rooms)]  # key i -> shard i % shards
+            clients = args.clients or shards
+            tasks = [(port, keys[c::clients], args.players, args.bot_level, args.timeout) for c in range(clients)]
+            t0 = time.perf_counter()
+            with ProcessPoolExecutor(max_workers=clients) as pool:
+                parts = list(pool.map(run_client, tasks))
+            elapsed = time.perf_counter() - t0
+            published = [_get(port, f"/admin/scheduler?token={TOKEN}&shard={i}")["shard"]["queue"]["published"]
+                         for i in range(shards)]
+        finally:
+            stop_shards(proc)
+        cards = sum(p[0] for p in parts)
+        errors = [e for p in parts for e in p[1]]
+        failed += len(errors)
+        for e in errors[:5]:
+            print(f"  failed room {e}", file=sys.stderr)
+        rate = cards / elapsed
+        base_rate = base_rate or rate / counts[0]
+        speedup = rate / base_rate
+        print(f"{shards:>6} {rooms:>6} {cards:>8} {elapsed:>7.1f} {rate:>9.0f} {speedup:>8.2f} {speedup / shards:>5.2f}  {published}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
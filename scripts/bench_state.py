@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+"""Room model benchmark: memory per room and handler latency.
+
+Through the real Socket.IO handlers (test clients, no network, no
+animation pacing):
+
+- memory: --rooms rooms mid-game (host waiting to bid, bots in the other
+  seats), traced with tracemalloc, per room;
+- latency: --games full games with every seat human, driven one move at a
+  time; handler run time (pw_metrics) for bids, card plays (the play,
+  bookkeeping and the frame to every member) and "next".
+
+  python scripts/bench_state.py --rooms 2000 --games 20
+"""
+from __future__ import annotations
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("PW_STORE_PATH", "")
+os.environ.setdefault("PW_ONLINE_PACE", "0")
+os.environ.setdefault("PW_FRAME_MS", "0")
+os.environ.setdefault("PW_HIBERNATE_SECONDS", "0")
+
+import app as pw  # noqa: E402
+import pw_cards  # noqa: E402
+
+EVENTS = ("online_set_bid", "online_play_card", "online_next")
+
+
+def first_state(client):
+    return next(ev["args"][0]["room"] for ev in client.get_received() if ev["name"] == "online_state")
+
+
+def memory_per_room(n: int) -> float:
+    client = pw.socketio.test_client(pw.app)
+    gc.collect()
+    tracemalloc.start()
+    base = tracemalloc.get_traced_memory()[0]
+    for i in range(n):
+        client.emit("online_create_room", {"clientId": f"m{i}", "name": f"Vært {i}", "players": 4, "bots": 3})
+        code = first_state(client)
+        client.emit("online_start_game", {"room": code})
+        client.get_received()
+    deadline = time.time() + 30
+    while pw.scheduler.metrics()["queueDepth"] and time.time() < deadline:
+        time.sleep(0.05)
+    client.get_received()
+    gc.collect()
+    used = tracemalloc.get_traced_memory()[0] - base
+    tracemalloc.stop()
+    return used / max(1, n)
+
+
+def play_game(n: int, seed: int) -> str:
+    rng = random.Random(seed)
+    clients = [pw.socketio.test_client(pw.app) for _ in range(n)]
+    clients[0].emit("online_create_room", {"clientId": f"g{seed}-0", "name": "P1", "players": n, "bots": 0})
+    code = first_state(clients[0])
+    for i, client in enumerate(clients[1:], 1):
+        client.emit("online_join_room", {"room": code, "clientId": f"g{seed}-{i}", "name": f"P{i + 1}"})
+    clients[0].emit("online_start_game", {"room": code})
+    room = pw.ONLINE_ROOMS[code]
+    while True:
+        st = room["state"]
+        phase, turn = st["phase"], st["turn"]
+        if phase == "game_finished":
+            break
+        if phase == "bidding":
+            for i, bid in enumerate(list(st["bids"])):
+                if bid is None:
+                    clients[i].emit("online_set_bid", {"room": code, "bid": rng.randint(0, int(st["cardsPer"] or 0))})
+        elif phase == "playing":
+            hand = list(st["hands"][turn] or [])
+            lead = st["leadSuit"]
+            legal = [c for c in hand if pw_cards.SUIT_OF[c] == lead] or hand
+            clients[turn].emit("online_play_card", {"room": code, "card": pw_cards.CARD_KEYS[rng.choice(legal)]})
+        elif phase in ("between_tricks", "round_finished"):
+            clients[0].emit("online_next", {"room": code})
+        else:
+            time.sleep(0.001)
+        for client in clients:
+            client.get_received()
+    for client in clients:
+        client.disconnect()
+    return code
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rooms", type=int, default=2000)
+    ap.add_argument("--games", type=int, default=20)
+    ap.add_argument("--players", type=int, default=4)
+    args = ap.parse_args(argv)
+
+    per_room = memory_per_room(args.rooms)
+    print(f"memory: {per_room:.0f} bytes/room ({args.rooms} rooms mid-game)")
+
+    before = pw.metrics.snapshot()["handlers"]
+    t0 = time.perf_counter()
+    for seed in range(args.games):
+        play_game(args.players, seed)
+    elapsed = time.perf_counter() - t0
+    after = pw.metrics.snapshot()["handlers"]
+    print(f"{args.games} games of {args.players} in {elapsed:.1f}s")
+    for event in EVENTS:
+        a, b = after.get(event, {}), before.get(event, {})
+        count = a.get("count", 0) - b.get("count", 0)
+        print(f"  {event:18} n={count:<6} mean={a.get('meanMs', 0):.3f}ms p50={a.get('p50Ms', 0):.3f}ms "
+              f"p99={a.get('p99Ms', 0):.3f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
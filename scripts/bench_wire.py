@@ -0,0 +1,242 @@
+#!/usr/bin/env python3
+"""Payload benchmark: JSON vs the compact binary wire format (pw_wire).
+
+Plays one full 8-player game through the real Socket.IO handlers (test
+clients, no network, no animation pacing). Every seat is human: odd seats
+negotiate the compact format, even seats stay on JSON. Then:
+
+- per-seat bytes as received, encoded as Socket.IO packets (binary frames
+  count their placeholder header too);
+- the same message stream re-encoded both ways, with encode/decode time;
+- every seat's reconstructed state must match the server's.
+
+  python scripts/bench_wire.py --seed 3
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+os.environ.setdefault("PW_STORE_PATH", "")
+os.environ.setdefault("PW_ONLINE_PACE", "0")
+os.environ.setdefault("PW_FRAME_MS", "0")
+
+import msgpack  # noqa: E402
+from socketio import packet  # noqa: E402
+
+import app as pw  # noqa: E402
+import pw_cards  # noqa: E402
+import pw_wire  # noqa: E402
+
+EVENTS = ("online_state", "online_update")
+
+
+def wire_size(event: str, payload) -> int:
+    encoded = packet.Packet(packet.EVENT, data=[event, payload]).encode()
+    if isinstance(encoded, list):
+        return sum(len(p.encode("utf-8")) if isinstance(p, str) else len(p) for p in encoded)
+    return len(encoded.encode("utf-8"))
+
+
+class Seat:
+    def __init__(self, client, compact: bool):
+        self.client = client
+        self.compact = compact
+        self.state = None
+        self.rev = None
+        self.bytes = 0
+        self.messages = []  # (event, JSON-shaped message)
+
+    def drain(self) -> None:
+        for ev in self.client.get_received():
+            if ev["name"] not in EVENTS:
+                continue
+            raw = ev["args"][0]
+            self.bytes += wire_size(ev["name"], raw)
+            msg = pw_wire.decode(ev["name"], raw) if isinstance(raw, (bytes, bytearray)) else raw
+            self.messages.append((ev["name"], msg))
+            self.apply(ev["name"], msg)
+
+    def apply(self, event: str, msg) -> None:
+        if event == "online_state":
+            self.state, self.rev = msg["state"], msg["rev"]
+            return
+        if msg["base"] != self.rev:
+            raise AssertionError(f"revision gap: base {msg['base']} != {self.rev}")
+        st = dict(self.state)
+        if msg.get("public"):
+            patch = json.loads(msg["public"])
+            st.update(patch["set"])
+            for key, rows in patch["append"].items():
+                st[key] = list(st.get(key) or []) + rows
+        if "hands" in msg:
+            st["hands"] = msg["hands"]
+        self.state, self.rev = st, msg["rev"]
+
+
+def play(n: int, seed: int, timeout: float):
+    random.seed(seed)
+    host = pw.socketio.test_client(pw.app)
+    host.emit("online_create_room", {"clientId": "b0", "name": "P1", "players": n, "bots": 0})
+    code = next(ev["args"][0]["room"] for ev in host.get_received() if ev["name"] == "online_state")
+    clients = [host] + [pw.socketio.test_client(pw.app) for _ in range(n - 1)]
+    seats = []
+    for i, client in enumerate(clients):
+        compact = i % 2 == 1
+        if compact:
+            client.emit("online_wire", {"accept": [pw_wire.CODEC]})
+        if i:
+            client.emit("online_join_room", {"room": code, "clientId": f"b{i}", "name": f"P{i + 1}"})
+        else:
+            client.emit("online_resync", {"room": code})
+        seats.append(Seat(client, compact))
+    for seat in seats:
+        seat.drain()
+    rng = random.Random(seed)
+    host.emit("online_start_game", {"room": code})
+    deadline = time.time() + timeout
+    room = pw.ONLINE_ROOMS[code]
+    while time.time() < deadline:
+        with pw._online_locked(code):
+            st = room["state"]
+            phase, turn = st["phase"], st["turn"]
+            bids = list(st["bids"])
+            hand = list(st["hands"][turn] or []) if phase == "playing" and turn is not None else []
+            lead = st.get("leadSuit")
+            cards_per = int(st.get("cardsPer") or 0)
+        if phase == "game_finished":
+            break
+        if phase == "bidding":
+            for i, bid in enumerate(bids):
+                if bid is None:
+                    clients[i].emit("online_set_bid", {"room": code, "bid": rng.randint(0, cards_per)})
+        elif phase == "playing" and hand:
+            legal = [c for c in hand if pw_cards.SUIT_OF[c] == lead] or hand
+            clients[turn].emit("online_play_card", {"room": code, "card": pw_cards.CARD_KEYS[min(legal)]})
+        elif phase in ("between_tricks", "round_finished"):
+            host.emit("online_next", {"room": code})
+        else:
+            time.sleep(0.001)
+        for seat in seats:
+            seat.drain()
+    time.sleep(0.05)
+    for seat in seats:
+        seat.drain()
+    return code, room, seats
+
+
+def shared_cards(value):
+    """`value` with card dicts replaced by the shared pw_cards ones, as the
+    server holds them."""
+    if isinstance(value, dict):
+        if value.keys() == {"suit", "rank"}:
+            return pw_cards.CARD_DICTS[pw_cards.from_wire(value)]
+        return {k: shared_cards(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [shared_cards(v) for v in value]
+    return value
+
+
+def reencode(seats):
+    """The JSON seats' message stream as (event, msg, encode_json,
+    encode_compact). Each encoder takes a per-run cache: the public patch
+    of a frame is serialized once and shared, as the server does."""
+    rows = []
+    for seat in seats:
+        if seat.compact:
+            continue
+        for event, msg in seat.messages:
+            if event == "online_state":
+                st = shared_cards(msg["state"])
+
+                def enc_json(cache, m=msg):
+                    return json.dumps(m, separators=(",", ":"))
+
+                def enc_compact(cache, m=msg, st=st):
+                    return pw_wire.state(m["room"], m["seat"], m["rev"], st)
+            else:
+                patch = shared_cards(json.loads(msg["public"])) if msg.get("public") else None
+                hands = shared_cards(msg.get("hands"))
+
+                def enc_json(cache, m=msg, patch=patch):
+                    if patch is not None and m["public"] not in cache:
+                        cache[m["public"]] = json.dumps(patch, ensure_ascii=False)
+                    return json.dumps(m, separators=(",", ":"))
+
+                def enc_compact(cache, m=msg, patch=patch, hands=hands):
+                    packed = None
+                    if patch is not None:
+                        if m["public"] not in cache:
+                            cache[m["public"]] = pw_wire.pack_patch(patch["set"], patch["append"])
+                        packed = cache[m["public"]]
+                    return pw_wire.update(m["room"], m["seat"], m["base"], m["rev"], packed, hands, "hands" in m)
+            rows.append((event, msg, enc_json, enc_compact))
+    return rows
+
+
+def timed(fn, repeat: int) -> float:
+    t0 = time.perf_counter()
+    for _ in range(repeat):
+        fn()
+    return (time.perf_counter() - t0) / repeat
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--players", type=int, default=8)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--timeout", type=float, default=120.0)
+    ap.add_argument("--repeat", type=int, default=5, help="timing repetitions")
+    args = ap.parse_args(argv)
+
+    code, room, seats = play(args.players, args.seed, args.timeout)
+    st = room["state"]
+    print(f"room {code}: phase {st['phase']}, {len(st['history'])} rounds, {args.players} seats")
+
+    errors = 0
+    with pw._online_locked(code):
+        public = room.to_public()
+        for i, seat in enumerate(seats):
+            mine = {k: v for k, v in (seat.state or {}).items() if k != "hands"}
+            if json.loads(json.dumps(mine)) != json.loads(json.dumps(public)):
+                print(f"seat {i}: reconstructed state differs from the server")
+                errors += 1
+
+    for kind, compact in (("json", False), ("compact", True)):
+        group = [s for s in seats if s.compact == compact]
+        total = sum(s.bytes for s in group)
+        msgs = sum(len(s.messages) for s in group)
+        print(f"{kind:8} seats: {total / len(group):>10.0f} bytes/seat  {msgs / len(group):>6.0f} messages/seat")
+
+    rows = reencode(seats)
+    json_bytes = sum(wire_size(e, m) for e, m, _, _ in rows)
+    cache = {}
+    frames = [(e, c(cache)) for e, _, _, c in rows]
+    compact_bytes = sum(wire_size(e, f) for e, f in frames)
+
+    def encode_all(which):
+        cache = {}
+        return [row[which](cache) for row in rows]
+    enc_json = timed(lambda: encode_all(2), args.repeat)
+    enc_compact = timed(lambda: encode_all(3), args.repeat)
+    texts = [json.dumps(m, separators=(",", ":")) for _, m, _, _ in rows]
+    dec_json = timed(lambda: [json.loads(t) for t in texts], args.repeat)
+    dec_compact = timed(lambda: [msgpack.unpackb(f, strict_map_key=False) for _, f in frames], args.repeat)
+    n = max(1, len(rows))
+    print(f"same {len(rows)} messages: json {json_bytes} bytes, compact {compact_bytes} bytes "
+          f"({compact_bytes / max(1, json_bytes):.0%})")
+    print(f"encode: json {enc_json / n * 1e6:.1f} us/msg, compact {enc_compact / n * 1e6:.1f} us/msg; "
+          f"decode: json {dec_json / n * 1e6:.1f} us/msg, compact {dec_compact / n * 1e6:.1f} us/msg")
+    if st["phase"] != "game_finished":
+        print("game did not finish")
+        errors += 1
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""Build dist/: hashed, precompressed static assets and their manifest.
+
+JS and CSS files get a content hash in their name (online.js ->
+online.<hash>.js), pages are rewritten to reference those names, and every
+text file gets .gz and .br variants (brotli needs the Brotli package; without
+it only gzip is written). dist/manifest.json maps each public path to its
+file, ETag and variants; pw_assets serves from it.
+
+  python scripts/build_assets.py
+
+Run it after changing any page, script or stylesheet (the server falls back
+to the source files, uncompressed and unhashed, when dist/ is missing).
+"""
+from __future__ import annotations
+
+import argparse
+import gzip
+import json
+import os
+import re
+import shutil
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pw_assets  # noqa: E402
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+_REF = re.compile(r'\b(src|href)="(/?)([^"?#:]+)"')
+
+
+def hashed_name(path: str, data: bytes) -> str:
+    stem, ext = os.path.splitext(path)
+    return f"{stem}.{pw_assets.digest(data)[:10]}{ext}"
+
+
+def rewrite_refs(page: str, html: bytes, names) -> bytes:
+    """Point src/href attributes of `page` at the hashed names."""
+    folder = os.path.dirname(page)
+
+    def sub(m):
+        target = m.group(3) if m.group(2) else os.path.normpath(os.path.join(folder, m.group(3))).replace(os.sep, "/")
+        if target in names:
+            return f'{m.group(1)}="/{names[target]}"'
+        return m.group(0)
+
+    return _REF.sub(sub, html.decode("utf-8")).encode("utf-8")
+
+
+def build(root: str, out: str) -> dict:
+    files = pw_assets.public_files(root)
+    data = {}
+    for path in files:
+        with open(os.path.join(root, path), "rb") as f:
+            data[path] = f.read()
+    names = {p: hashed_name(p, data[p]) for p in files if p.endswith(pw_assets.HASHED_TYPES)}
+    for path in files:
+        if path.endswith(".html"):
+            data[path] = rewrite_refs(path, data[path], names)
+
+    if os.path.isdir(out):
+        shutil.rmtree(out)
+    manifest = {}
+    for path in files:
+        body = data[path]
+        name = names.get(path, path)
+        variants = {"identity": body}
+        if path.endswith(pw_assets.COMPRESS_TYPES):
+            variants["gzip"] = gzip.compress(body, 9, mtime=0)
+            if brotli is not None:
+                variants["br"] = brotli.compress(body, quality=11)
+        encodings = {}
+        for encoding, blob in variants.items():
+            if encoding != "identity" and len(blob) >= len(body):
+                continue
+            target = name + pw_assets.SUFFIX.get(encoding, "")
+            os.makedirs(os.path.dirname(os.path.join(out, target)), exist_ok=True)
+            with open(os.path.join(out, target), "wb") as f:
+                f.write(blob)
+            if encoding != "identity":
+                encodings[encoding] = target
+        manifest[path] = {"file": name, "etag": pw_assets.digest(body)[:20], "size": len(body),
+                          "encodings": encodings,
+                          "sizes": {enc: len(variants[enc]) for enc in encodings}}
+    with open(os.path.join(out, "manifest.json"), "w", encoding="utf-8") as f:
+        json.dump({"files": manifest}, f, indent=1, sort_keys=True)
+    return manifest
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--root", default=pw_assets.ROOT)
+    ap.add_argument("--out", default=pw_assets.DIST)
+    args = ap.parse_args(argv)
+
+    manifest = build(args.root, args.out)
+    total = {"identity": 0, "gzip": 0, "br": 0}
+    for path, entry in manifest.items():
+        total["identity"] += entry["size"]
+        for enc in ("gzip", "br"):
+            total[enc] += entry["sizes"].get(enc, entry["size"])
+    print(f"{len(manifest)} files -> {args.out}")
+    for path in sorted(manifest, key=lambda p: -manifest[p]["size"])[:8]:
+        entry = manifest[path]
+        sizes = " ".join(f"{enc}={entry['sizes'][enc]}" for enc in ("gzip", "br") if enc in entry["sizes"])
+        print(f"  {path:28} {entry['file']:34} {entry['size']:>7} {sizes}")
+    print(f"total: {total['identity']} bytes, gzip {total['gzip']}, br {total['br']}"
+          + ("" if brotli is not None else " (no brotli: pip install Brotli)"))
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""Build the bot bid table (data/bid_table.bin) by batch simulation.
+
+Deals random rounds for every player count and hand size, plays each one
+out with the fast bid-aware rollout policy from pw_bots (every seat aiming
+at its heuristic bid), and records how many tricks each hand took. The
+result is a histogram per (signature, players, cards, seat relative to the
+leader). Each cell stores the mean tricks and the bid with the best
+expected score; cells with fewer than --min-samples hands are left empty,
+and bots fall back to the heuristic there.
+
+  python scripts/build_bid_table.py --rounds 4000000
+  python scripts/build_bid_table.py --rounds 200000 --out /tmp/bid_table.bin --workers 1
+
+Round r always uses seed (seed, r), so a table is reproducible.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import time
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pw_bidding  # noqa: E402
+import pw_bots  # noqa: E402
+import pw_cards  # noqa: E402
+import pw_engine  # noqa: E402
+
+MAX_TRICKS = pw_bidding.MAX_CARDS + 1  # histogram buckets 0..MAX_CARDS
+SHAPES = [(n, cards) for n in range(pw_bidding.MIN_PLAYERS, pw_bidding.MAX_PLAYERS + 1)
+          for cards in range(1, min(pw_bidding.MAX_CARDS, 52 // n) + 1)]
+
+
+def play_round(n: int, cards: int, leader: int, rng: random.Random):
+    """Deal and play one round; returns (hands as dealt, tricks per seat)."""
+    take = rng.sample(pw_engine.DECK, cards * n)
+    hands = [sorted(take[i::n]) for i in range(n)]
+    dealt = [list(h) for h in hands]
+    st = {"hands": hands, "cardsPer": cards, "roundIndex": 0}
+    bids = [pw_engine.baseline_bid(st, s) for s in range(n)]
+    tricks = [0] * n
+    for _ in range(cards):
+        table = [None] * n
+        lead = None
+        for k in range(n):
+            s = (leader + k) % n
+            c = pw_bots.rollout_card(hands[s], table, lead, tricks[s] < bids[s])
+            hands[s].remove(c)
+            table[s] = c
+            if lead is None:
+                lead = pw_cards.SUIT_OF[c]
+        leader = pw_cards.trick_winner(table, lead, leader)
+        tricks[leader] += 1
+    return dealt, tricks
+
+
+def run_chunk(task) -> array:
+    """Worker: histogram counts for rounds [start, start+count)."""
+    seed, start, count = task
+    hist = array("I", bytes(4 * pw_bidding.CELLS * MAX_TRICKS))
+    for r in range(start, start + count):
+        rng = random.Random(seed * 1_000_003 + r)
+        n, cards = SHAPES[r % len(SHAPES)]
+        leader = rng.randrange(n)
+        dealt, tricks = play_round(n, cards, leader, rng)
+        for s in range(n):
+            i = pw_bidding.cell(n, cards, (s - leader) % n, pw_bidding.signature(dealt[s]))
+            hist[i * MAX_TRICKS + tricks[s]] += 1
+    return hist
+
+
+def build(hist: array, min_samples: int):
+    expected = bytearray(pw_bidding.CELLS)
+    best = bytearray([pw_bidding.EMPTY]) * pw_bidding.CELLS
+    filled = 0
+    for i in range(pw_bidding.CELLS):
+        row = hist[i * MAX_TRICKS:(i + 1) * MAX_TRICKS]
+        total = sum(row)
+        if total < min_samples:
+            continue
+        filled += 1
+        expected[i] = min(254, round(pw_bidding.SCALE * sum(k * c for k, c in enumerate(row)) / total))
+        scores = [sum(c * pw_engine.points_for_round(b, k) for k, c in enumerate(row)) for b in range(MAX_TRICKS)]
+        best[i] = max(range(MAX_TRICKS), key=lambda b: (scores[b], -b))
+    return expected, best, filled
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=2_000_000)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--min-samples", type=int, default=20)
+    ap.add_argument("--workers", type=int, default=0, help="processes (0 = all cores, 1 = in-process)")
+    ap.add_argument("--out", default=pw_bidding.DEFAULT_PATH)
+    args = ap.parse_args(argv)
+
+    workers = args.workers or os.cpu_count() or 1
+    per = -(-args.rounds // workers)
+    tasks = [(args.seed, start, min(per, args.rounds - start)) for start in range(0, args.rounds, per)]
+    t0 = time.perf_counter()
+    if workers == 1:
+        parts = [run_chunk(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            parts = list(pool.map(run_chunk, tasks))
+    hist = parts[0]
+    for part in parts[1:]:
+        for i, v in enumerate(part):
+            if v:
+                hist[i] += v
+    expected, best, filled = build(hist, args.min_samples)
+    pw_bidding.write_table(args.out, expected, best)
+    elapsed = time.perf_counter() - t0
+    print(f"{args.rounds} rounds in {elapsed:.1f}s; {filled}/{pw_bidding.CELLS} cells filled -> {args.out}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
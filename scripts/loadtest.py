@@ -0,0 +1,662 @@
+#!/usr/bin/env python3
+"""Load test: full online games over real Socket.IO connections.
+
+Starts the server locally (gunicorn gthread as in the Procfile, or the
+asyncio server with --server asgi), or targets a running one with --url.
+Client processes then play --rooms games through the real online_* events
+over Engine.IO WebSockets, one thread per human player:
+
+- the host creates the room with --humans human seats and bots in the
+  rest, the other humans join by code, the host starts when all are in,
+  and every human bids and plays cards (in rooms without bots the host
+  also presses "next" after each trick and round). Players have no
+  animations, so they ack every paced step (online_anim_done) at once;
+- in a --reconnect share of the rooms one human drops during the second
+  round and comes back with the same clientId after --reconnect-delay;
+- in a --takeover share one human drops and stays away, so the server hands
+  the seat to a bot after PW_TAKEOVER_SECONDS (--takeover-seconds, 30 in
+  production); the other humans time how long that takes.
+
+Recorded per event: ack latency (the handler ran: Socket.IO ack) and effect
+latency (the change reached this client's state), p50/p95/p99; rooms
+finished per second; server CPU and RSS every second (from /proc, local
+server only) with the room and connection gauges from /admin/metrics.json,
+and that feed's final snapshot.
+
+  python scripts/loadtest.py --rooms 200 --humans 4 --report loadtest.json
+  python scripts/loadtest.py --rooms 200 --humans 4 --compare loadtest.json
+
+--compare prints this run against an earlier report and exits 1 when a p95
+or the room rate got worse by more than --tolerance. Each human holds one
+server thread in gthread mode, so the local server gets --rooms x --humans
+threads plus headroom; clients need CPU too (--procs).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import signal
+import socket
+import subprocess
+import sys
+import threading
+import time
+import urllib.request
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+
+import simple_websocket
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import pw_wire  # noqa: E402
+
+TOKEN = "loadtest"
+ROUND_TO_DROP = 1  # drops happen in the second round
+NEXT_RETRY_SECONDS = 0.5
+_BINARY = re.compile(r"^45(\d+)-")
+
+
+class RoomPlan:
+    """What the humans of one room share (they run in the same process)."""
+
+    def __init__(self, index: int, kind: str, humans: int):
+        self.index = index
+        self.kind = kind  # "plain", "reconnect" or "takeover"
+        self.humans = humans
+        self.code = None
+        self.code_ready = threading.Event()
+        self.dropped_at = None  # (seat, time) of the takeover drop
+        self.takeover_seen = False
+        self.finished = False
+        self.failure = None
+        self.lock = threading.Lock()
+
+
+class Recorder:
+    """Latency samples and errors of one client process."""
+
+    def __init__(self):
+        self.samples = {}  # (event, "ack" | "effect") -> [ms]
+        self.errors = Counter()
+        self.gaps = 0
+        self.cards = 0
+        self._lock = threading.Lock()
+
+    def add(self, event: str, kind: str, ms: float) -> None:
+        self.samples.setdefault((event, kind), []).append(ms)
+
+    def error(self, message: str) -> None:
+        with self._lock:
+            self.errors[message] += 1
+
+    def bump(self, field: str, n: int = 1) -> None:
+        with self._lock:
+            setattr(self, field, getattr(self, field) + n)
+
+
+def _hand(st, seat: int):
+    hands = st.get("hands") or []
+    return (hands[seat] if seat < len(hands) else None) or []
+
+
+class Player:
+    """One human seat over an Engine.IO/Socket.IO WebSocket."""
+
+    def __init__(self, cfg, plan: RoomPlan, h: int, rec: Recorder):
+        self.cfg = cfg
+        self.plan = plan
+        self.h = h
+        self.rec = rec
+        self.rng = random.Random(cfg["seed"] * 1000003 + plan.index * 31 + h)
+        self.client_id = f"lt-{cfg['seed']}-{plan.index}-{h}"
+        self.name = f"Last {h + 1}"
+        self.ws = None
+        self.ack_id = 0
+        self.acks = {}  # id -> (event, t0)
+        self.effects = {}  # event -> (t0, predicate)
+        self.state = None
+        self.rev = None
+        self.seat = None
+        self.last = None
+        self.started = False
+        self.dropped = False
+        self.next_at = 0.0
+        self.anim_rev = None
+
+    # --- connection ---
+    def connect(self) -> None:
+        self.ws = simple_websocket.Client.connect(
+            f"{self.cfg['ws']}/socket.io/?EIO=4&transport=websocket")
+        # No wait for the engine.io open packet: simple_websocket can drop a
+        # message that arrives together with the handshake response, and the
+        # session works without it (the receive loop skips it).
+        self.ws.send("40")
+        if self.cfg["compact"]:
+            self.ws.send("42" + json.dumps(["online_wire", {"accept": [pw_wire.CODEC]}]))
+
+    def close(self) -> None:
+        if self.ws is not None:
+            try:
+                self.ws.close()
+            except Exception:
+                pass
+            self.ws = None
+        self.acks.clear()
+        self.effects.clear()
+
+    def emit(self, event: str, data, effect=None) -> None:
+        self.ack_id += 1
+        now = time.perf_counter()
+        self.acks[self.ack_id] = (event, now)
+        if effect is not None:
+            self.effects[event] = (now, effect)
+        self.ws.send(f"42{self.ack_id}" + json.dumps([event, data]))
+
+    def receive(self, timeout: float):
+        """Next (event, payload) from the server, or None on timeout."""
+        msg = self.ws.receive(timeout)
+        if msg is None:
+            return None
+        if msg == "2":
+            self.ws.send("3")
+            return ("", None)
+        if msg.startswith("43"):
+            ack = int(re.match(r"43(\d+)", msg).group(1))
+            sent = self.acks.pop(ack, None)
+            if sent is not None:
+                self.rec.add(sent[0], "ack", (time.perf_counter() - sent[1]) * 1000.0)
+            return ("", None)
+        m = _BINARY.match(msg)
+        if m:
+            event = json.loads(msg[m.end():])[0]
+            blobs = [self.ws.receive(timeout) for _ in range(int(m.group(1)))]
+            return (event, pw_wire.decode(event, blobs[0]))
+        if msg.startswith("42"):
+            event, payload = (json.loads(msg[2:]) + [None])[:2]
+            return (event, payload)
+        return ("", None)
+
+    # --- game ---
+    def run(self, deadline: float) -> None:
+        plan = self.plan
+        try:
+            self.connect()
+            if self.h == 0:
+                self.emit("online_create_room", {
+                    "clientId": self.client_id, "name": self.name, "players": self.cfg["players"],
+                    "bots": self.cfg["players"] - plan.humans, "botLevel": self.cfg["bot_level"],
+                }, effect=lambda st: True)
+            else:
+                if not plan.code_ready.wait(max(0.0, deadline - time.time())):
+                    raise TimeoutError("no room code")
+                self.join()
+            while time.time() < deadline:
+                got = self.receive(max(0.1, min(NEXT_RETRY_SECONDS, deadline - time.time())))
+                if got is None:
+                    if self.state is not None:
+                        self.press_next()
+                    continue
+                event, payload = got
+                if event and self.handle(event, payload):
+                    return
+            raise TimeoutError(f"room {plan.code} did not finish (phase {(self.state or {}).get('phase')})")
+        except Exception as exc:  # the room counts as failed
+            with plan.lock:
+                plan.failure = plan.failure or f"seat {self.h}: {exc!r}"
+        finally:
+            self.close()
+
+    def join(self) -> None:
+        self.emit("online_join_room", {"room": self.plan.code, "clientId": self.client_id, "name": self.name},
+                  effect=lambda st: True)
+
+    def handle(self, event: str, payload) -> bool:
+        """True when this player is done."""
+        if event == "online_state":
+            first = self.state is None
+            self.seat, self.state, self.rev = payload["seat"], payload["state"], payload["rev"]
+            if first and self.h == 0:
+                self.plan.code = payload["room"]
+                self.plan.code_ready.set()
+        elif event == "online_update" and self.state is not None:
+            if payload["base"] != self.rev:
+                self.rec.bump("gaps")
+                self.ws.send("42" + json.dumps(["online_resync", {"room": self.plan.code}]))
+                return False
+            if payload.get("public"):
+                patch = json.loads(payload["public"]) if isinstance(payload["public"], str) else payload["public"]
+                self.state.update(patch["set"])
+                for key, rows in patch["append"].items():
+                    self.state[key] = (self.state.get(key) or []) + rows
+            if "hands" in payload:
+                self.state["hands"] = payload["hands"]
+            self.rev = payload["rev"]
+        elif event == "error":
+            self.rec.error((payload or {}).get("message") or "?")
+            return False
+        else:
+            return False
+        now = time.perf_counter()
+        for name, (t0, done) in list(self.effects.items()):
+            if done(self.state):
+                self.rec.add(name, "effect", (now - t0) * 1000.0)
+                del self.effects[name]
+        return self.act()
+
+    def act(self) -> bool:
+        st, plan = self.state, self.plan
+        phase = st["phase"]
+        if phase == "game_finished":
+            if self.h == 0:
+                self.rec.bump("cards", st["n"] * sum(row["cardsPer"] for row in st["history"]))
+                plan.finished = True
+            return True
+        dropped = plan.dropped_at
+        if dropped is not None and not plan.takeover_seen and dropped[0] in st.get("botSeats", ()):
+            with plan.lock:
+                if not plan.takeover_seen:
+                    plan.takeover_seen = True
+                    self.rec.add("takeover", "effect", (time.time() - dropped[1]) * 1000.0)
+        if (plan.kind != "plain" and not self.dropped and self.h == plan.humans - 1 and phase == "playing"
+                and st["roundIndex"] >= ROUND_TO_DROP):
+            return self.drop()
+        seat = self.seat
+        if phase in ("dealing", "between_tricks", "round_finished") and self.anim_rev != self.rev:
+            self.anim_rev = self.rev
+            self.ws.send("42" + json.dumps(["online_anim_done", {"room": plan.code, "rev": self.rev}]))
+        if phase in ("between_tricks", "round_finished"):
+            self.press_next()
+        elif phase == "lobby":
+            bots = set(st.get("botSeats") or ())
+            seated = sum(1 for i, name in enumerate(st["names"]) if name and i not in bots)
+            if self.h == 0 and not self.started and seated >= plan.humans:
+                self.started = True
+                self.emit("online_start_game", {"room": plan.code}, effect=lambda s: s["phase"] != "lobby")
+        elif phase == "bidding" and st["bids"][seat] is None:
+            step = ("bid", st["roundIndex"])
+            if step != self.last:
+                self.last = step
+                self.emit("online_set_bid", {"room": plan.code, "bid": self.rng.randint(0, int(st["cardsPer"] or 0))},
+                          effect=lambda s, seat=seat: s["bids"][seat] is not None)
+        elif phase == "playing" and st["turn"] == seat and st["table"][seat] is None:
+            hand = _hand(st, seat)
+            step = ("play", st["roundIndex"], len(hand))
+            if hand and step != self.last:
+                self.last = step
+                lead = st.get("leadSuit")
+                card = self.rng.choice([c for c in hand if c["suit"] == lead] or hand)
+                held = len(hand)
+                self.emit("online_play_card", {"room": plan.code, "card": card["rank"] + card["suit"]},
+                          effect=lambda s, seat=seat, held=held: len(_hand(s, seat)) < held)
+        return False
+
+    def press_next(self) -> None:
+        """The host clicks "next" in rooms without bots (the server only
+        advances those on a click; clicks during the sweep are ignored, so
+        it clicks again after NEXT_RETRY_SECONDS)."""
+        st = self.state
+        phase = st["phase"]
+        if self.h != 0 or st.get("botSeats") or phase not in ("between_tricks", "round_finished"):
+            return
+        now = time.time()
+        if now < self.next_at:
+            return
+        self.next_at = now + NEXT_RETRY_SECONDS
+        step = (st["roundIndex"], len(st.get("history") or []), sum(st.get("tricksRound") or []))
+        self.emit("online_next", {"room": self.plan.code},
+                  effect=lambda s, step=step: (s["roundIndex"], len(s.get("history") or []),
+                                               sum(s.get("tricksRound") or [])) != step or s["phase"] != phase)
+
+    def drop(self) -> bool:
+        """Leave the game as a lost connection would."""
+        self.dropped = True
+        self.close()
+        if self.plan.kind == "takeover":
+            self.plan.dropped_at = (self.seat, time.time())
+            return True
+        time.sleep(self.cfg["reconnect_delay"])
+        t0 = time.perf_counter()
+        self.state = None
+        self.connect()
+        self.join()
+        self.effects["reconnect"] = (t0, lambda st: True)
+        self.last = None
+        return False
+
+
+def run_rooms(task):
+    """Client process: play the given rooms, starting each at its time."""
+    cfg, rooms, t_start = task
+    rec = Recorder()
+    results = []
+    threads = []
+
+    def one(plan: RoomPlan) -> None:
+        begin = time.time()
+        deadline = begin + cfg["timeout"]
+        players = [Player(cfg, plan, h, rec) for h in range(plan.humans)]
+        workers = [threading.Thread(target=p.run, args=(deadline,), daemon=True) for p in players]
+        for w in workers:
+            w.start()
+        for w in workers:
+            w.join()
+        ok = plan.finished and plan.failure is None
+        if plan.kind == "takeover" and not plan.takeover_seen:
+            plan.failure = plan.failure or "takeover not seen"
+            ok = False
+        results.append({"room": plan.index, "kind": plan.kind, "ok": ok, "seconds": round(time.time() - begin, 3),
+                        "failure": plan.failure})
+
+    for index, kind, at in rooms:
+        delay = t_start + at - time.time()
+        if delay > 0:
+            time.sleep(delay)
+        t = threading.Thread(target=one, args=(RoomPlan(index, kind, cfg["humans"]),), daemon=True)
+        t.start()
+        threads.append(t)
+    for t in threads:
+        t.join()
+    return {"samples": rec.samples, "errors": dict(rec.errors), "gaps": rec.gaps, "cards": rec.cards,
+            "rooms": results}
+
+
+# --- server side ---
+def _get_json(base: str, path: str):
+    with urllib.request.urlopen(f"{base}{path}", timeout=5) as r:
+        return json.loads(r.read())
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(kind: str, port: int, threads: int, env_extra):
+    env = dict(os.environ, ADMIN_TOKEN=TOKEN, **env_extra)
+    if kind == "asgi":
+        cmd = [sys.executable, "-m", "uvicorn", "asgi:application", "--host", "127.0.0.1", "--port", str(port),
+               "--log-level", "warning"]
+    else:
+        cmd = [sys.executable, "-m", "gunicorn", "-w", "1", "-k", "gthread", "--threads", str(threads),
+               "-b", f"127.0.0.1:{port}", "app:app"]
+    proc = subprocess.Popen(cmd, cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.time() + 60
+    while True:
+        if time.time() > deadline or proc.poll() is not None:
+            proc.kill()
+            raise RuntimeError(f"{kind} server did not start")
+        try:
+            _get_json(f"http://127.0.0.1:{port}", f"/admin/metrics.json?token={TOKEN}")
+            return proc
+        except (OSError, ValueError):
+            time.sleep(0.2)
+
+
+def stop_server(proc) -> None:
+    proc.send_signal(signal.SIGTERM)
+    try:
+        proc.wait(15)
+    except subprocess.TimeoutExpired:
+        proc.kill()
+
+
+def _descendants(pid: int):
+    """`pid` and its child processes (bot pool, gunicorn worker), via /proc."""
+    parents = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parents[int(entry)] = int(f.read().rsplit(")", 1)[1].split()[1])
+            except (OSError, IndexError, ValueError):
+                continue
+    out, todo = [pid], [pid]
+    while todo:
+        parent = todo.pop()
+        kids = [p for p, pp in parents.items() if pp == parent]
+        out += kids
+        todo += kids
+    return out
+
+
+def _usage(pids):
+    """(cpu seconds, rss bytes) summed over `pids`."""
+    tick = os.sysconf("SC_CLK_TCK")
+    page = os.sysconf("SC_PAGE_SIZE")
+    cpu = rss = 0
+    for pid in pids:
+        try:
+            with open(f"/proc/{pid}/stat") as f:
+                fields = f.read().rsplit(")", 1)[1].split()
+            with open(f"/proc/{pid}/statm") as f:
+                rss += int(f.read().split()[1]) * page
+            cpu += (int(fields[11]) + int(fields[12])) / tick
+        except (OSError, IndexError, ValueError):
+            continue
+    return cpu, rss
+
+
+class Sampler(threading.Thread):
+    """Server CPU/RSS (local server) and room gauges, once per second."""
+
+    def __init__(self, base: str, token: str, pid):
+        super().__init__(daemon=True)
+        self.base = base
+        self.token = token
+        self.pid = pid
+        self.timeline = []
+        self.stop = threading.Event()
+
+    def run(self) -> None:
+        t0 = time.time()
+        last = None
+        while not self.stop.wait(1.0):
+            row = {"t": round(time.time() - t0, 1)}
+            if self.pid is not None and os.path.isdir("/proc"):
+                cpu, rss = _usage(_descendants(self.pid))
+                now = time.time()
+                if last is not None:
+                    row["cpuPct"] = round((cpu - last[0]) / max(1e-6, now - last[1]) * 100.0, 1)
+                row["rssMb"] = round(rss / 1048576, 1)
+                last = (cpu, now)
+            if self.token:
+                try:
+                    gauges = _get_json(self.base, f"/admin/metrics.json?token={self.token}")["gauges"]
+                    row["rooms"] = sum((gauges.get("pw_rooms") or {}).values())
+                    row["connections"] = gauges.get("pw_room_connections")
+                    row["threads"] = gauges.get("pw_threads")
+                    row["schedulerLagMs"] = round((gauges.get("pw_scheduler_lag_seconds") or 0) * 1000.0, 1)
+                except (OSError, ValueError, KeyError):
+                    pass
+            self.timeline.append(row)
+
+
+# --- report ---
+def percentiles(values):
+    if not values:
+        return {"count": 0}
+    values = sorted(values)
+
+    def rank(q):
+        return round(values[min(len(values) - 1, max(0, math.ceil(q * len(values)) - 1))], 3)
+    return {"count": len(values), "p50": rank(0.5), "p95": rank(0.95), "p99": rank(0.99),
+            "max": round(values[-1], 3)}
+
+
+def compare(report, old, tolerance: float) -> int:
+    """Print `report` against `old`; 1 if anything regressed past `tolerance`."""
+    worse = 0
+
+    def line(label, new, before, higher_is_worse=True):
+        nonlocal worse
+        if new is None or before in (None, 0):
+            print(f"  {label:36} {before!s:>10} -> {new!s:>10}")
+            return
+        change = (new - before) / before
+        bad = change > tolerance if higher_is_worse else change < -tolerance
+        worse += bad
+        print(f"  {label:36} {before:>10} -> {new:>10} {change:+7.1%}{'  WORSE' if bad else ''}")
+
+    print(f"compared with {old.get('started')} ({old.get('git') or '?'}):")
+    keys = ("rooms", "players", "humans", "pace", "compact", "server", "url", "reconnect", "takeover")
+    differ = [k for k in keys if report["config"].get(k) != old.get("config", {}).get(k)]
+    if differ:
+        print(f"  (not the same setup: {', '.join(differ)} differ)")
+    line("rooms/s", report["rooms"]["roomsPerSec"], old["rooms"].get("roomsPerSec"), higher_is_worse=False)
+    for event in sorted(report["latency"]):
+        for kind in ("ack", "effect"):
+            new = report["latency"][event].get(kind, {}).get("p95")
+            before = old.get("latency", {}).get(event, {}).get(kind, {}).get("p95")
+            if new is not None or before is not None:
+                line(f"{event} {kind} p95 ms", new, before)
+    line("peak server RSS MB", report["server"].get("peakRssMb"), old.get("server", {}).get("peakRssMb"))
+    return 1 if worse else 0
+
+
+def _git_rev():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, capture_output=True, text=True,
+                              timeout=10).stdout.strip() or None
+    except (OSError, subprocess.SubprocessError):
+        return None
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rooms", type=int, default=50)
+    ap.add_argument("--players", type=int, default=4, help="seats per room")
+    ap.add_argument("--humans", type=int, default=2, help="human seats per room (the rest are bots)")
+    ap.add_argument("--bot-level", default="easy")
+    ap.add_argument("--ramp", type=float, default=5.0, help="seconds over which rooms are started")
+    ap.add_argument("--reconnect", type=float, default=0.2, help="share of rooms with a reconnect")
+    ap.add_argument("--reconnect-delay", type=float, default=1.0)
+    ap.add_argument("--takeover", type=float, default=0.1, help="share of rooms with a bot takeover")
+    ap.add_argument("--takeover-seconds", type=float, default=3.0, help="PW_TAKEOVER_SECONDS for the local server")
+    ap.add_argument("--pace", type=float, default=0.0, help="PW_ONLINE_PACE for the local server (1 = real)")
+    ap.add_argument("--compact", action="store_true", help="negotiate the binary wire format")
+    ap.add_argument("--server", choices=("gunicorn", "asgi"), default="gunicorn")
+    ap.add_argument("--url", help="test a running server instead (http://host:port)")
+    ap.add_argument("--token", default="", help="its ADMIN_TOKEN (for the gauges), with --url")
+    ap.add_argument("--procs", type=int, default=0, help="client processes (0 = one per 250 players)")
+    ap.add_argument("--timeout", type=float, default=600.0, help="per room")
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--report", default="loadtest-report.json")
+    ap.add_argument("--compare", help="earlier report to compare with")
+    ap.add_argument("--tolerance", type=float, default=0.25, help="allowed relative regression")
+    args = ap.parse_args(argv)
+    if args.takeover and args.humans < 2:
+        ap.error("--takeover needs --humans >= 2 (another human watches the takeover)")
+    if not 1 <= args.humans <= args.players:
+        ap.error("--humans must be between 1 and --players")
+
+    clients = args.rooms * args.humans
+    proc = None
+    if args.url:
+        base, token = args.url.rstrip("/"), args.token
+    else:
+        port = _free_port()
+        base, token = f"http://127.0.0.1:{port}", TOKEN
+        env = {"PW_ONLINE_PACE": str(args.pace), "PW_STORE_PATH": "",
+               "PW_TAKEOVER_SECONDS": str(args.takeover_seconds)}
+        proc = start_server(args.server, port, clients + 32, env)
+    cfg = {"ws": "ws" + base[4:], "players": args.players, "humans": args.humans, "bot_level": args.bot_level,
+           "compact": args.compact, "reconnect_delay": args.reconnect_delay, "timeout": args.timeout,
+           "seed": args.seed}
+
+    rng = random.Random(args.seed)
+    plan = []
+    for i in range(args.rooms):
+        r = rng.random()
+        kind = "takeover" if r < args.takeover else "reconnect" if r < args.takeover + args.reconnect else "plain"
+        plan.append((i, kind, args.ramp * i / max(1, args.rooms)))
+    procs = args.procs or max(1, min(os.cpu_count() or 1, math.ceil(clients / 250)))
+    print(f"{args.rooms} rooms x {args.humans} humans ({args.players} seats), {procs} client processes, "
+          f"server {'at ' + base if args.url else args.server}")
+
+    sampler = Sampler(base, token, proc.pid if proc else None)
+    sampler.start()
+    t_start = time.time() + 1.0
+    try:
+        with ProcessPoolExecutor(max_workers=procs) as pool:
+            parts = list(pool.map(run_rooms, [(cfg, plan[k::procs], t_start) for k in range(procs)]))
+        elapsed = time.time() - t_start
+        server_metrics = None
+        if token:
+            try:
+                server_metrics = _get_json(base, f"/admin/metrics.json?token={token}")
+            except (OSError, ValueError):
+                pass
+    finally:
+        sampler.stop.set()
+        sampler.join()
+        if proc is not None:
+            stop_server(proc)
+
+    samples = {}
+    errors = Counter()
+    for part in parts:
+        for key, values in part["samples"].items():
+            samples.setdefault(key, []).extend(values)
+        errors.update(part["errors"])
+    rooms = [r for part in parts for r in part["rooms"]]
+    finished = [r for r in rooms if r["ok"]]
+    latency = {}
+    for (event, kind), values in sorted(samples.items()):
+        latency.setdefault(event, {})[kind] = percentiles(values)
+    timeline = sampler.timeline
+    report = {
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(t_start)),
+        "git": _git_rev(),
+        "config": vars(args),
+        "rooms": {
+            "planned": len(plan), "finished": len(finished), "failed": len(rooms) - len(finished),
+            "byKind": dict(Counter(r["kind"] for r in finished)),
+            "elapsed": round(elapsed, 2), "roomsPerSec": round(len(finished) / max(elapsed, 1e-9), 3),
+            "cardsPerSec": round(sum(p["cards"] for p in parts) / max(elapsed, 1e-9), 1),
+            "gameSeconds": percentiles([r["seconds"] for r in finished]),
+        },
+        "latency": latency,
+        "errors": dict(errors),
+        "revisionGaps": sum(p["gaps"] for p in parts),
+        "failures": [r for r in rooms if not r["ok"]][:20],
+        "server": {
+            "peakCpuPct": max((row.get("cpuPct", 0) for row in timeline), default=None),
+            "peakRssMb": max((row.get("rssMb", 0) for row in timeline), default=None),
+            "peakConnections": max((row.get("connections") or 0 for row in timeline), default=None),
+        },
+        "timeline": timeline,
+        "serverMetrics": server_metrics,
+    }
+    with open(args.report, "w", encoding="utf-8") as f:
+        json.dump(report, f, indent=1)
+
+    r = report["rooms"]
+    print(f"finished {r['finished']}/{r['planned']} rooms in {r['elapsed']}s: {r['roomsPerSec']} rooms/s, "
+          f"{r['cardsPerSec']} cards/s; peak server CPU {report['server']['peakCpuPct']}%, "
+          f"RSS {report['server']['peakRssMb']} MB")
+    print(f"{'event':22} {'kind':6} {'n':>7} {'p50':>8} {'p95':>8} {'p99':>8}  (ms)")
+    for event, kinds in latency.items():
+        for kind, p in kinds.items():
+            print(f"{event:22} {kind:6} {p['count']:>7} {p['p50']:>8} {p['p95']:>8} {p['p99']:>8}")
+    if errors:
+        print(f"server errors: {dict(errors)}")
+    for failure in report["failures"][:5]:
+        print(f"  failed room {failure['room']} ({failure['kind']}): {failure['failure']}", file=sys.stderr)
+    print(f"report: {args.report}")
+
+    status = 1 if r["failed"] else 0
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            status |= compare(report, json.load(f), args.tolerance)
+    return status
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""Run Piratwhist sharded: a message broker, N app workers and the router.
+
+Each worker is the normal single-process server (gunicorn, one gthread
+worker) with PW_SHARD=i and PW_SHARDS=N set, listening on 127.0.0.1 at
+base-port + i. The router listens on the public port and sends every
+request to the worker owning its room (see pw_shard / pw_router). A worker
+that exits is started again.
+
+  python scripts/run_shards.py --shards 4 --port $PORT
+
+PW_SHARDS (default: number of cores) and PORT are read from the
+environment when the flags are not given. All workers share the room store
+file; each only loads rooms it owns.
+"""
+from __future__ import annotations
+
+import argparse
+import os
+import signal
+import subprocess
+import sys
+import threading
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+sys.path.insert(0, ROOT)
+
+import pw_router  # noqa: E402
+import pw_shard  # noqa: E402
+
+
+def worker_command(port: int, threads: int):
+    return [sys.executable, "-m", "gunicorn", "-w", "1", "-k", "gthread", "--threads", str(threads),
+            "-b", f"127.0.0.1:{port}", "app:app"]
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--shards", type=int, default=int(os.environ.get("PW_SHARDS") or os.cpu_count() or 1))
+    ap.add_argument("--host", default="0.0.0.0")
+    ap.add_argument("--port", type=int, default=int(os.environ.get("PORT", "5000")))
+    ap.add_argument("--base-port", type=int, default=5100, help="worker i listens on base-port + i")
+    ap.add_argument("--broker-port", type=int, default=6390)
+    ap.add_argument("--threads", type=int, default=8, help="gthread threads per worker")
+    args = ap.parse_args(argv)
+
+    broker = pw_shard.Broker("127.0.0.1", args.broker_port).start()
+    queue_url = f"pw://127.0.0.1:{broker.address[1]}"
+    ports = [args.base_port + i for i in range(args.shards)]
+    procs = [None] * args.shards
+    stopping = threading.Event()
+
+    def spawn(i: int) -> None:
+        env = dict(os.environ, PW_SHARD=str(i), PW_SHARDS=str(args.shards), PW_MESSAGE_QUEUE=queue_url)
+        procs[i] = subprocess.Popen(worker_command(ports[i], args.threads), cwd=ROOT, env=env)
+
+    def supervise() -> None:
+        while not stopping.wait(1.0):
+            for i, proc in enumerate(procs):
+                if proc.poll() is not None and not stopping.is_set():
+                    print(f"shard {i} exited ({proc.returncode}); restarting", file=sys.stderr, flush=True)
+                    spawn(i)
+
+    def stop(*_args) -> None:
+        stopping.set()
+        router.close()
+
+    for i in range(args.shards):
+        spawn(i)
+    router = pw_router.Router((args.host, args.port), [("127.0.0.1", p) for p in ports])
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    threading.Thread(target=supervise, daemon=True).start()
+    print(f"{args.shards} shards on ports {ports[0]}-{ports[-1]}, broker {queue_url}, "
+          f"router on {args.host}:{router.address[1]}", flush=True)
+    router.serve_forever()
+
+    stopping.set()
+    for proc in procs:
+        proc.terminate()
+    deadline = time.time() + 10.0
+    for proc in procs:
+        try:
+            proc.wait(max(0.1, deadline - time.time()))
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    broker.close()
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
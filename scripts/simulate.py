@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+"""Headless batch simulator for bot and rule evaluation.
+
+Plays full 14-round games with pw_engine (no sockets, no rooms) across a
+ProcessPoolExecutor and reports throughput, score distributions, win rates
+and bid accuracy per seat.
+
+  python scripts/simulate.py --games 100000 --players 4
+  python scripts/simulate.py --games 20000 --players 5 --policy baseline,mc,baseline,baseline,baseline
+
+Game i always uses seed (seed, i), so results do not depend on --workers or
+--chunk and a single game can be replayed exactly.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+from typing import Any, Dict, List, Sequence
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+import pw_bidding  # noqa: E402,F401  (registers the "table" bid policy)
+import pw_bots  # noqa: E402,F401  (registers the "mc" policy)
+import pw_engine  # noqa: E402
+
+
+def game_rng(seed: int, index: int) -> random.Random:
+    return random.Random(seed * 1_000_003 + index)
+
+
+def _policies(names: Sequence[str], registry: Dict[str, Any], kind: str):
+    try:
+        return [registry[name] for name in names]
+    except KeyError as exc:
+        raise SystemExit(f"unknown {kind} policy {exc}; known: {', '.join(sorted(registry))}")
+
+
+def run_chunk(task) -> Dict[str, Any]:
+    """Worker entry point: play games [start, start+count) and aggregate."""
+    n_players, card_names, bid_names, seed, start, count = task
+    card_policies = _policies(card_names, pw_engine.CARD_POLICIES, "card")
+    bid_policies = _policies(bid_names, pw_engine.BID_POLICIES, "bid")
+    scores: List[Counter] = [Counter() for _ in range(n_players)]
+    wins = [0.0] * n_players
+    bids_hit = [0] * n_players
+    bid_error = [0] * n_players
+    rounds = 0
+    for i in range(start, start + count):
+        st = pw_engine.play_game(n_players, card_policies, bid_policies, game_rng(seed, i))
+        totals = st["pointsTotal"]
+        best = max(totals)
+        winners = [s for s in range(n_players) if totals[s] == best]
+        for s in range(n_players):
+            scores[s][totals[s]] += 1
+            if s in winners:
+                wins[s] += 1.0 / len(winners)
+        for row in st["history"]:
+            rounds += 1
+            for s in range(n_players):
+                bids_hit[s] += row["bids"][s] == row["taken"][s]
+                bid_error[s] += abs(row["bids"][s] - row["taken"][s])
+    return {"games": count, "rounds": rounds, "scores": scores, "wins": wins, "bidsHit": bids_hit, "bidError": bid_error}
+
+
+def merge(results: Sequence[Dict[str, Any]], n_players: int) -> Dict[str, Any]:
+    total = {"games": 0, "rounds": 0, "scores": [Counter() for _ in range(n_players)],
+             "wins": [0.0] * n_players, "bidsHit": [0] * n_players, "bidError": [0] * n_players}
+    for r in results:
+        total["games"] += r["games"]
+        total["rounds"] += r["rounds"]
+        for s in range(n_players):
+            total["scores"][s].update(r["scores"][s])
+            total["wins"][s] += r["wins"][s]
+            total["bidsHit"][s] += r["bidsHit"][s]
+            total["bidError"][s] += r["bidError"][s]
+    return total
+
+
+def _quantile(hist: Counter, q: float) -> int:
+    target = q * sum(hist.values())
+    seen = 0
+    for value in sorted(hist):
+        seen += hist[value]
+        if seen >= target:
+            return value
+    return 0
+
+
+def summarize(total: Dict[str, Any], card_names, bid_names, elapsed: float) -> Dict[str, Any]:
+    games = max(1, total["games"])
+    rounds_per_seat = max(1, total["rounds"] // games * games)
+    seats = []
+    for s, hist in enumerate(total["scores"]):
+        n = sum(hist.values()) or 1
+        mean = sum(v * c for v, c in hist.items()) / n
+        var = sum(c * (v - mean) ** 2 for v, c in hist.items()) / n
+        seats.append({
+            "seat": s,
+            "policy": card_names[s],
+            "bidPolicy": bid_names[s],
+            "mean": round(mean, 2),
+            "std": round(math.sqrt(var), 2),
+            "min": min(hist) if hist else 0,
+            "p10": _quantile(hist, 0.10),
+            "p50": _quantile(hist, 0.50),
+            "p90": _quantile(hist, 0.90),
+            "max": max(hist) if hist else 0,
+            "winRate": round(total["wins"][s] / games, 4),
+            "bidAccuracy": round(total["bidsHit"][s] / rounds_per_seat, 4),
+            "meanBidError": round(total["bidError"][s] / rounds_per_seat, 3),
+        })
+    return {
+        "games": total["games"],
+        "elapsedSeconds": round(elapsed, 3),
+        "gamesPerSecond": round(total["games"] / max(elapsed, 1e-9), 1),
+        "seats": seats,
+    }
+
+
+def simulate(n_players: int, card_names, bid_names, games: int, seed: int = 1, workers: int = 0, chunk: int = 250):
+    tasks = []
+    for start in range(0, games, chunk):
+        tasks.append((n_players, list(card_names), list(bid_names), seed, start, min(chunk, games - start)))
+    t0 = time.perf_counter()
+    if workers == 1:
+        results = [run_chunk(t) for t in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers or None) as pool:
+            results = list(pool.map(run_chunk, tasks))
+    elapsed = time.perf_counter() - t0
+    return summarize(merge(results, n_players), card_names, bid_names, elapsed)
+
+
+def _per_seat(value: str, n_players: int) -> List[str]:
+    names = [v.strip() for v in value.split(",") if v.strip()]
+    if len(names) == 1:
+        return names * n_players
+    if len(names) != n_players:
+        raise SystemExit(f"expected 1 or {n_players} policies, got {len(names)}")
+    return names
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--games", type=int, default=10000)
+    ap.add_argument("--players", type=int, default=4)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--policy", default="baseline", help="card policy, one name or one per seat (comma separated)")
+    ap.add_argument("--bid-policy", default="baseline", help="bid policy, one name or one per seat (comma separated)")
+    ap.add_argument("--workers", type=int, default=0, help="processes (0 = all cores, 1 = in-process)")
+    ap.add_argument("--chunk", type=int, default=250, help="games per worker task")
+    ap.add_argument("--json", help="also write the report to this file")
+    args = ap.parse_args(argv)
+
+    if not 2 <= args.players <= 8:
+        raise SystemExit("--players must be between 2 and 8")
+    card_names = _per_seat(args.policy, args.players)
+    bid_names = _per_seat(args.bid_policy, args.players)
+    _policies(card_names, pw_engine.CARD_POLICIES, "card")
+    _policies(bid_names, pw_engine.BID_POLICIES, "bid")
+
+    report = simulate(args.players, card_names, bid_names, args.games, args.seed, args.workers, max(1, args.chunk))
+    print(f"{report['games']} games in {report['elapsedSeconds']}s ({report['gamesPerSecond']} games/s)")
+    print(f"{'seat':>4} {'policy':>14} {'mean':>8} {'std':>7} {'p10':>5} {'p50':>5} {'p90':>5} {'win%':>6} {'bid%':>6} {'|err|':>6}")
+    for s in report["seats"]:
+        print(f"{s['seat']:>4} {s['policy'] + '/' + s['bidPolicy']:>14} {s['mean']:>8} {s['std']:>7} "
+              f"{s['p10']:>5} {s['p50']:>5} {s['p90']:>5} {100 * s['winRate']:>6.1f} "
+              f"{100 * s['bidAccuracy']:>6.1f} {s['meanBidError']:>6}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,295 @@
+#!/usr/bin/env python3
+"""Concurrency stress test for the online game handlers.
+
+Runs many rooms at once through the real Socket.IO handlers (Flask-SocketIO
+test clients, no network). Every human seat is driven by several threads
+that spam bids, card plays (legal and illegal) and "next" while the central
+scheduler plays the bot seats, so handlers and scheduled tasks for the same
+room race each other. Animation pacing is set to zero so games run flat out.
+
+With --churn, human seats are also taken over by a second connection with
+the same clientId, which then disconnects, and the original rejoins (a
+reconnect storm).
+
+Afterwards every room is checked for state corruption (duplicated or lost
+cards, trick/point bookkeeping), and the sid/clientId index against the
+rooms' members.
+
+  python scripts/stress_online.py --rooms 100 --players 4 --humans 2
+  python scripts/stress_online.py --churn 20
+  python scripts/stress_online.py --no-locks   # show what breaks without per-room locks
+  python scripts/stress_online.py --store /tmp/stress.sqlite3
+
+With --store the rooms are also written to an SQLite room store at that
+path, and every room must be in it afterwards (finished games as they
+ended).
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+# Keep stress rooms out of the persistent room store unless asked for.
+os.environ.setdefault("PW_STORE_PATH", "")
+
+import app as pw  # noqa: E402
+import pw_bots  # noqa: E402
+import pw_cards  # noqa: E402
+import pw_engine  # noqa: E402
+import pw_store  # noqa: E402
+
+
+def check_room(room):
+    """Return a list of invariant violations for one room (empty when sound)."""
+    st = room["state"]
+    n = st["n"]
+    errors = []
+    if st["phase"] in ("lobby",):
+        return errors
+
+    seen = set()
+    for hand in st["hands"]:
+        for c in hand or []:
+            if c in seen:
+                errors.append(f"duplicate card {pw_cards.CARD_KEYS[c]}")
+            seen.add(c)
+    on_table = [c for c in st["table"] if c is not None]
+    for c in on_table:
+        if c in seen:
+            errors.append(f"card {pw_cards.CARD_KEYS[c]} both in hand and on table")
+        seen.add(c)
+
+    cards_per = int(st.get("cardsPer") or 0)
+    tricks = sum(st["tricksRound"])
+    if tricks > cards_per:
+        errors.append(f"{tricks} tricks taken with {cards_per} cards per player")
+    if st["phase"] in ("bidding", "playing", "between_tricks", "round_finished"):
+        for seat in range(n):
+            played_now = 1 if st["table"][seat] is not None and st["phase"] == "playing" else 0
+            expected = cards_per - tricks - played_now
+            have = len(st["hands"][seat] or [])
+            if have != expected:
+                errors.append(f"seat {seat} holds {have} cards, expected {expected}")
+
+    for row in st["history"]:
+        if sum(row["taken"]) != row["cardsPer"]:
+            errors.append(f"round {row['round']}: {sum(row['taken'])} tricks for {row['cardsPer']} cards")
+        if row["points"] != [pw_engine.points_for_round(b, t) for b, t in zip(row["bids"], row["taken"])]:
+            errors.append(f"round {row['round']}: points do not match bids/taken")
+    rounds = [row["round"] for row in st["history"]]
+    if rounds != list(range(1, len(rounds) + 1)):
+        errors.append(f"history rounds out of order: {rounds}")
+    # Dealt ahead or on time, every deal must be the one its seed gives.
+    for r, dealt in enumerate(st["dealtHistory"]):
+        if st["seed"] is not None and dealt != pw_engine.deal(n, r, pw_engine.deal_rng(st["seed"], r))[0]:
+            errors.append(f"round {r + 1}: hands differ from the deal of the seed")
+    for seat in range(n):
+        points = sum(row["points"][seat] for row in st["history"])
+        if points != st["pointsTotal"][seat]:
+            errors.append(f"seat {seat} pointsTotal {st['pointsTotal'][seat]} != history {points}")
+        taken = sum(row["taken"][seat] for row in st["history"])
+        if st["phase"] not in ("round_finished", "game_finished"):
+            taken += st["tricksRound"][seat]
+        if taken != st["tricksTotal"][seat]:
+            errors.append(f"seat {seat} tricksTotal {st['tricksTotal'][seat]} != {taken}")
+    return errors
+
+
+def check_store(path: str, codes) -> int:
+    """Every room must be in the store, read back as after a restart; a
+    finished game as it ended."""
+    deadline = time.time() + 10
+    while pw.store.metrics()["pending"] and time.time() < deadline:
+        pw.store.flush()  # rooms busy at the last pass stay dirty
+        time.sleep(0.05)
+    metrics = pw.store.metrics()
+    pw.store.close()
+    errors = 0
+    if metrics["errors"] or metrics["pending"]:
+        print(f"store: {metrics}")
+        errors += 1
+    reopened = pw_store.open_store(path)
+    for code in codes:
+        record = reopened.load(("online", code))
+        if record is None:
+            print(f"[{code}] not in the store")
+            errors += 1
+            continue
+        with pw._online_locked(code):
+            room = pw._online_get_room(code)
+            if room is not None and room.state.phase == "game_finished":
+                # The revision moves on with frames sent after the last write.
+                live = json.loads(pw._online_record_json(code, room))
+                if record["state"] != live["state"] or record["botLevel"] != live["botLevel"]:
+                    print(f"[{code}] stored room differs from the finished game")
+                    errors += 1
+    reopened.close()
+    return errors
+
+
+class Counter:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.value = 0
+
+    def add(self, k=1):
+        with self.lock:
+            self.value += k
+
+
+def drive_seat(client, code, seat, plays, stop, rng):
+    while not stop.is_set():
+        room = pw.ONLINE_ROOMS.get(code)
+        if not room and pw.ONLINE_ROOMS.hibernated(code):
+            with pw._online_locked(code):
+                room = pw._online_get_room(code)
+        if not room:
+            return
+        st = room["state"]
+        phase = st.get("phase")
+        try:
+            if phase == "game_finished":
+                return
+            if phase == "bidding" and st["bids"][seat] is None:
+                client.emit("online_set_bid", {"room": code, "bid": rng.randint(0, int(st.get("cardsPer") or 1))})
+            elif phase == "playing" and st.get("turn") == seat:
+                hand = list(st["hands"][seat] or [])
+                if hand:
+                    lead = st.get("leadSuit")
+                    legal = [c for c in hand if pw_cards.SUIT_OF[c] == lead] or hand
+                    card = rng.choice(legal if rng.random() < 0.8 else hand)
+                    client.emit("online_play_card", {"room": code, "card": pw_cards.CARD_KEYS[card]})
+                    plays.add()
+            elif phase in ("between_tricks", "round_finished"):
+                client.emit("online_next", {"room": code})
+        except Exception as exc:  # a handler crashing is a failure too
+            print(f"[{code}] seat {seat}: handler raised {exc!r}", file=sys.stderr)
+        time.sleep(rng.random() * 0.002)
+
+
+def churn_seat(client, code, client_id, name, times, stop, rng):
+    for _ in range(times):
+        if stop.is_set():
+            return
+        other = pw.socketio.test_client(pw.app)
+        other.emit("online_join_room", {"room": code, "clientId": client_id, "name": name})
+        time.sleep(rng.random() * 0.005)
+        other.disconnect()
+        client.emit("online_join_room", {"room": code, "clientId": client_id, "name": name})
+        client.get_received()
+        time.sleep(rng.random() * 0.005)
+
+
+def main(argv=None) -> int:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rooms", type=int, default=100)
+    ap.add_argument("--players", type=int, default=4)
+    ap.add_argument("--humans", type=int, default=2, help="human seats per room (rest are bots)")
+    ap.add_argument("--threads-per-seat", type=int, default=2)
+    ap.add_argument("--timeout", type=float, default=300.0)
+    ap.add_argument("--seed", type=int, default=1)
+    ap.add_argument("--bot-level", default="easy", choices=sorted(pw_bots.LEVELS), help="bot strength per room")
+    ap.add_argument("--churn", type=int, default=0, help="takeover/disconnect/rejoin cycles per human seat")
+    ap.add_argument("--no-locks", action="store_true", help="disable per-room locks (expect corruption)")
+    ap.add_argument("--store", metavar="PATH", help="persist the rooms to an SQLite store at PATH and check it")
+    args = ap.parse_args(argv)
+
+    # Run games flat out.
+    pw.ONLINE_BOT_DELAY_SECONDS = 0.0
+    pw.ONLINE_SWEEP_SECONDS = 0.0
+    pw.ONLINE_NEXT_ROUND_SECONDS = 0.0
+    pw.ONLINE_DEAL_MS_PER_CARD = 0
+    pw.ONLINE_DEAL_MIN_SECONDS = 0.0
+    pw.ONLINE_DEAL_TAIL_SECONDS = 0.0
+    if args.store:
+        pw.store = pw_store.open_store(args.store, interval=0.1)
+    if args.no_locks:
+        # A fresh lock per call serializes nothing.
+        def no_lock(code, blocking=True):
+            lock = threading.RLock()
+            lock.acquire()
+            return lock
+        pw._online_acquire = no_lock
+
+    random.seed(args.seed)
+    rooms = []
+    for r in range(args.rooms):
+        host = pw.socketio.test_client(pw.app)
+        host.emit("online_create_room", {"clientId": f"c{r}-0", "name": "Host", "players": args.players, "bots": 0,
+                                           "botLevel": args.bot_level})
+        code = next(ev["args"][0]["room"] for ev in host.get_received() if ev["name"] == "online_state")
+        clients = [(host, 0, "Host")]
+        for h in range(1, args.humans):
+            c = pw.socketio.test_client(pw.app)
+            c.emit("online_join_room", {"room": code, "clientId": f"c{r}-{h}", "name": f"H{h}"})
+            seat = next(ev["args"][0]["seat"] for ev in c.get_received() if ev["name"] == "online_state")
+            clients.append((c, seat, f"H{h}"))
+        rooms.append((code, clients))
+
+    plays = Counter()
+    stop = threading.Event()
+    threads = []
+    for i, (code, clients) in enumerate(rooms):
+        for h, (client, seat, name) in enumerate(clients):
+            for t in range(args.threads_per_seat):
+                rng = random.Random(args.seed * 100003 + i * 101 + seat * 7 + t)
+                threads.append(threading.Thread(target=drive_seat, args=(client, code, seat, plays, stop, rng), daemon=True))
+            if args.churn:
+                rng = random.Random(args.seed * 100003 + i * 101 + seat * 7 + 99)
+                threads.append(threading.Thread(target=churn_seat, args=(client, code, f"c{i}-{h}", name, args.churn, stop, rng),
+                                                daemon=True))
+
+    t0 = time.perf_counter()
+    for code, clients in rooms:
+        clients[0][0].emit("online_start_game", {"room": code})
+    for th in threads:
+        th.start()
+    deadline = time.time() + args.timeout
+    for th in threads:
+        th.join(max(0.0, deadline - time.time()))
+    stop.set()
+    elapsed = time.perf_counter() - t0
+
+    violations = 0
+    unfinished = 0
+    for code, _ in rooms:
+        with pw._online_locked(code):
+            room = pw._online_get_room(code)  # wakes hibernated rooms
+            if not room:
+                continue
+            errors = check_room(room)
+            if room["state"]["phase"] != "game_finished":
+                unfinished += 1
+        for e in errors:
+            print(f"[{code}] {e}")
+        violations += len(errors)
+    if args.store:
+        violations += check_store(args.store, [code for code, _ in rooms])
+    for e in pw.ONLINE_SEATS.check(pw.ONLINE_ROOMS, pw.ONLINE_HIBERNATED):
+        print(f"seat index: {e}")
+        violations += 1
+
+    # per-thread metric shards must not lose observations
+    handlers = pw.metrics.snapshot()["handlers"]
+    timed_plays = handlers.get("online_play_card", {}).get("count", 0)
+    if timed_plays != plays.value:
+        print(f"metrics: {timed_plays} online_play_card timings for {plays.value} plays")
+        violations += 1
+    for event, h in sorted(handlers.items(), key=lambda kv: -kv[1]["count"])[:5]:
+        print(f"  {event:20} n={h['count']:<6} p50={h['p50Ms']:.2f}ms p95={h['p95Ms']:.2f}ms p99={h['p99Ms']:.2f}ms")
+
+    print(f"rooms={len(rooms)} plays={plays.value} elapsed={elapsed:.1f}s "
+          f"plays/s={plays.value / max(elapsed, 1e-9):.0f} unfinished={unfinished} "
+          f"violations={violations} threads={threading.active_count()} scheduler={pw.scheduler.metrics()} "
+          f"frames={pw.ONLINE_FRAME_STATS}")
+    return 1 if (violations or unfinished) else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())